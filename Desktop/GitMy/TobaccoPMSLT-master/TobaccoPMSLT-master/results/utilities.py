@@ -5,9 +5,12 @@ Created on Wed Mar 31 12:14:53 2021
 @author: wilsonte
 """
 
+import copy
 import pandas as pd
+import numpy as np
 import os
 import pathlib
+import multiprocessing
 from tqdm import tqdm
 
 fileCreated = {}
@@ -107,35 +110,56 @@ def CrossIndex(df, indexDf):
 	return df
 
 
+NETLOGO_BRACKETS = str.maketrans('[]', '  ')
+
+
+def ParseNetlogoLists(series, width):
+	# Parse a column of (possibly nested) NetLogo list strings into a float
+	# array of shape (rows, width), flattening the nesting and padding short
+	# rows with zeros. All rows are tokenized in one pass.
+	text = series.fillna('').astype(str).str.translate(NETLOGO_BRACKETS)
+	counts = text.str.count(r'\S+').to_numpy()
+	if counts.max(initial=0) > width:
+		raise ValueError('NetLogo list longer than expected width {}'.format(width))
+	values = np.array(' '.join(text).split(), dtype=float)
+	
+	starts = np.cumsum(counts) - counts
+	rows = np.repeat(np.arange(len(counts)), counts)
+	cols = np.arange(len(values)) - np.repeat(starts, counts)
+	out = np.zeros((len(counts), width))
+	out[rows, cols] = values
+	return out
+
+
 def SplitNetlogoList(chunk, cohorts, name, outputName):
 	split_names = [outputName + str(i) for i in range(0, cohorts)]
-	df = chunk[name].str.replace('\[', '', regex=True).str.replace('\]', '', regex=True).str.split(' ', expand=True)
-	if cohorts - 1 not in df:
-		for i in range(cohorts):
-			if i not in df:
-				df[i] = 0
-	chunk[split_names] = df
+	values = ParseNetlogoLists(chunk[name], cohorts)
 	chunk = chunk.drop(name, axis=1)
+	chunk = pd.concat([chunk, pd.DataFrame(values, index=chunk.index, columns=split_names)], axis=1)
 	return chunk
 	
   
 def SplitNetlogoNestedList(chunk, cohorts, days, colName, name, fillTo=365):
-	split_names = [(name, j, i) for j in range(0, days) for i in range(0, cohorts)]
-	df = chunk[colName].str.replace('\[', '').str.replace('\]', '').str.split(' ', expand=True)
-	df = df.copy() # de-fragment frame.
-	if days * cohorts - 1 not in df:
-		for i in range(days * cohorts):
-			if i not in df:
-				df[i] = 0
-	if fillTo:
-		for i in [fillTo - j for j in range(1, fillTo)]:
-			if i in df.columns:
-				break
-			else:
-				df[i] = 0
-		df = df.replace({None : 0})
-	df.columns = pd.MultiIndex.from_tuples(split_names, names=['metric', 'day', 'cohort'])
-	return df
+	# Rows are always zero padded to days * cohorts, fillTo is kept so that
+	# existing callers still work.
+	values = ParseNetlogoLists(chunk[colName], days * cohorts)
+	columns = pd.MultiIndex.from_product(
+		[[name], range(days), range(cohorts)], names=['metric', 'day', 'cohort'])
+	return pd.DataFrame(values, index=chunk.index, columns=columns)
+
+
+def ReadNetlogoChunks(fileName, parseChunk, chunksize=1000, processes=1, **kwargs):
+	# Stream a large NetLogo output file, yielding parseChunk(chunk) for each
+	# chunk in file order. parseChunk must be picklable (a module level
+	# function or functools.partial) when processes > 1.
+	reader = pd.read_csv(fileName, chunksize=chunksize, **kwargs)
+	if processes == 1:
+		for chunk in reader:
+			yield parseChunk(chunk)
+		return
+	with multiprocessing.Pool(processes) as pool:
+		for result in pool.imap(parseChunk, reader):
+			yield result
 
 
 def GetCohortData(cohortFile):
@@ -285,4 +309,222 @@ def MakeDescribedHeatmapSet(
 		print('Output heatmap {}'.format(name))
 		#dfHeat = dfHeat.drop_duplicates()
 		OutputToFile(dfHeat, subfolder + name, head=False)
-	
\ No newline at end of file
+	
+
+
+class DrawReducer:
+	"""
+	Streaming summary of a quantity across draws.
+
+	Each call to AddDraw consumes the values for a single draw, indexed by the
+	output cells (the heatmap index_rows and index_cols). A running mean and
+	variance (Welford) and a mergeable quantile sketch are kept per cell, so
+	memory does not grow with the number of draws. Reducers built in separate
+	workers can be combined with Merge.
+
+	Quantiles are exact (matching pandas) until the number of draws exceeds
+	twice the sketch compression, after which each cell is summarised by at
+	most compression + 1 weighted centroids (a vectorised t-digest).
+	"""
+
+	def __init__(self, compression=100):
+		self.compression = compression
+		self.index = None
+		self.count = 0
+		self.mean = None
+		self.m2 = None
+		self.min = None
+		self.max = None
+		self.centroids = None
+		self.weights = None
+		self.exact = True
+
+	def AddDraw(self, values):
+		if isinstance(values, pd.DataFrame):
+			values = values.iloc[:, 0]
+		values = values.sort_index()
+		if self.index is None:
+			if values.index.duplicated().any():
+				raise ValueError('Draw values must have a unique index')
+			self.index = values.index
+			self.mean = np.zeros(len(self.index))
+			self.m2 = np.zeros(len(self.index))
+			self.min = np.full(len(self.index), np.inf)
+			self.max = np.full(len(self.index), -np.inf)
+			self.centroids = np.zeros((len(self.index), 0))
+			self.weights = np.zeros((len(self.index), 0))
+		elif not values.index.equals(self.index):
+			if len(values) != len(self.index) or not values.index.isin(self.index).all():
+				raise ValueError('Draw values do not match the first draw')
+			values = values.reindex(self.index)
+		x = values.to_numpy(dtype=float)
+		if np.any(np.isnan(x)):
+			raise ValueError('Draw values must not be NaN, found {} in draw {}'.format(
+				values.index[np.isnan(x)][0], self.count + 1))
+
+		self.count += 1
+		delta = x - self.mean
+		self.mean += delta / self.count
+		self.m2 += delta * (x - self.mean)
+		self.min = np.minimum(self.min, x)
+		self.max = np.maximum(self.max, x)
+
+		self.centroids = np.concatenate([self.centroids, x[:, np.newaxis]], axis=1)
+		self.weights = np.concatenate([self.weights, np.ones((len(x), 1))], axis=1)
+		if self.centroids.shape[1] > 2 * (self.compression + 1):
+			self._Compress()
+
+	def Merge(self, other):
+		if other.count == 0:
+			return self
+		if self.count == 0:
+			# Copy the arrays, which AddDraw and Merge update in place.
+			self.__dict__.update(copy.deepcopy(other.__dict__))
+			return self
+		if not other.index.equals(self.index):
+			raise ValueError('Cannot merge reducers over different cells')
+
+		# Chan et al. parallel update of the mean and sum of squares.
+		count = self.count + other.count
+		delta = other.mean - self.mean
+		self.mean = self.mean + delta * other.count / count
+		self.m2 = self.m2 + other.m2 + delta ** 2 * self.count * other.count / count
+		self.count = count
+		self.min = np.minimum(self.min, other.min)
+		self.max = np.maximum(self.max, other.max)
+
+		self.centroids = np.concatenate([self.centroids, other.centroids], axis=1)
+		self.weights = np.concatenate([self.weights, other.weights], axis=1)
+		self.exact = self.exact and other.exact
+		if self.centroids.shape[1] > 2 * (self.compression + 1):
+			self._Compress()
+		return self
+
+	def _SortedCentroids(self):
+		# Empty centroids are pushed to the end of each row.
+		means = np.where(self.weights > 0, self.centroids, np.inf)
+		order = np.argsort(means, axis=1, kind='stable')
+		means = np.take_along_axis(means, order, axis=1)
+		weights = np.take_along_axis(self.weights, order, axis=1)
+		return means, weights
+
+	def _Compress(self):
+		means, weights = self._SortedCentroids()
+		rows, width = means.shape
+		total = weights.sum(axis=1, keepdims=True)
+		q = (np.cumsum(weights, axis=1) - 0.5 * weights) / total
+
+		# The arcsine scale function keeps the tail centroids small, which is
+		# where the 5th and 95th percentiles are read from.
+		buckets = self.compression + 1
+		k = np.floor(self.compression * (np.arcsin(2 * q - 1) / np.pi + 0.5))
+		k = np.clip(k, 0, self.compression).astype(int)
+		flat = (np.arange(rows)[:, np.newaxis] * buckets + k).ravel()
+
+		means = np.where(weights > 0, means, 0)
+		newWeights = np.bincount(flat, weights=weights.ravel(), minlength=rows * buckets)
+		newSums = np.bincount(flat, weights=(means * weights).ravel(), minlength=rows * buckets)
+		newWeights = newWeights.reshape(rows, buckets)
+		newSums = newSums.reshape(rows, buckets)
+
+		self.weights = newWeights
+		self.centroids = np.divide(newSums, newWeights,
+			out=np.zeros_like(newSums), where=newWeights > 0)
+		self.exact = False
+
+	def Quantile(self, p):
+		if self.count == 0:
+			raise ValueError('No draws have been added')
+		if self.exact:
+			return pd.Series(np.quantile(self.centroids, p, axis=1), index=self.index)
+
+		means, weights = self._SortedCentroids()
+		rows = means.shape[0]
+		valid = (weights > 0).sum(axis=1)
+		centre = np.cumsum(weights, axis=1) - 0.5 * weights
+		target = p * weights.sum(axis=1)
+
+		upper = (centre < target[:, np.newaxis]).sum(axis=1)
+		upper = np.minimum(upper, valid - 1)
+		lower = np.maximum(upper - 1, 0)
+		rowIx = np.arange(rows)
+		cLow, cHigh = centre[rowIx, lower], centre[rowIx, upper]
+		mLow, mHigh = means[rowIx, lower], means[rowIx, upper]
+		frac = np.divide(target - cLow, cHigh - cLow,
+			out=np.zeros(rows), where=cHigh > cLow)
+		frac = np.clip(frac, 0, 1)
+		result = mLow + frac * (mHigh - mLow)
+
+		# Beyond the outermost centroid centres, interpolate to the extremes.
+		below = target < centre[:, 0]
+		result[below] = (self.min + (means[:, 0] - self.min)
+			* np.divide(target, centre[:, 0], out=np.zeros(rows), where=centre[:, 0] > 0))[below]
+		lastCentre = centre[rowIx, valid - 1]
+		total = weights.sum(axis=1)
+		above = target > lastCentre
+		result[above] = (means[rowIx, valid - 1] + (self.max - means[rowIx, valid - 1])
+			* np.divide(target - lastCentre, total - lastCentre, out=np.zeros(rows),
+				where=total > lastCentre))[above]
+		return pd.Series(result, index=self.index)
+
+	def Mean(self):
+		return pd.Series(self.mean, index=self.index)
+
+	def Std(self):
+		if self.count < 2:
+			return pd.Series(np.nan, index=self.index)
+		return pd.Series(np.sqrt(self.m2 / (self.count - 1)), index=self.index)
+
+	def Describe(self, percentiles):
+		# Mirrors DataFrame.describe with one column per output cell.
+		rows = {
+			'count' : pd.Series(float(self.count), index=self.index),
+			'mean' : self.Mean(),
+			'std' : self.Std(),
+			'min' : pd.Series(self.min, index=self.index),
+		}
+		for pc in percentiles:
+			rows['{}%'.format(DecimalLimit(pc * 100, 1))] = self.Quantile(pc)
+		rows['max'] = pd.Series(self.max, index=self.index)
+		return pd.DataFrame(rows).transpose()
+
+
+def ReduceDraws(drawIterable, compression=100, doTqdm=False):
+	# Consume per-draw values one at a time. drawIterable may be a generator
+	# over files, or pool.imap_unordered over worker results.
+	reducer = DrawReducer(compression=compression)
+	for values in (tqdm(drawIterable) if doTqdm else drawIterable):
+		reducer.AddDraw(values)
+	return reducer
+
+
+def MakeStreamingHeatmapSet(
+		subfolder, reducer, heatStruct, prefixName,
+		describe=False,
+		describeList=[x*0.01 for x in range(1, 100)]):
+	# Constant memory equivalent of MakeDescribedHeatmapSet, which takes a
+	# DrawReducer in place of the table of all draws.
+	percentList = [0.05, 0.5, 0.95]
+	percMap = {
+		0.05: 'percentile_005',
+		0.95 : 'percentile_095',
+		0.5 : 'percentile_050',
+	}
+
+	if describe:
+		name = prefixName + '_describe'
+		print('Describe {} draws'.format(prefixName))
+		OutputToFile(reducer.Describe(describeList), subfolder + name, head=False)
+
+	dfMean = reducer.Mean().to_frame(name='mean').reset_index()
+	dfHeat = ToHeatmap(dfMean, heatStruct)
+	name =  prefixName + '_mean'
+	print('Output heatmap {}'.format(name))
+	OutputToFile(dfHeat, subfolder + name, head=False)
+
+	for pc in percentList:
+		dfHeat = reducer.Quantile(pc).to_frame(name='pc_{}'.format(pc))
+		dfHeat = ToHeatmap(dfHeat.reset_index(), heatStruct)
+		name =  prefixName + '_' + percMap.get(pc)
+		print('Output heatmap {}'.format(name))
+		OutputToFile(dfHeat, subfolder + name, head=False)
@@ -1,6 +1,8 @@
 import datetime
 import logging
 import os
+import queue
+import threading
 from pathlib import Path
 
 import numpy as np
@@ -19,7 +21,7 @@ from mslt.artifacts.circuit_flow_preprocess import MatchAndDiagonalIndexFlows
 
 YEAR_START = 2021
 RANDOM_SEED = 49430
-WRITE_CSV = True
+WRITE_CSV = False
 WRITE_DISEASES = True
 PRE_PROCESS_PREVALENCE = True
 DATA_DIR = 'data'
@@ -27,16 +29,16 @@ DATA_DIR = 'data'
 def output_csv_mkdir(data, path):
 	"""
 	Wrapper for pandas .to_csv() method to create directory for path if it
-	doesn't already exist.
+	doesn't already exist. The table is written as a gzip compressed CSV
+	file.
 	"""
-	output_path = Path('.').resolve() / 'artifacts' / (path + '.csv')
+	output_path = Path('.').resolve() / 'artifacts' / (path + '.csv.gz')
 	out_folder = os.path.dirname(output_path)
 
 	if not os.path.exists(out_folder):
 		os.mkdir(out_folder)
 
-	print(output_path)
-	data.to_csv(output_path)
+	data.to_csv(output_path, compression='gzip')
 
 
 def check_for_bin_edges(df):
@@ -51,14 +53,20 @@ def check_for_bin_edges(df):
 		raise ValueError('Table does not have bins')
 
 
-def write_table(artifact, path, data):
+def write_table(artifact, path, data, write_csv=WRITE_CSV):
 	"""
 	Write a data table to an artifact, after ensuring that it doesn't contain
 	any NA values.
 
+	Tables that vary between draws have one column per draw (``draw_0``,
+	``draw_1``, etc). Tables that are the same for every draw should have a
+	single ``value`` column instead, which is loaded for any draw.
+
 	:param artifact: The artifact object.
 	:param path: The table path.
 	:param data: The table data.
+	:param write_csv: Whether to also write the table to a CSV file, for
+		debugging.
 	"""
 	logger = logging.getLogger(__name__)
 	logger.info('{} Writing table {} to {}'.format(
@@ -66,19 +74,90 @@ def write_table(artifact, path, data):
 
 	#Add age,sex,year etc columns to multi index
 	col_index_filters = ['year','age','sex', 'strata', 'year_start','year_end','age_start','age_end']
-	data.set_index([col_name for col_name in data.columns if col_name in col_index_filters], inplace =True)
+	data = data.set_index([col_name for col_name in data.columns if col_name in col_index_filters])
 	
-	if WRITE_CSV:
-	  output_csv_mkdir(data, path)
+	if 'value' in data.columns and any(c.startswith('draw_') for c in data.columns):
+		msg = 'Table {} has both a value column and draw columns'.format(path)
+		raise ValueError(msg)
+
+	if write_csv:
+		output_csv_mkdir(data, path)
 
-	if np.any(data.isna()):
+	if data.isna().to_numpy().any():
 		msg = 'NA values in table {} for {}'.format(path, artifact.path)
 		raise ValueError(msg)
 
 	artifact.write(path, data)
 
 
-def assemble_artifacts(num_draws, output_path: Path, seed: int = RANDOM_SEED):
+class TableWriter:
+	"""
+	Write data tables to artifacts in a background thread, so that the next
+	table can be generated while the previous table is being written.
+
+	At most ``max_pending`` tables wait to be written; ``write`` blocks until
+	there is room for another table. An error raised while writing a table
+	is raised again by the next call to ``write`` or ``close``, and no
+	further tables are written.
+
+	:param write_csv: Whether to also write each table to a CSV file.
+	:param max_pending: The maximum number of tables waiting to be written.
+
+	When used as a context manager, the queued tables are written on exit;
+	if an error was raised, the queued tables are discarded instead.
+	"""
+
+	def __init__(self, write_csv=WRITE_CSV, max_pending=4):
+		self.write_csv = write_csv
+		self.error = None
+		self.cancelled = False
+		self.queue = queue.Queue(maxsize=max_pending)
+		self.thread = threading.Thread(target=self.run, daemon=True)
+		self.thread.start()
+
+	def write(self, artifact, path, data):
+		"""Queue a data table to be written; this has the same arguments as
+		``write_table``. The table must not be modified afterwards."""
+		self.check()
+		self.queue.put((artifact, path, data))
+
+	def run(self):
+		while True:
+			item = self.queue.get()
+			if item is None:
+				return
+			if self.error is None and not self.cancelled:
+				try:
+					write_table(*item, write_csv=self.write_csv)
+				except Exception as e:
+					self.error = e
+
+	def check(self):
+		if self.error is not None:
+			raise self.error
+
+	def close(self):
+		"""Wait for all of the queued tables to be written."""
+		self.queue.put(None)
+		self.thread.join()
+		self.check()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		if exc_type is None:
+			self.close()
+		else:
+			# Discard the queued tables, and stop the thread without hiding
+			# the original error.
+			self.cancelled = True
+			self.queue.put(None)
+			self.thread.join()
+
+
+def assemble_artifacts(num_draws, output_path: Path, seed: int = RANDOM_SEED,
+					   write_csv: bool = WRITE_CSV):
 	"""
 	Parameters
 	----------
@@ -90,6 +169,9 @@ def assemble_artifacts(num_draws, output_path: Path, seed: int = RANDOM_SEED):
 	seed
 		The seed for the pseudo-random number generator used to generate the
 		random samples.
+	write_csv
+		Whether to also write each table to a compressed CSV file in the
+		``artifacts`` directory, for debugging.
 
 	"""
 
@@ -167,98 +249,99 @@ def assemble_artifacts(num_draws, output_path: Path, seed: int = RANDOM_SEED):
 		if path.exists():
 			path.unlink()
 
-	# Write the data tables to each artifact file.
+	# Write the data tables to each artifact file, in a background thread.
 	art_nm = Artifact(str(artifact_file))
-
-	# Write the main population tables.
-	logger.info('{} Writing population tables'.format(
-		datetime.datetime.now().strftime("%H:%M:%S")))
-	write_table(art_nm, 'population.structure',
-				 pop.get_population())
-	write_table(art_nm, 'cause.all_causes.disability_rate',
-				 pop.sample_disability_rate_from(dist_yld, smp_yld))
-	write_table(art_nm, 'cause.all_causes.mortality',
-				 pop.get_mortality_rate())
-	write_table(art_nm, 'cause.all_causes.expenditure_rate',
-				 pop.get_expenditure_rate())
-	write_table(art_nm, 'cause.all_causes.expenditure_rate_death',
-				 pop.get_expenditure_rate_death())
-	write_table(art_nm, 'cause.all_causes.income',
-				 pop.get_income())
-	write_table(art_nm, 'cause.all_causes.income_death',
-				 pop.get_income_death())
-
-	if WRITE_DISEASES:
-		# Write the chronic disease tables.
-		for name, disease_nm in diseaseList.chronic.items():
-			logger.info('{} Writing tables for {}'.format(
-				datetime.datetime.now().strftime("%H:%M:%S"), name))
-
-			write_table(art_nm, 'chronic_disease.{}.incidence'.format(name),
-						disease_nm.sample_from('i',
-							dist_chronic_i, dist_chronic_apc,
-							smp_chronic_i[name], smp_chronic_apc[name]))
-			write_table(art_nm, 'chronic_disease.{}.remission'.format(name),
-						disease_nm.sample_from('r',
-							dist_chronic_r, dist_chronic_apc,
-							smp_chronic_r[name], smp_chronic_apc[name]))
-			write_table(art_nm, 'chronic_disease.{}.mortality'.format(name),
-						disease_nm.sample_from('f',
-							dist_chronic_f, dist_chronic_apc,
-							smp_chronic_f[name], smp_chronic_apc[name]))
-			write_table(art_nm, 'chronic_disease.{}.morbidity'.format(name),
-						disease_nm.sample_from('DR',
-							dist_chronic_yld, dist_chronic_apc,
-							smp_chronic_yld[name], smp_chronic_apc[name]))
-			write_table(art_nm, 'chronic_disease.{}.expenditure_rate'.format(name),
-						disease_nm.sample_from('expenditure_rate',
-							dist_chronic_yld, dist_chronic_apc,
-							smp_chronic_yld[name], smp_chronic_apc[name]))
-			write_table(art_nm, 'chronic_disease.{}.expenditure_rate_first'.format(name),
-						disease_nm.sample_from('expenditure_rate_first',
-							dist_chronic_yld, dist_chronic_apc,
-							smp_chronic_yld[name], smp_chronic_apc[name]))
-			write_table(art_nm, 'chronic_disease.{}.expenditure_rate_last'.format(name),
-						disease_nm.sample_from('expenditure_rate_last',
-							dist_chronic_yld, dist_chronic_apc,
-							smp_chronic_yld[name], smp_chronic_apc[name]))
-			write_table(art_nm, 'chronic_disease.{}.income'.format(name),
-						disease_nm.sample_from('income',
-							dist_chronic_yld, dist_chronic_apc,
-							smp_chronic_yld[name], smp_chronic_apc[name]))
-			write_table(art_nm, 'chronic_disease.{}.income_first'.format(name),
-						disease_nm.sample_from('income_first',
-							dist_chronic_yld, dist_chronic_apc,
-							smp_chronic_yld[name], smp_chronic_apc[name]))
-			write_table(art_nm, 'chronic_disease.{}.income_last'.format(name),
-						disease_nm.sample_from('income_last',
-							dist_chronic_yld, dist_chronic_apc,
-							smp_chronic_yld[name], smp_chronic_apc[name]))
-			write_table(art_nm, 'chronic_disease.{}.prevalence'.format(name),
-						disease_nm.sample_prevalence_from(
-							dist_chronic_prev, smp_chronic_prev[name]))
-
-		# Write the acute disease tables.
-		for name, disease_nm in diseaseList.acute.items():
-			logger.info('{} Writing tables for {}'.format(
-				datetime.datetime.now().strftime("%H:%M:%S"), name))
-
-			write_table(art_nm, 'acute_disease.{}.mortality'.format(name),
-						disease_nm.sample_from('excess_mortality',
-							dist_acute_f, smp_acute_f[name]))
-			write_table(art_nm, 'acute_disease.{}.morbidity'.format(name),
-						disease_nm.sample_from('disability_rate',
-							dist_acute_yld, smp_acute_yld[name]))
-			write_table(art_nm, 'acute_disease.{}.expenditure_rate'.format(name),
-						disease_nm.sample_from('expenditure_rate',
-							dist_acute_expenditure_rate, smp_acute_exp[name]))
-			write_table(art_nm, 'acute_disease.{}.income'.format(name),
-						disease_nm.sample_from('income',
-							dist_acute_expenditure_rate, smp_acute_exp[name]))
-	
-	# Write the compartment circuit tables.
-	logger.info('{} Writing compartment circuit tables'.format(
-		datetime.datetime.now().strftime("%H:%M:%S")))
-	Circuit(art_nm, num_draws, data_dir, write_table, YEAR_START, pop.year_end, max_age, WRITE_DISEASES, prng)
+	with TableWriter(write_csv=write_csv) as writer:
+
+		# Write the main population tables.
+		logger.info('{} Writing population tables'.format(
+			datetime.datetime.now().strftime("%H:%M:%S")))
+		writer.write(art_nm, 'population.structure',
+					 pop.get_population())
+		writer.write(art_nm, 'cause.all_causes.disability_rate',
+					 pop.sample_disability_rate_from(dist_yld, smp_yld))
+		writer.write(art_nm, 'cause.all_causes.mortality',
+					 pop.get_mortality_rate())
+		writer.write(art_nm, 'cause.all_causes.expenditure_rate',
+					 pop.get_expenditure_rate())
+		writer.write(art_nm, 'cause.all_causes.expenditure_rate_death',
+					 pop.get_expenditure_rate_death())
+		writer.write(art_nm, 'cause.all_causes.income',
+					 pop.get_income())
+		writer.write(art_nm, 'cause.all_causes.income_death',
+					 pop.get_income_death())
+
+		if WRITE_DISEASES:
+			# Write the chronic disease tables.
+			for name, disease_nm in diseaseList.chronic.items():
+				logger.info('{} Writing tables for {}'.format(
+					datetime.datetime.now().strftime("%H:%M:%S"), name))
+
+				writer.write(art_nm, 'chronic_disease.{}.incidence'.format(name),
+							disease_nm.sample_from('i',
+								dist_chronic_i, dist_chronic_apc,
+								smp_chronic_i[name], smp_chronic_apc[name]))
+				writer.write(art_nm, 'chronic_disease.{}.remission'.format(name),
+							disease_nm.sample_from('r',
+								dist_chronic_r, dist_chronic_apc,
+								smp_chronic_r[name], smp_chronic_apc[name]))
+				writer.write(art_nm, 'chronic_disease.{}.mortality'.format(name),
+							disease_nm.sample_from('f',
+								dist_chronic_f, dist_chronic_apc,
+								smp_chronic_f[name], smp_chronic_apc[name]))
+				writer.write(art_nm, 'chronic_disease.{}.morbidity'.format(name),
+							disease_nm.sample_from('DR',
+								dist_chronic_yld, dist_chronic_apc,
+								smp_chronic_yld[name], smp_chronic_apc[name]))
+				writer.write(art_nm, 'chronic_disease.{}.expenditure_rate'.format(name),
+							disease_nm.sample_from('expenditure_rate',
+								dist_chronic_yld, dist_chronic_apc,
+								smp_chronic_yld[name], smp_chronic_apc[name]))
+				writer.write(art_nm, 'chronic_disease.{}.expenditure_rate_first'.format(name),
+							disease_nm.sample_from('expenditure_rate_first',
+								dist_chronic_yld, dist_chronic_apc,
+								smp_chronic_yld[name], smp_chronic_apc[name]))
+				writer.write(art_nm, 'chronic_disease.{}.expenditure_rate_last'.format(name),
+							disease_nm.sample_from('expenditure_rate_last',
+								dist_chronic_yld, dist_chronic_apc,
+								smp_chronic_yld[name], smp_chronic_apc[name]))
+				writer.write(art_nm, 'chronic_disease.{}.income'.format(name),
+							disease_nm.sample_from('income',
+								dist_chronic_yld, dist_chronic_apc,
+								smp_chronic_yld[name], smp_chronic_apc[name]))
+				writer.write(art_nm, 'chronic_disease.{}.income_first'.format(name),
+							disease_nm.sample_from('income_first',
+								dist_chronic_yld, dist_chronic_apc,
+								smp_chronic_yld[name], smp_chronic_apc[name]))
+				writer.write(art_nm, 'chronic_disease.{}.income_last'.format(name),
+							disease_nm.sample_from('income_last',
+								dist_chronic_yld, dist_chronic_apc,
+								smp_chronic_yld[name], smp_chronic_apc[name]))
+				writer.write(art_nm, 'chronic_disease.{}.prevalence'.format(name),
+							disease_nm.sample_prevalence_from(
+								dist_chronic_prev, smp_chronic_prev[name]))
+
+			# Write the acute disease tables.
+			for name, disease_nm in diseaseList.acute.items():
+				logger.info('{} Writing tables for {}'.format(
+					datetime.datetime.now().strftime("%H:%M:%S"), name))
+
+				writer.write(art_nm, 'acute_disease.{}.mortality'.format(name),
+							disease_nm.sample_from('excess_mortality',
+								dist_acute_f, smp_acute_f[name]))
+				writer.write(art_nm, 'acute_disease.{}.morbidity'.format(name),
+							disease_nm.sample_from('disability_rate',
+								dist_acute_yld, smp_acute_yld[name]))
+				writer.write(art_nm, 'acute_disease.{}.expenditure_rate'.format(name),
+							disease_nm.sample_from('expenditure_rate',
+								dist_acute_expenditure_rate, smp_acute_exp[name]))
+				writer.write(art_nm, 'acute_disease.{}.income'.format(name),
+							disease_nm.sample_from('income',
+								dist_acute_expenditure_rate, smp_acute_exp[name]))
+
+		# Write the compartment circuit tables.
+		logger.info('{} Writing compartment circuit tables'.format(
+			datetime.datetime.now().strftime("%H:%M:%S")))
+		Circuit(art_nm, num_draws, data_dir, writer.write, YEAR_START, pop.year_end, max_age, WRITE_DISEASES, prng)
 
 	print(artifact_file)
@@ -108,9 +108,9 @@ class Circuit:
 					df_apc['year_end'] = df_apc['year_start'] + 1
 					df_apc = df_apc.set_index(['age_start', 'age_end', 'sex', 'strata', 'year_start', 'year_end'])
 					df = df_apc[[col]].mul((1 + df_apc[apcName]) ** df_apc['year'], axis=0)
-				df = df.rename(columns={col : 'draw_0'})
-				for x in range(self.num_draws):
-					df['draw_{}'.format(x + 1)] = df['draw_0']
+				# The circuit tables are the same for every draw, so store a
+				# single value column, which is loaded for any draw.
+				df = df.rename(columns={col : 'value'})
 				df = df.reset_index()
 				self.write_table(self.art_nm, path + col, df) 
 	
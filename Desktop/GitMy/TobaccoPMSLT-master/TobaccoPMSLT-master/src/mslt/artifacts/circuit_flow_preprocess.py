@@ -4,18 +4,29 @@ import numpy as np
 import math
 
 
-# Returns cs + cscv = total smoking prevalence for input age/sex/stratum
+FLOWS = ["DU-->FSFV","DU-->FSCV","CS-->FSCV","CS-->FSFV","DU-->CS","CS-->DU"]
+
+# The number of years of circuit-flows that are taken from each starting year.
+CYCLE_YEARS = 21
+
+# Returns cs + cscv = total smoking prevalence, indexed by age category, sex and stratum.
 # Note: These are STARTING prevalence values for the population
-def get_total_smoking_prevalence(dataDir, age, sex, stratum):
+def load_total_smoking_prevalence(dataDir):
 	df = pd.read_csv(f"{dataDir}/circuit/prevalence/prevalence.csv")
-	df = df.loc[
-		(df["agecategory"] == age) &
-		(df["sex"] == sex) &
-		(df["strata"] == stratum)
-		]
-	return (df["cs"] + df["cscv"]).values[0]
-
-# Reads dataFilePre_{...}_22.csv, and returns the 20-year circuit-flows for input age/sex/stratum.
+	df = df.drop_duplicates(["agecategory", "sex", "strata"])
+	total = df["cs"] + df["cscv"]
+	total.index = pd.MultiIndex.from_frame(df[["agecategory", "sex", "strata"]])
+	return total
+
+# The age of the dataFilePre_{...}.csv file whose circuit-flows are used for an input age.
+def flows_file_age(age):
+	if age < 42:
+		return 22
+	elif age < 62:
+		return 42
+	return 62
+
+# Reads each dataFilePre_{...}.csv once, and returns the 20-year circuit-flows for every input age/sex/stratum.
 # 20-year circuit-flows are estimated by:
 # (1) 	pulling out the initial (starting) total smoking prevalence for an input age/sex/stratum;
 # (2) 	finding which 'year' along a 22y/o's (from same sex and stratum) circuit-flows gives total smoking prevalence 
@@ -23,73 +34,63 @@ def get_total_smoking_prevalence(dataDir, age, sex, stratum):
 # (3) 	pulling out the flows for the next 20 years after the starting year found in (2).
 # This is a hacky way to approximate smoking circuit-flow-cycle of a non-22-y/o, by selecting a
 # representative starting point somewhere along the 22-y/o circuit-flow timeline.
-def get_flows_cycle(dataDir, age, sex, stratum):
-	if age < 42:
-		print(f"- Age file: 22")
-		path_to_flows = f"{dataDir}/circuit/pre_process/input_data/{stratum}_{sex}_22.csv"
-	elif 42 <= age < 62:
-		print(f"- Age file: 42")
-		path_to_flows = f"{dataDir}/circuit/pre_process/input_data/{stratum}_{sex}_42.csv"
-	else:
-		print(f"- Age file: 62")
-		path_to_flows = f"{dataDir}/circuit/pre_process/input_data/{stratum}_{sex}_62.csv"
-	
-	df = pd.read_csv(path_to_flows)
-
-	if age < 20:
-		starting_year_idx = 0
-	else:
-		total_smoking_prev = get_total_smoking_prevalence(
-			dataDir,
-			age=math.floor(age/5)*5, 
-			sex=sex, 
-			stratum=stratum
-		)
-
-		# print(df.head(50))
-		starting_year_idx = df.iloc[(df["totalSmoke"]-total_smoking_prev).abs().argsort()[:1]].index[0]
-
-		matched_smoking_prev = df.iloc[(df["totalSmoke"]-total_smoking_prev).abs().argsort()[:1]]["totalSmoke"].values[0]
-		print(f"- Initial smoking prevalence: {round(total_smoking_prev,4)},\n- Matched value: {round(matched_smoking_prev,4)},\n- Difference: {round(matched_smoking_prev - total_smoking_prev,4)},\n- Year proxy: {starting_year_idx}")
-		# print(combined_df.iloc[(combined_df["totalSmoke"]-total_smoking_prev).abs().argsort()].head(150))
-
-	flows_cycle_df = df[starting_year_idx:(starting_year_idx + 21)][["DU-->FSFV","DU-->FSCV","CS-->FSCV","CS-->FSFV","DU-->CS","CS-->DU"]].reset_index(drop=True)
-	# print(flows_cycle_df.head(20))
-
-	return flows_cycle_df
+# The starting years of all ages that share a file are found at once. The result has one row per
+# age/sex/stratum and year, where 'age' is the age bracket that the person lands in at that year.
+def get_flows_cycles(dataDir, ages, sexes, strata):
+	prevalence = load_total_smoking_prevalence(dataDir)
+	ages = np.asarray(ages)
+	file_ages = np.array([flows_file_age(age) for age in ages])
+	cycles = {"year": [], "age": [], "sex": [], "strata": []}
+	blocks = []
+
+	for stratum in strata:
+		for sex in sexes:
+			for file_age in np.unique(file_ages):
+				group_ages = ages[file_ages == file_age]
+				df = pd.read_csv(f"{dataDir}/circuit/pre_process/input_data/{stratum}_{sex}_{file_age}.csv")
+
+				starting_year_idx = np.zeros(len(group_ages), dtype=int)
+				matched = group_ages >= 20
+				if matched.any():
+					keys = [(math.floor(age/5)*5, sex, stratum) for age in group_ages[matched]]
+					total_smoking_prev = prevalence.loc[keys].to_numpy()
+					# The distance from each year's prevalence (rows) to each initial prevalence (columns).
+					diff = np.abs(df["totalSmoke"].to_numpy()[:, np.newaxis] - total_smoking_prev[np.newaxis, :])
+					diff[np.isnan(diff)] = np.inf
+					# The prevalence is constant at the end of each file, so several years can be
+					# equally close; use the last of these years, as the original row-by-row sort did.
+					starting_year_idx[matched] = len(diff) - 1 - np.argmin(diff[::-1], axis=0)
+
+				flows = df[FLOWS].to_numpy()
+				for age, start in zip(group_ages, starting_year_idx):
+					years = np.arange(min(CYCLE_YEARS, len(df) - start))
+					cycles["year"].append(years)
+					# Figure out what age category the person lands in at each year.
+					cycles["age"].append((age + years) // 5 * 5 + 2)
+					cycles["sex"].append(np.repeat(sex, len(years)))
+					cycles["strata"].append(np.repeat(stratum, len(years)))
+					blocks.append(flows[start + years])
+
+	cycles_df = pd.DataFrame({key: np.concatenate(values) for key, values in cycles.items()})
+	cycles_df[FLOWS] = pd.DataFrame(np.concatenate(blocks), index=cycles_df.index)
+	# Later age/sex/stratum combinations take precedence.
+	cycles_df = cycles_df.drop_duplicates(["year", "age", "sex", "strata"], keep="last")
+
+	return cycles_df
 
 # Populates dataFileTemplate.csv using flows extracted from method described above, outputs dataFile.csv
 def populate_data_file(dataDir, ages, sexes, strata):
 	data_file_df = pd.read_csv(f"{dataDir}/circuit/pre_process/input_data/dataFileTemplate.csv")
 
-	for age in ages:
-		for sex in sexes:
-			for stratum in strata:
-				print(
-					"-----------------------------------------------------\n" +
-					f"Processing age: {age}, {sex}, {stratum} ...\n" +
-					"-----------------------------------------------------" 
-					)
-				# Get 20-year flows for the age, sex, stratum combo
-				flows_cycle_df = get_flows_cycle(dataDir, age, sex, stratum)
-
-				# Loop through 20 years, figure out what age category the person lands in,
-				# then set the flows in dataFile.csv at the appropriate age/year indexes
-				for year in range(0, len(flows_cycle_df)):
-					age_bracket = math.floor((age+year)/5)*5 +2
-					current_year_flows = flows_cycle_df.loc[year]
-	
-					idx = data_file_df.index[
-						(data_file_df["year"] == year) &
-						(data_file_df["age"] == age_bracket) &
-						(data_file_df["sex"] == sex) &
-						(data_file_df["strata"] == stratum) 
-					]
-
-					for flow in ["DU-->FSFV","DU-->FSCV","CS-->FSCV","CS-->FSFV","DU-->CS","CS-->DU"]:
-						data_file_df.at[idx,flow] = current_year_flows[flow]  
-
+	# Get 20-year flows for every age, sex, stratum combo
+	cycles_df = get_flows_cycles(dataDir, ages, sexes, strata)
 
+	# Set the flows in dataFile.csv at the appropriate age/year indexes, with a single merge.
+	keys = ["year", "age", "sex", "strata"]
+	merged = data_file_df[keys].merge(cycles_df, how="left", on=keys, indicator=True)
+	assigned = (merged["_merge"] == "both").to_numpy()
+	for flow in FLOWS:
+		data_file_df.loc[assigned, flow] = merged.loc[assigned, flow].to_numpy()
 
 	data_file_df.set_index(["year", "age", "sex", "strata"],inplace=True)
 	# data_file_df.to_csv("src/mslt/artifacts/data/circuit/pre_process/test.csv")
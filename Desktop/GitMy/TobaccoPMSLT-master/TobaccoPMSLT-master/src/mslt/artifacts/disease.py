@@ -5,6 +5,8 @@ import pandas as pd
 import numpy as np
 import pathlib
 
+from concurrent.futures import ThreadPoolExecutor
+
 from .uncertainty import sample_column_long, sample_fixed_rate_from
 from mslt.utilities import UnstackDraw
 import mslt.utilities as util
@@ -265,6 +267,21 @@ class Acute:
 		return df
 
 
+def read_csv_files(paths, dtype=None, max_workers=8):
+	"""
+	Read a collection of CSV files concurrently.
+
+	:param paths: The paths of the files to read.
+	:param dtype: The data types of columns, as for ``pandas.read_csv``.
+	:param max_workers: The maximum number of files to read at once.
+	:return: A dictionary that maps each path to its data table.
+	"""
+	paths = list(paths)
+	with ThreadPoolExecutor(max_workers=max_workers) as executor:
+		tables = executor.map(lambda path: pd.read_csv(path, dtype=dtype), paths)
+		return dict(zip(paths, tables))
+
+
 class Diseases:
 
 	def __init__(self, data_dir, year_start, year_end):
@@ -292,50 +309,52 @@ class Diseases:
 
 		p = pathlib.Path(self.data_dir + 'shared/')
 		rate_paths = sorted(p.glob('*_{}'.format(rate_suffix)))
-		
-		for rate_path in rate_paths:
-			disease_name = str(rate_path.name)[:-strip_ix]
+		strata_list = util.GetStrata()
+
+		# Find every shared and stratum-specific rates and APC file up front,
+		# and read them all at once.
+		def strata_path(strata, disease_name, suffix):
+			return pathlib.Path(self.data_dir + '{}/{}_{}'.format(strata, disease_name, suffix))
+
+		disease_names = [str(rate_path.name)[:-strip_ix] for rate_path in rate_paths]
+		paths = list(rate_paths)
+		for rate_path, disease_name in zip(rate_paths, disease_names):
+			paths += [strata_path(strata, disease_name, rate_suffix) for strata in strata_list]
+			apc_paths = [pathlib.Path('{}_{}'.format(str(rate_path)[:-strip_ix], apc_suffix))]
+			apc_paths += [strata_path(strata, disease_name, apc_suffix) for strata in strata_list]
+			paths += [path for path in apc_paths if path.exists()]
+		tables = read_csv_files(paths, dtype={'sex': str})
+
+		for rate_path, disease_name in zip(rate_paths, disease_names):
 			print('setup {}'.format(disease_name))
 
-			df_rates = pd.read_csv(rate_path)
+			df_rates = tables[rate_path]
 			df_rates = util.AddStrata(df_rates.set_index(['age', 'sex']))
-			df_rates_strata = pd.DataFrame()
-			for strata in util.GetStrata():
-				path = pathlib.Path(self.data_dir + '{}/{}_rates.csv'.format(strata, disease_name))
-				df_strata = pd.read_csv(path)
-				df_strata = util.AddToIndex(df_strata.set_index(['age', 'sex']), 'strata', strata)
-				df_rates_strata = df_rates_strata.append(df_strata)
+			strata_tables = []
+			for strata in strata_list:
+				df_strata = tables[strata_path(strata, disease_name, rate_suffix)]
+				strata_tables.append(util.AddToIndex(df_strata.set_index(['age', 'sex']), 'strata', strata))
 
-			df_rates = df_rates.join(df_rates_strata).reset_index()
+			if strata_tables:
+				df_rates = df_rates.join(pd.concat(strata_tables))
+			df_rates = df_rates.reset_index()
 
 			if all(c in chronic_cols for c in df_rates.columns):
 				# Chronic disease, check for annual percent changes.
 				prefix = str(rate_path)[:-strip_ix]
-				apc_file = '{}_{}'.format(prefix, apc_suffix)
-				apc_path = pathlib.Path(apc_file)
-				if apc_path.exists():
-					df_apc = pd.read_csv(apc_path)
-					df_apc = util.AddStrata(df_apc.set_index(['sex']))
+				apc_path = pathlib.Path('{}_{}'.format(prefix, apc_suffix))
+				apc_tables = []
+				if apc_path in tables:
+					apc_tables.append(util.AddStrata(tables[apc_path].set_index(['sex'])))
+				for strata in strata_list:
+					path = strata_path(strata, disease_name, apc_suffix)
+					if path in tables:
+						apc_tables.append(util.AddToIndex(tables[path].set_index(['sex']), 'strata', strata))
+
+				if apc_tables:
+					df_apc = pd.concat(apc_tables).reset_index()
 				else:
 					df_apc = None
-				
-				df_apc_strata = None
-				for strata in util.GetStrata():
-					path = pathlib.Path(self.data_dir + '{}/{}_apc.csv'.format(strata, disease_name))
-					if path.exists():
-						df_strata = pd.read_csv(path)
-						df_strata = util.AddToIndex(df_strata.set_index(['sex']), 'strata', strata)
-						if df_apc_strata is None:
-							df_apc_strata = pd.DataFrame()
-						df_apc_strata = df_apc_strata.append(df_strata)
-
-				if df_apc_strata is not None:
-					if df_apc is None:
-						df_apc = df_apc_strata
-					else:
-						df_apc = df_apc.append(df_apc_strata)
-				if df_apc is not None:
-					df_apc = df_apc.reset_index()
 
 				self.chronic[disease_name] = Chronic(
 					disease_name, self._year_start, self._year_end,
@@ -10,15 +10,23 @@ from .uncertainty import LogNormalRawSD, sample_column_long
 
 def post_cessation_rr(disease, rr_data, rr_col, num_states, gamma):
 	# NOTE: this will preserve the condition that draw 0 is the mean.
-	for n in range(1, num_states):
-		rr_base = rr_data.loc[:, rr_col].values
-		col_name = '{}_{}'.format(disease, n)
-		rr_data[col_name] = 1 + (rr_base - 1) * np.exp(- gamma.values * n)
+	# Calculate the RR for every post-cessation state at once, as an array
+	# of shape (rows, states).
+	rr_base = rr_data.loc[:, rr_col].values
+	years = np.arange(1, num_states)
+	rr_post = 1 + (rr_base[:, np.newaxis] - 1) * np.exp(
+		- np.asarray(gamma.values)[:, np.newaxis] * years)
 
 	# Add the RR = 1.0 for the final (absorbing) state.
 	# NOTE: avoid an off-by-one error here, we have 22 states numbered 0..21.
-	col_name = '{}_{}'.format(disease, num_states - 1)
-	rr_data[col_name] = 1.0
+	if num_states > 1:
+		rr_post[:, -1] = 1.0
+	col_names = ['{}_{}'.format(disease, n) for n in years]
+	rr_data = pd.concat([rr_data.drop(columns=col_names, errors='ignore'),
+						 pd.DataFrame(rr_post, index=rr_data.index, columns=col_names)],
+						axis=1)
+	if num_states == 1:
+		rr_data['{}_0'.format(disease)] = 1.0
 
 	if np.any(rr_data.isna()):
 		raise ValueError('NA values in post-cessation RRs')
@@ -58,35 +66,35 @@ def sample_tobacco_rate_from(year_start, year_end, data, rate_name, prev_data,
 	df.insert(1, 'year_end', 0)
 
 	df_index_cols = ['year_start', 'year_end', 'age', 'sex', 'draw']
-	apc_index_cols = ['age', 'sex']
-
-	tables = []
 	years = range(int(year_start), int(year_end + 1))
 
 	if apc_data is not None and value_col in apc_data.columns:
 		data_columns = [c for c in df.columns if c not in df_index_cols]
 		apc_df = apc_data.merge(df.loc[:, df_index_cols])
-		apc_values = apc_df.loc[:, value_col].values
-		base_values = df.loc[:, data_columns].copy().values
 
 		initial_rate = df.loc[:, data_columns].copy().values
 		frac = (1 - apc_df.loc[:, value_col].values)
 
-		# Calculate the correlated samples for each cohort at each year.
-		for counter, year in enumerate(years):
-			df['year_start'] = year
-			if counter < num_apc_years:
-				df['year_end'] = year + 1
-				timespan = year - year_start
-				result = initial_rate * (frac ** timespan)[..., np.newaxis]
-				df.loc[:, data_columns] = result
-				tables.append(df.copy())
-			else:
-				df['year_end'] = year_end + 1
-				tables.append(df.copy())
-				break
-
-		df = pd.concat(tables)
+		# Calculate the correlated samples for each cohort at each year, as
+		# a single block of shape (years, rows, columns).
+		num_years = min(num_apc_years, len(years))
+		timespan = np.arange(num_years)
+		blocks = initial_rate * (frac[np.newaxis, :] ** timespan[:, np.newaxis])[..., np.newaxis]
+		year_starts = list(years[:num_years])
+		year_ends = [year + 1 for year in year_starts]
+		if num_years < len(years):
+			# The final rates apply for the remainder of the simulation.
+			last = blocks[-1] if num_years > 0 else initial_rate
+			blocks = np.concatenate([blocks, last[np.newaxis]])
+			year_starts.append(years[num_years])
+			year_ends.append(year_end + 1)
+
+		num_rows = len(df)
+		df = df.iloc[np.tile(np.arange(num_rows), len(year_starts))]
+		df = df.reset_index(drop=True)
+		df['year_start'] = np.repeat(year_starts, num_rows)
+		df['year_end'] = np.repeat(year_ends, num_rows)
+		df.loc[:, data_columns] = blocks.reshape(-1, len(data_columns))
 
 	else:
 		df['year_start'] = year_start
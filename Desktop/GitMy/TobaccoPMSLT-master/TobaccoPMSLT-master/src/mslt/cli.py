@@ -11,8 +11,10 @@ from mslt.artifacts import assemble_artifacts
 from mslt.components import run_many
 
 @click.command()
+@click.option('--csv', 'write_csv', default=False, is_flag=True,
+			  help='Also write each table to a compressed CSV file')
 @click.argument('scenario', type=click.Choice(['minimal', 'uncertainty']))
-def make_artifacts(scenario):
+def make_artifacts(write_csv, scenario):
 	"""Generate artifacts for the MSLT tobacco intervention simulations."""
 	logging.basicConfig(level=logging.INFO)
 
@@ -23,7 +25,7 @@ def make_artifacts(scenario):
 	logging.info(f'Generating artifact for scenario {scenario} with {draws} '
 				 f'draws at {str(output_path)}')
 
-	assemble_artifacts(draws, output_path)
+	assemble_artifacts(draws, output_path, write_csv=write_csv)
 
 
 @click.command()
@@ -33,8 +35,10 @@ def make_artifacts(scenario):
 			  help='The number of simulations to run in parallel')
 @click.option('-p', '--profile', default=False, metavar='NUM', is_flag=True,
 			  help='Run the profiler')
+@click.option('-r', '--resume', default=False, is_flag=True,
+			  help='Skip simulations whose outputs are up to date')
 @click.argument('spec_file', type=click.Path(exists=True), nargs=-1)
-def run_uncertainty_analysis(draws, spawn, profile, spec_file):
+def run_uncertainty_analysis(draws, spawn, profile, resume, spec_file):
 	"""
 	Run MSLT tobacco intervention simulations for multiple value draws.
 
@@ -47,7 +51,7 @@ def run_uncertainty_analysis(draws, spawn, profile, spec_file):
 		pr = cProfile.Profile()
 		pr.enable()
 	
-	run_many(spec_file, draws, spawn)
+	run_many(spec_file, draws, spawn, resume)
 
 	if profile:
 		pr.disable()
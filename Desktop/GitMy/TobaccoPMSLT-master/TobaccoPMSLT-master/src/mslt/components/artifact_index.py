@@ -0,0 +1,173 @@
+"""
+==================
+Artifact key index
+==================
+
+Components that only need to know whether the artifact contains a table
+(e.g., whether a disease is chronic or acute) should not load the table to
+find out. The key index lists the keys of the artifact once per simulation,
+from the nodes of the HDF file, without reading any of the tables, and is
+shared by all of the components of the simulation.
+
+When ``artifact_prefetch`` is enabled, the first component to be set up
+loads every table that the simulation's components will load, in the order
+that they are stored, so that the file is read from start to end rather than
+in the order that the components are set up. The tables are loaded with
+``builder.data.load`` and held by the key index until a component loads them
+with ``load_table``, so each component receives the same data as it would
+otherwise.
+
+.. code-block:: yaml
+
+   configuration:
+       artifact_prefetch: True
+
+"""
+import weakref
+
+from vivarium.framework.artifact import hdf
+from vivarium.framework.artifact.manager import parse_artifact_path_config
+
+
+# Groups whose tables belong to a single entity (e.g., a disease), which are
+# only prefetched if that entity is used by the simulation.
+ENTITY_GROUPS = ['chronic_disease', 'acute_disease', 'risk_factor',
+				 'mortality_effects']
+
+# The key index of each simulation, keyed on its configuration.
+_artifact_indexes = weakref.WeakKeyDictionary()
+
+
+class ArtifactIndex:
+	"""The keys of the artifact that a simulation loads its data from."""
+
+	def __init__(self, builder):
+		config = builder.configuration
+		self.prefetched = False
+		# The prefetched tables that have not been loaded yet.
+		self.tables = {}
+		if config.input_data.artifact_path:
+			self.path = parse_artifact_path_config(config)
+			# The keys are listed in the order that they are stored.
+			self.ordered_keys = hdf.get_keys(self.path)
+		else:
+			self.path = None
+			self.ordered_keys = []
+		self.keys = frozenset(self.ordered_keys)
+
+	def __contains__(self, key):
+		return key in self.keys
+
+	def required_keys(self, builder):
+		"""
+		Find the tables that the components of a simulation will load, in the
+		order that they are stored.
+		"""
+		config = builder.configuration
+		entities = set()
+		for name in builder.components.list_components():
+			entities.add(name)
+			if name.endswith('_mort_effects'):
+				entities.add(name[:-len('_mort_effects')])
+		if 'acute_disease' in config:
+			for settings in config.acute_disease.to_dict().values():
+				if settings.get('data_name'):
+					entities.add(settings['data_name'])
+
+		circuit = circuit_keys(config)
+		stages = stage_situations(config)
+
+		keys = []
+		for key in self.ordered_keys:
+			group, _, rest = key.partition('.')
+			entity = rest.split('.')[0]
+			if group == 'metadata':
+				continue
+			if group in ENTITY_GROUPS and entity not in entities:
+				continue
+			if group == 'circuit' and key not in circuit:
+				continue
+			if group == 'stage' and entity not in stages:
+				continue
+			keys.append(key)
+		return keys
+
+
+def circuit_keys(config):
+	"""
+	Find the circuit tables that the Circuit component loads: the flow of each
+	configured arc, the intervention and BAU prevalence of each state, and the
+	relative risk of each state for each disease that the circuit affects.
+	"""
+	if 'circuit' not in config or 'arcs' not in config.circuit:
+		return set()
+	circuit = config.circuit
+	prevalence_int = circuit.prevalence_int if 'prevalence_int' in circuit else 'prevalance'
+	prevalence_bau = circuit.prevalence_bau if 'prevalence_bau' in circuit else 'prevalance'
+	rr_ignore = set(circuit.rr_ignore) if 'rr_ignore' in circuit else set()
+
+	keys = set()
+	states = list(circuit.arcs)
+	for source in states:
+		for sink in circuit.arcs[source]:
+			keys.add('circuit.flow.{}_{}'.format(source, sink))
+		keys.add('circuit.{}.{}'.format(prevalence_int, source))
+		keys.add('circuit.{}.{}'.format(prevalence_bau, source))
+	if 'affects' in circuit:
+		for disease in circuit.affects:
+			for state in states:
+				if state not in rr_ignore:
+					keys.add('circuit.rr.{}_{}'.format(disease, state))
+	return keys
+
+
+def stage_situations(config):
+	"""
+	Find the situations whose lockdown stages the LockdownAcuteDisease
+	component loads; the stages are named after the COVID-19 data.
+	"""
+	if 'lockdown' not in config or 'acute_disease' not in config:
+		return set()
+	if 'covid' not in config.acute_disease:
+		return set()
+	return {config.acute_disease.covid.data_name}
+
+
+def prefetch_enabled(config):
+	return 'artifact_prefetch' in config and bool(config.artifact_prefetch)
+
+
+def prefetch_artifact(builder):
+	"""
+	Read every table that the simulation will load from the artifact, if
+	``artifact_prefetch`` is enabled. Components that load data call this at
+	the start of their setup; only the first call reads the tables.
+	"""
+	index = get_artifact_index(builder)
+	if index.prefetched or index.path is None:
+		return
+	index.prefetched = True
+	if not prefetch_enabled(builder.configuration):
+		return
+
+	for key in index.required_keys(builder):
+		index.tables[key] = builder.data.load(key)
+
+
+def load_table(builder, key):
+	"""
+	Load a table from the artifact. Prefetched tables are released once they
+	are loaded; loading a table again reads it with ``builder.data.load``.
+	"""
+	index = get_artifact_index(builder)
+	if key in index.tables:
+		return index.tables.pop(key)
+	return builder.data.load(key)
+
+
+def get_artifact_index(builder):
+	"""Get the artifact key index shared by this simulation."""
+	config = builder.configuration
+	if config not in _artifact_indexes:
+		_artifact_indexes[config] = ArtifactIndex(builder)
+	return _artifact_indexes[config]
@@ -0,0 +1,177 @@
+"""
+=========
+BAU cache
+=========
+
+Intervention specifications that share an artifact, a draw and their
+BAU-affecting configuration produce an identical BAU arm. When
+``bau_cache.path`` is defined, the first such simulation records the BAU
+columns that each component calculates at each time-step. Later simulations
+restore these columns at the same points in the time-step, rather than
+recalculating them, so that only the intervention arm is advanced.
+
+.. code-block:: yaml
+
+   configuration:
+       bau_cache:
+           path: bau_cache
+
+The cache key ignores observers, the components in the ``intervention``
+module, magic wands that target intervention pipelines, and the
+configuration that only these use. Anything else, including magic wands that
+target BAU pipelines, is part of the key.
+
+"""
+import hashlib
+import json
+import logging
+import os
+import weakref
+
+import pandas as pd
+from vivarium.framework.artifact.manager import parse_artifact_path_config
+
+from mslt.__about__ import __version__
+from mslt.utilities import FileDigest
+from .magic_wand_components import GenericWand, MortalityShift, YLDShift
+
+
+# Configuration that only affects the intervention arm or the outputs.
+INTERVENTION_CONFIG = [
+	'bau_cache', 'observer', 'magic_wand', 'magic_wand_flow_register',
+	'intervention', 'tobacco_free_generation', 'tobacco_eradication',
+	'delta_mode',
+]
+
+# The trajectory of each simulation, keyed on its configuration.
+_trajectories = weakref.WeakKeyDictionary()
+
+
+def is_intervention_pipeline(name):
+	"""Determine whether a value pipeline only affects the intervention arm."""
+	if name in ['mortality_rate', 'yld_rate', 'expenditure_rate', 'income']:
+		return True
+	return name.startswith('circuit.flow.') or '_intervention.' in name
+
+
+def is_intervention_component(component, config):
+	if hasattr(component, 'output_suffix'):
+		# Observers do not change the simulation.
+		return True
+	if type(component).__module__.endswith('.intervention'):
+		return True
+	if isinstance(component, (MortalityShift, YLDShift)):
+		return True
+	if isinstance(component, GenericWand):
+		target = component.name
+		if 'magic_wand' in config and component.name in config.magic_wand:
+			if 'target' in config.magic_wand[component.name]:
+				target = config.magic_wand[component.name].target
+		return is_intervention_pipeline(target)
+	return False
+
+
+def bau_key(builder):
+	"""
+	Hash the artifact, draw and BAU-affecting configuration and components
+	of the simulation.
+	"""
+	config = builder.configuration
+	contents = config.to_dict()
+	for key in INTERVENTION_CONFIG:
+		contents.pop(key, None)
+	if 'circuit' in contents:
+		contents['circuit'].pop('prevalence_int', None)
+
+	components = []
+	for name, component in builder.components.list_components().items():
+		if is_intervention_component(component, config):
+			continue
+		entry = '{}.{}:{}'.format(
+			type(component).__module__, type(component).__name__, name)
+		if 'magic_wand' in config and name in config.magic_wand:
+			entry += json.dumps(config.magic_wand[name].to_dict(),
+								sort_keys=True, default=str)
+		components.append(entry)
+
+	contents['components'] = sorted(components)
+	contents['artifact'] = FileDigest(parse_artifact_path_config(config))
+	contents['version'] = __version__
+	text = json.dumps(contents, sort_keys=True, default=str)
+	return hashlib.sha256(text.encode()).hexdigest()
+
+
+class BauTrajectory:
+	"""
+	The BAU columns recorded by each component at each time-step. If the
+	cache file exists the trajectory is restored from it, otherwise it is
+	recorded and written at the end of the simulation.
+	"""
+
+	def __init__(self, builder):
+		self.clock = builder.time.clock()
+		self.cache_file = os.path.join(
+			builder.configuration.bau_cache.path, bau_key(builder) + '.pkl.gz')
+		self.replay = os.path.exists(self.cache_file)
+		if self.replay:
+			self.frames = pd.read_pickle(self.cache_file, compression='gzip')
+			logging.getLogger(__name__).info(
+				'Restoring BAU trajectory from {}'.format(self.cache_file))
+		else:
+			self.frames = {}
+			builder.event.register_listener('simulation_end', self.write)
+
+	@property
+	def name(self):
+		return 'bau_trajectory'
+
+	def restore(self, tag, index):
+		"""
+		Get the BAU columns that the component ``tag`` recorded for the
+		current time-step, or ``None`` if they must be calculated.
+		"""
+		if not self.replay:
+			return None
+		data = self.frames.get((tag, str(self.clock())))
+		if data is None or not index.isin(data.index).all():
+			return None
+		return data.loc[index]
+
+	def record(self, tag, data):
+		if not self.replay:
+			self.frames[(tag, str(self.clock()))] = data.copy()
+
+	def write(self, event):
+		folder = os.path.dirname(self.cache_file)
+		if folder:
+			os.makedirs(folder, exist_ok=True)
+		# Write then rename, so other runs never read a partial file.
+		tmp_file = '{}.{}.tmp'.format(self.cache_file, os.getpid())
+		pd.to_pickle(self.frames, tmp_file, compression='gzip')
+		os.replace(tmp_file, self.cache_file)
+
+
+def get_bau_trajectory(builder):
+	"""
+	Get the BAU trajectory shared by the components of this simulation, or
+	``None`` if the BAU cache is not enabled.
+	"""
+	if 'bau_cache' not in builder.configuration:
+		return None
+	if 'path' not in builder.configuration.bau_cache:
+		raise ValueError('bau_cache.path not defined')
+	config = builder.configuration
+	if config not in _trajectories:
+		_trajectories[config] = BauTrajectory(builder)
+	return _trajectories[config]
+
+
+def restore_bau(trajectory, tag, index):
+	if trajectory is None:
+		return None
+	return trajectory.restore(tag, index)
+
+
+def record_bau(trajectory, tag, data):
+	if trajectory is not None:
+		trajectory.record(tag, data)
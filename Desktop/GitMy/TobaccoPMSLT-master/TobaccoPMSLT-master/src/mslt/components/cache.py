@@ -0,0 +1,143 @@
+"""
+=========
+Run cache
+=========
+
+This module records a manifest for each completed simulation, so that a
+(model specification, draw) pair that has already been run with the same
+resolved configuration, components and artifact can be skipped.
+
+The run key hashes:
+
+- the contents of the model specification file, which lists the components;
+- the resolved configuration, after vivarium has merged the model
+  specification, component defaults and the draw override;
+- the content of the data artifact; and
+- the draw number and the package version.
+
+Changes to the model code itself are not detected, other than through the
+package version.
+
+Manifests are written when simulations are run with ``--resume``, or when
+the run cache is enabled in the model specification, and only for
+simulations that define ``observer.output_prefix``:
+
+.. code-block:: yaml
+
+   configuration:
+       run_cache: True
+
+"""
+import hashlib
+import json
+import os
+
+from vivarium.framework.artifact.manager import parse_artifact_path_config
+
+from mslt.__about__ import __version__
+from mslt.utilities import FileDigest
+from .observer import output_file, output_scenario, output_draw, MakePath
+from .store import read_store_index, store_key
+
+
+def run_key(spec_file, configuration, draw_number):
+	"""
+	Calculate the run key for a simulation from its model specification file
+	and its resolved configuration.
+	"""
+	with open(spec_file, 'rb') as f:
+		specification = hashlib.sha256(f.read()).hexdigest()
+	artifact_path = parse_artifact_path_config(configuration)
+	contents = {
+		'specification' : specification,
+		'configuration' : configuration.to_dict(),
+		'artifact' : FileDigest(artifact_path),
+		'draw' : draw_number,
+		'version' : __version__,
+	}
+	text = json.dumps(contents, sort_keys=True, default=str)
+	return hashlib.sha256(text.encode()).hexdigest()
+
+
+def run_cache_enabled(config):
+	return 'run_cache' in config and bool(config.run_cache)
+
+
+def manifest_file(config):
+	"""The manifest file name, or None if the outputs have no prefix."""
+	if 'observer' not in config or 'output_prefix' not in config.observer:
+		return None
+	return output_file(config, 'manifest', ext='json')
+
+
+def run_outputs(simulation):
+	"""
+	List the output of each observer in the simulation, as either a CSV
+	file or a key in the result store.
+	"""
+	config = simulation.configuration
+	outputs = []
+	for component in simulation._component_manager._components:
+		if not hasattr(component, 'output_suffix'):
+			continue
+		suffix = component.output_suffix
+		if 'output_store' in config.observer:
+			outputs.append({
+				'store' : config.observer.output_store,
+				'key' : store_key(output_scenario(config), suffix, output_draw(config))})
+		else:
+			outputs.append({'file' : output_file(config, suffix)})
+	return outputs
+
+
+def outputs_exist(outputs):
+	store_keys = {}
+	for output in outputs:
+		if 'file' in output:
+			if not os.path.exists(output['file']):
+				return False
+		else:
+			store = output['store']
+			if store not in store_keys:
+				try:
+					store_keys[store] = set(read_store_index(store)['key'])
+				except OSError:
+					return False
+			if output['key'] not in store_keys[store]:
+				return False
+	return True
+
+
+def is_complete(simulation, key):
+	"""
+	Check whether the simulation has a manifest with a matching run key and
+	whether all of the outputs listed in the manifest exist.
+	"""
+	path = manifest_file(simulation.configuration)
+	if path is None:
+		return False
+	try:
+		with open(path) as f:
+			manifest = json.load(f)
+	except (OSError, ValueError):
+		return False
+	if manifest.get('key') != key:
+		return False
+	return outputs_exist(manifest.get('outputs', []))
+
+
+def write_manifest(simulation, key, spec_file, draw_number):
+	path = manifest_file(simulation.configuration)
+	if path is None:
+		return
+	manifest = {
+		'key' : key,
+		'spec_file' : os.path.realpath(spec_file),
+		'draw' : draw_number,
+		'outputs' : run_outputs(simulation),
+	}
+	MakePath(path)
+	# Write then rename, so an interrupted run never leaves a valid manifest.
+	with open(path + '.tmp', 'w') as f:
+		json.dump(manifest, f, indent=1)
+	os.replace(path + '.tmp', path)
@@ -0,0 +1,251 @@
+"""
+===========
+Checkpoints
+===========
+
+This module saves the full simulation state (the state table, the clock, and
+the internal state of components such as observers) at the start of chosen
+years, and starts simulations from these checkpoints.
+
+.. code-block:: yaml
+
+   configuration:
+       checkpoint:
+           save_years: [2023]     # Save at the start of these years.
+           save_every: 10         # Save every 10 years.
+           branch_from: results/base
+           branch_year: 2023
+
+A simulation with ``branch_from`` starts from the checkpoint saved for the
+same draw at the start of ``branch_year`` by the simulation with that output
+prefix. This skips the years that are shared with that simulation, so the
+branch may only differ from it by magic wands that start on or after
+``branch_year``.
+
+When run with ``resume``, a simulation that saves checkpoints restarts from
+the latest checkpoint with a matching run key, if one exists.
+
+"""
+import logging
+import os
+
+import pandas as pd
+import vivarium
+
+from .magic_wand_components import GenericWand
+from .observer import MakePath, output_draw
+
+
+# The vivarium version whose simulation internals (the clock, the state table
+# and the component manager) are saved and restored.
+VIVARIUM_VERSION = '0.10.'
+
+# Configuration that may differ between a checkpoint and its branches.
+BRANCH_CONFIG = ['magic_wand', 'magic_wand_flow_register', 'observer',
+				 'checkpoint', 'bau_cache', 'delta_mode']
+
+
+def check_simulation(simulation):
+	"""
+	Check that the simulation has the internals that checkpoints save and
+	restore, which are not part of the public vivarium interface.
+	"""
+	if not vivarium.__version__.startswith(VIVARIUM_VERSION):
+		raise ValueError('Checkpoints require vivarium {}x, not {}'.format(
+			VIVARIUM_VERSION, vivarium.__version__))
+	for name in ['_clock', '_population', '_component_manager']:
+		if not hasattr(simulation, name):
+			raise ValueError('The simulation has no {} attribute'.format(name))
+	if not hasattr(simulation._population, '_population'):
+		raise ValueError('The population manager has no _population attribute')
+	if not hasattr(simulation._clock, '_time'):
+		raise ValueError('The clock has no _time attribute')
+
+
+def checkpoint_file(prefix, year, draw):
+	"""The checkpoint file name, which follows the observer file names."""
+	out_file = '{}_checkpoint_{}'.format(prefix, year)
+	if draw > 0:
+		out_file += '_{}'.format(draw)
+	return out_file + '.pkl.gz'
+
+
+def checkpoint_years(config):
+	"""Determine the years at the start of which checkpoints are saved."""
+	years = set()
+	if 'checkpoint' not in config:
+		return years
+	start = config.time.start.year
+	end = config.time.end.year
+	if 'save_years' in config.checkpoint:
+		years.update(int(year) for year in config.checkpoint.save_years)
+	if 'save_every' in config.checkpoint:
+		every = int(config.checkpoint.save_every)
+		if every < 1:
+			raise ValueError('checkpoint.save_every must be at least 1')
+		years.update(range(start + every, end, every))
+	return years
+
+
+def component_names(simulation):
+	"""List the components that must match between a checkpoint and branch."""
+	names = []
+	for name, component in simulation._component_manager.list_components().items():
+		if isinstance(component, GenericWand):
+			continue
+		names.append(name)
+	return sorted(names)
+
+
+def shared_config(config):
+	contents = config.to_dict()
+	for key in BRANCH_CONFIG:
+		contents.pop(key, None)
+	return contents
+
+
+def magic_wands(config):
+	if 'magic_wand' not in config:
+		return {}
+	return config.magic_wand.to_dict()
+
+
+def save_checkpoint(simulation, path, key):
+	"""
+	Save the simulation state to ``path``, as a gzip compressed pickle.
+
+	Parameters
+	----------
+	simulation
+		The simulation, between time-steps.
+	path
+		The checkpoint file.
+	key
+		The run key of the simulation.
+
+	"""
+	components = {}
+	for name, component in simulation._component_manager.list_components().items():
+		if hasattr(component, 'get_checkpoint_state'):
+			components[name] = component.get_checkpoint_state()
+
+	state = {
+		'key' : key,
+		'time' : simulation._clock.time,
+		'population' : simulation._population._population.copy(),
+		'components' : components,
+		'component_names' : component_names(simulation),
+		'shared_config' : shared_config(simulation.configuration),
+		'magic_wand' : magic_wands(simulation.configuration),
+	}
+	MakePath(path)
+	# Write then rename, so a crash never leaves a partial checkpoint.
+	tmp_file = '{}.{}.tmp'.format(path, os.getpid())
+	pd.to_pickle(state, tmp_file, compression='gzip')
+	os.replace(tmp_file, path)
+
+
+def load_checkpoint(path):
+	return pd.read_pickle(path, compression='gzip')
+
+
+def validate_branch(simulation, checkpoint):
+	"""
+	Check that the simulation only differs from the checkpoint by magic wands
+	that start on or after the checkpoint year.
+	"""
+	config = simulation.configuration
+	if shared_config(config) != checkpoint['shared_config']:
+		current = shared_config(config)
+		keys = sorted(key for key in set(current) | set(checkpoint['shared_config'])
+					  if current.get(key) != checkpoint['shared_config'].get(key))
+		raise ValueError('Configuration differs from the checkpoint: {}'.format(keys))
+	if component_names(simulation) != checkpoint['component_names']:
+		raise ValueError('Components differ from the checkpoint')
+
+	year = checkpoint['time'].year
+	start_year = config.time.start.year
+	current = magic_wands(config)
+	for name in set(current) | set(checkpoint['magic_wand']):
+		if current.get(name) == checkpoint['magic_wand'].get(name):
+			continue
+		for wand in [current.get(name), checkpoint['magic_wand'].get(name)]:
+			if wand is not None and wand.get('year_start', start_year) < year:
+				raise ValueError('Magic wand {} starts before the checkpoint year {}'.format(
+					name, year))
+
+
+def restore_checkpoint(simulation, checkpoint):
+	"""
+	Restore the simulation state from a checkpoint. The simulation must have
+	been set up and its simulants initialised.
+	"""
+	population = checkpoint['population']
+	if set(population.columns) != set(simulation._population._population.columns):
+		raise ValueError('State table columns differ from the checkpoint')
+	simulation._population._population = population.copy()
+	simulation._clock._time = checkpoint['time']
+	for name, component in simulation._component_manager.list_components().items():
+		if name in checkpoint['components']:
+			component.set_checkpoint_state(checkpoint['components'][name])
+
+
+def latest_checkpoint(config, key):
+	"""Find the latest checkpoint of this simulation with a matching run key."""
+	prefix = config.observer.output_prefix
+	draw = output_draw(config)
+	for year in sorted(checkpoint_years(config), reverse=True):
+		path = checkpoint_file(prefix, year, draw)
+		if not os.path.exists(path):
+			continue
+		checkpoint = load_checkpoint(path)
+		if checkpoint['key'] == key:
+			return path, checkpoint
+	return None, None
+
+
+def run_simulation(simulation, key, resume=False):
+	"""
+	Run a simulation that has been set up and had its simulants initialised,
+	starting from a checkpoint and saving checkpoints as configured.
+
+	Parameters
+	----------
+	simulation
+		The simulation.
+	key
+		The run key of the simulation.
+	resume
+		Restart from the latest checkpoint of an interrupted run of this
+		simulation, if one exists.
+
+	"""
+	logger = logging.getLogger(__name__)
+	check_simulation(simulation)
+	config = simulation.configuration
+	draw = output_draw(config)
+
+	path, checkpoint = None, None
+	if resume:
+		path, checkpoint = latest_checkpoint(config, key)
+	if checkpoint is None and 'checkpoint' in config and 'branch_from' in config.checkpoint:
+		if 'branch_year' not in config.checkpoint:
+			raise ValueError('checkpoint.branch_year not defined')
+		path = checkpoint_file(config.checkpoint.branch_from,
+							   config.checkpoint.branch_year, draw)
+		checkpoint = load_checkpoint(path)
+		validate_branch(simulation, checkpoint)
+	if checkpoint is not None:
+		logger.info('Starting draw #{} from checkpoint {}'.format(draw, path))
+		restore_checkpoint(simulation, checkpoint)
+
+	years = checkpoint_years(config)
+	if checkpoint is not None:
+		years = {year for year in years if year > checkpoint['time'].year}
+	while simulation._clock.time < simulation._clock.stop_time:
+		year = simulation._clock.time.year
+		if year in years:
+			save_checkpoint(simulation, checkpoint_file(
+				config.observer.output_prefix, year, draw), key)
+			years.discard(year)
+		simulation.step()
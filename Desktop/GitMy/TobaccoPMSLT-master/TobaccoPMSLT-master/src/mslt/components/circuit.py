@@ -13,12 +13,24 @@ from datetime import date
 
 import mslt.utilities as util
 
-def IsInArtifact(artifact, name):
-	try:
-		artifact.load(name)
-	except:
-		return False
-	return True
+from .artifact_index import get_artifact_index, load_table, prefetch_artifact
+from .bau_cache import get_bau_trajectory, restore_bau, record_bau
+from .delta import delta_mode, diverged_rows
+from .snapshot import get_state_snapshot
+
+def IsInArtifact(builder, name):
+	return name in get_artifact_index(builder)
+
+
+def LoadTable(builder, name):
+	"""
+	Load a circuit table as a single value column. The circuit tables are the
+	same for every draw and are stored with a single value column, but older
+	artifacts have one column per draw; when no draw is selected the first of
+	these is loaded as the value column, and the others are dropped here.
+	"""
+	data = load_table(builder, name)
+	return data.drop(columns=[c for c in data.columns if c.startswith('draw_')])
 
 
 def GetStateCol(state, bau=False):
@@ -27,6 +39,38 @@ def GetStateCol(state, bau=False):
 	return 'c_{}'.format(state)
 
 
+def BatchedExpm(matrices, order=12):
+	"""
+	Calculate the matrix exponential of each matrix in a stack, by scaling
+	and squaring with a truncated Taylor series.
+
+	Parameters
+	----------
+	matrices
+		An array of shape (n, m, m).
+	order
+		The order of the Taylor series.
+
+	"""
+	n, m, _ = matrices.shape
+	if n == 0:
+		return matrices.copy()
+	# Scale the matrices so that their norms are no larger than 1/2.
+	norm = np.abs(matrices).sum(axis=1).max()
+	squarings = max(0, int(np.ceil(np.log2(norm))) + 1) if norm > 0 else 0
+	scaled = matrices / 2 ** squarings
+
+	identity = np.broadcast_to(np.eye(m), matrices.shape)
+	result = identity.copy()
+	term = identity.copy()
+	for k in range(1, order + 1):
+		term = np.matmul(term, scaled) / k
+		result += term
+	for _ in range(squarings):
+		result = np.matmul(result, result)
+	return result
+
+
 class Circuit:
 	"""
 	This component implements a compartment circuit model.
@@ -35,6 +79,16 @@ class Circuit:
 
 	``arcs``
 		The existing arcs.
+	``continuous_time``
+		Whether to move the flows continuously over each time-step, rather
+		than moving the proportion of the source along each arc in a single
+		jump. The arc values remain the proportions that move in a year, and
+		are converted to continuous-time rates: the arcs out of a source
+		share the rate ``-log(1 - p)`` of the total proportion ``p`` that
+		leaves it, in proportion to their values. Each time-step applies the
+		exact transitions over the step, by exponentiating the matrix of
+		rates for each cohort. Tunnels, and sources that are emptied each
+		year (``p = 1``), are shifted as blocks, as in the discrete steps.
 
 	"""
 
@@ -43,8 +97,10 @@ class Circuit:
 		return 'circuit'
 	
 	def setup(self, builder):
+		prefetch_artifact(builder)
 		self.arcs = []
 		self.static_arcs = []
+		self.tunnel_arcs = []
 		self.states = {}
 		self.columns = []
 		self.cols_int = []
@@ -53,6 +109,8 @@ class Circuit:
 		self.rr_ignore = {}
 		self.prevelanceName_int = 'prevalance'
 		self.prevelanceName_bau = 'prevalance'
+		self.continuous_time = False
+		self.years_per_timestep = builder.configuration.time.step_size/365
 
 		"""Configuration."""
 		if 'circuit' in builder.configuration:
@@ -61,6 +119,8 @@ class Circuit:
 				self.prevelanceName_int = builder.configuration.circuit.prevalence_int
 			if 'prevalence_bau' in builder.configuration.circuit:
 				self.prevelanceName_bau = builder.configuration.circuit.prevalence_bau
+			if 'continuous_time' in builder.configuration.circuit:
+				self.continuous_time = builder.configuration.circuit.continuous_time
 
 			# Determine which arcs to include, and register them.
 			if 'arcs' in builder.configuration.circuit:
@@ -81,7 +141,7 @@ class Circuit:
 						flowName = 'circuit.flow.{}_{}'.format(source, sink)
 						flowName_bau = 'circuit.flow_bau.{}_{}'.format(source, sink)
 
-						flowTable = builder.data.load(flowName)
+						flowTable = LoadTable(builder, flowName)
 						# Only register a value producer for arcs that have magic wands.
 						if flowName in builder.configuration.magic_wand_flow_register:
 							flowRate = builder.lookup.build_table(
@@ -99,6 +159,14 @@ class Circuit:
 								'rate_bau' : builder.value.register_value_producer(
 									flowName_bau, source=flowRate),
 							})
+						elif (flowTable['value'] == 1).all():
+							# Tunnel arcs move all of the source each year.
+							self.tunnel_arcs.append({
+								'source' : sourceName,
+								'sink' : sinkName,
+								'source_bau' : sourceName_bau,
+								'sink_bau' : sinkName_bau,
+							})
 						else:
 							self.static_arcs.append({
 								'source' : sourceName,
@@ -128,7 +196,7 @@ class Circuit:
 					rr_data = False
 					for state in self.states.keys():
 						if GetStateCol(state) not in self.rr_ignore:
-							rr_col = builder.data.load('circuit.rr.{}_{}'.format(disease, state))
+							rr_col = LoadTable(builder, 'circuit.rr.{}_{}'.format(disease, state))
 							if type(rr_data) == bool:
 								rr_data = rr_col
 							rr_data[GetStateCol(state)] = rr_col['value']
@@ -141,19 +209,24 @@ class Circuit:
 					
 					self.disease_rr[disease] = rr_table
 		
+		self.setup_tunnels()
+
 		"""Circuit data"""
 		self.state_data = self.load_circuit(builder)
 		self.state_view = builder.population.get_view(self.columns)
+		self.snapshot = get_state_snapshot(builder, write_columns=self.columns)
 		builder.population.initializes_simulants(self.on_initialize, creates_columns=self.columns)
 
 		builder.event.register_listener('time_step', self.on_time_step)
+		self.bau_trajectory = get_bau_trajectory(builder)
+		self.delta_mode = delta_mode(builder.configuration)
 		
 
 	def load_circuit(self, builder):
 		df_states = pd.DataFrame()
 		for state in self.states:
 			# Load intervention prevalence
-			df = builder.data.load('circuit.{}.{}'.format(self.prevelanceName_int, state))
+			df = LoadTable(builder, 'circuit.{}.{}'.format(self.prevelanceName_int, state))
 			df['age'] = df['age'].astype(float)
 			df['value'] = df['value'].astype(float)
 			df = df[['age', 'sex', 'strata', 'value']].rename(
@@ -162,7 +235,7 @@ class Circuit:
 			df_states[['c_{}'.format(state)]] = df
 			
 			# Load bau prevalence
-			df = builder.data.load('circuit.{}.{}'.format(self.prevelanceName_bau, state))
+			df = LoadTable(builder, 'circuit.{}.{}'.format(self.prevelanceName_bau, state))
 			df['age'] = df['age'].astype(float)
 			df['value'] = df['value'].astype(float)
 			df = df[['age', 'sex', 'strata', 'value']].rename(
@@ -184,43 +257,169 @@ class Circuit:
 		self.state_view.update(self.state_data)
 
 
+	def setup_tunnels(self):
+		"""Find the column of each state, and of each end of the tunnel arcs."""
+		self.position = {column: i for i, column in enumerate(self.columns)}
+		self.pos_int = [self.position[column] for column in self.cols_int]
+		self.pos_bau = [self.position[column] for column in self.cols_bau]
+		# The row and column of each state in the matrices of rates.
+		self.state_number = {}
+		for positions in [self.pos_int, self.pos_bau]:
+			for number, position in enumerate(positions):
+				self.state_number[position] = number
+		self.tunnels = {}
+		for bau, (source, sink) in [(False, ('source', 'sink')),
+									(True, ('source_bau', 'sink_bau'))]:
+			sources = np.array([self.position[arc[source]] for arc in self.tunnel_arcs], dtype=int)
+			sinks = np.array([self.position[arc[sink]] for arc in self.tunnel_arcs], dtype=int)
+			self.tunnels[bau] = (sources, sinks, len(np.unique(sinks)) == len(sinks))
+
+
 	def on_time_step(self, event):
 		"""
 		Calculate the flow into each component
 		"""
-		states = self.state_view.get(event.index)
+		states = self.snapshot.get(event.index, self.columns)
 		#print(states)
-		if states.empty:
+		if states.empty or not self.columns:
+			return
+		values = np.column_stack([states[column] for column in self.columns])
+		values_new = values.copy()
+		bau = restore_bau(self.bau_trajectory, self.name, states.index)
+
+		# Evaluate the rates for the tracked simulants, so that they are
+		# aligned with the rows of the states.
+		index = states.index
+		flows = [(arc, np.asarray(arc['rate'](index))) for arc in self.arcs]
+		static_flows = [(arc, np.asarray(arc['rate_both'](index)))
+						for arc in self.static_arcs]
+		if bau is None or self.delta_mode:
+			flows_bau = [(arc, np.asarray(arc['rate_bau'](index))) for arc in self.arcs]
+
+		if bau is None:
+			self.apply_flows(values, values_new, flows_bau + static_flows, bau=True)
+			record_bau(self.bau_trajectory, self.name, pd.DataFrame(
+				values_new[:, self.pos_bau], index=states.index, columns=self.cols_bau))
+		else:
+			values_new[:, self.pos_bau] = bau[self.cols_bau].to_numpy()
+
+		if self.delta_mode:
+			# Cohorts whose state and flows equal BAU take the BAU result.
+			rows = diverged_rows(
+				[values[:, self.pos_int]] + [flow for _, flow in flows],
+				[values[:, self.pos_bau]] + [flow for _, flow in flows_bau])
+			values_new[:, self.pos_int] = values_new[:, self.pos_bau]
+			if rows.any():
+				values_rows = values[rows]
+				values_rows_new = values_rows.copy()
+				self.apply_flows(values_rows, values_rows_new,
+								 [(arc, flow[rows]) for arc, flow in flows + static_flows])
+				values_new[np.ix_(rows, self.pos_int)] = values_rows_new[:, self.pos_int]
+		else:
+			self.apply_flows(values, values_new, flows + static_flows)
+
+		#print(values_new)
+		self.snapshot.update(pd.DataFrame(values_new, index=states.index, columns=self.columns))
+
+
+	def apply_flows(self, states, states_new, flows, bau=False):
+		"""Move the flow along each arc, in either the BAU or the intervention
+		scenario.
+
+		Parameters
+		----------
+		states
+			The states at the start of the time-step, as an array with one
+			column per state.
+		states_new
+			The states at the end of the time-step, which are updated.
+		flows
+			A list of (arc, flow rate) pairs.
+		bau
+			Whether to move the BAU states.
+
+		"""
+		if self.continuous_time:
+			self.apply_rates(states, states_new, flows, bau=bau)
 			return
-		states_new = states.copy()
 
-		for arc in self.arcs:
-			flow = arc['rate'](event.index)
-			#print('arc', arc)
-			#print('IS_NAN', flow.isnull().values.any())
-			#print(flow)
-			states_new[arc['sink']] += states[arc['source']] * flow
-			states_new[arc['source']] -= states[arc['source']] * flow
+		source, sink = ('source_bau', 'sink_bau') if bau else ('source', 'sink')
+		for arc, flow in flows:
+			moved = states[:, self.position[arc[source]]] * flow
+			states_new[:, self.position[arc[sink]]] += moved
+			states_new[:, self.position[arc[source]]] -= moved
 
-			flow_bau = arc['rate_bau'](event.index)
-			states_new[arc['sink_bau']] += states[arc['source_bau']] * flow_bau
-			states_new[arc['source_bau']] -= states[arc['source_bau']] * flow_bau
-			#print(states_new)
+		# Shift the contents of every tunnel along by one state, as a block.
+		sources, sinks, unique = self.tunnels[bau]
+		if len(sources) > 0:
+			moved = states[:, sources]
+			states_new[:, sources] -= moved
+			if unique:
+				states_new[:, sinks] += moved
+			else:
+				np.add.at(states_new, (slice(None), sinks), moved)
 
-		for arc in self.static_arcs:
-			flow = arc['rate_both'](event.index)
-			#print('arc static', arc)
-			#print('IS_NAN', flow.isnull().values.any())
-			#print(flow)
-			states_new[arc['sink']] += states[arc['source']] * flow
-			states_new[arc['source']] -= states[arc['source']] * flow
 
-			states_new[arc['sink_bau']] += states[arc['source_bau']] * flow
-			states_new[arc['source_bau']] -= states[arc['source_bau']] * flow
-			#print(states_new)
+	def apply_rates(self, states, states_new, flows, bau=False):
+		"""Apply the exact transitions over the time-step, in either the BAU or
+		the intervention scenario, with the yearly proportions of the arcs
+		converted to continuous-time rates.
 
-		#print(states_new)
-		self.state_view.update(states_new)
+		Parameters
+		----------
+		states
+			The states at the start of the time-step, as an array with one
+			column per state.
+		states_new
+			The states at the end of the time-step, which are updated.
+		flows
+			A list of (arc, flow rate) pairs.
+		bau
+			Whether to move the BAU states.
+
+		"""
+		source, sink = ('source_bau', 'sink_bau') if bau else ('source', 'sink')
+		positions = self.pos_bau if bau else self.pos_int
+		size = len(positions)
+		rows = states.shape[0]
+		arcs = [(self.state_number[self.position[arc[source]]],
+				 self.state_number[self.position[arc[sink]]],
+				 np.broadcast_to(np.asarray(flow, dtype=float), (rows,)))
+				for arc, flow in flows]
+		# Tunnels move all of their source each year.
+		tunnel_sources, tunnel_sinks, _ = self.tunnels[bau]
+		for i, j in zip(tunnel_sources, tunnel_sinks):
+			arcs.append((self.state_number[i], self.state_number[j], np.ones(rows)))
+
+		# The total proportion of each source that leaves it in a year.
+		leaving = np.zeros((rows, size))
+		for i, _, flow in arcs:
+			leaving[:, i] += flow
+		# Allow for rounding in proportions that are meant to sum to one.
+		emptied = leaving >= 1 - 1e-9
+		with np.errstate(divide='ignore', invalid='ignore'):
+			scale = np.where((leaving > 0) & ~emptied,
+							 -np.log1p(-np.minimum(leaving, 1)) / leaving, 0)
+
+		# The matrix of rates for each cohort, where rates[:, j, i] is the
+		# rate of flow from state i to state j.
+		rates = np.zeros((rows, size, size))
+		for i, j, flow in arcs:
+			rate = flow * scale[:, i]
+			rates[:, j, i] += rate
+			rates[:, i, i] -= rate
+
+		transitions = BatchedExpm(rates * self.years_per_timestep)
+		current = states[:, positions]
+		result = np.einsum('nji,ni->nj', transitions, current)
+
+		# Sources that are emptied each year, such as tunnels, move their
+		# contents at the start of the time-step as a block.
+		for i, j, flow in arcs:
+			moved = np.where(emptied[:, i], current[:, i] * flow, 0)
+			result[:, i] -= moved
+			result[:, j] += moved
+		states_new[:, positions] = result
 
 
 	def register_modifier(self, builder, disease):
@@ -238,9 +437,9 @@ class Circuit:
 
 		"""
 		rate_templates = []
-		if IsInArtifact(builder.data, 'chronic_disease.{}.incidence'.format(disease)):
+		if IsInArtifact(builder, 'chronic_disease.{}.incidence'.format(disease)):
 			rate_templates += ['{}_intervention.incidence']
-		if IsInArtifact(builder.data, 'acute_disease.{}.mortality'.format(disease)):
+		if IsInArtifact(builder, 'acute_disease.{}.mortality'.format(disease)):
 			rate_templates += ['{}_intervention.excess_mortality', '{}_intervention.yld_rate']
 		
 		for template in rate_templates:
@@ -289,7 +488,13 @@ class Circuit:
 			The un-adjusted disease incidence rate.
 
 		"""
-		fullView = self.state_view.get(index)
+		fullView = self.snapshot.get(index, self.columns).to_frame()
+		if self.delta_mode:
+			# The rate is unchanged for cohorts in the BAU state.
+			rows = diverged_rows([fullView[self.cols_int]], [fullView[self.cols_bau]])
+			if not rows.any():
+				return incidence_rate
+			fullView = fullView[rows]
 		df_int = fullView.loc[:, self.cols_int]
 		df_bau = fullView.loc[:, self.cols_bau]
 
@@ -301,5 +506,7 @@ class Circuit:
 		df_int = self.FindRrMean(fullView.index, df_int, df_disease_rr)
 		df_bau = self.FindRrMean(fullView.index, df_bau, df_disease_rr, append='_bau')
 		df_pif = (df_bau - df_int) / df_bau
+		if self.delta_mode:
+			df_pif = df_pif.reindex(index, fill_value=0)
 		
 		return incidence_rate * (1 - df_pif)
@@ -0,0 +1,132 @@
+"""
+============================
+Chronic disease compartments
+============================
+
+The susceptible (``S``) and diseased (``C``) populations of every chronic
+disease, in the BAU and intervention scenarios, are stored in a single array
+indexed by (buffer, disease, scenario, compartment, simulant), rather than
+as eight state table columns per disease.
+
+One buffer holds the values at the end of the current time-step, and the
+other holds the values at the start of the time-step ("previous"). At the
+start of each time-step (other than the first) the buffers are swapped, and
+each disease writes its new values into the current buffer, so the current
+values never need to be copied into the previous values.
+
+Observers can obtain the values as data frames with the original column
+names (e.g., ``<disease>_S_intervention_previous``) with ``frame``.
+
+"""
+import weakref
+
+import numpy as np
+import pandas as pd
+
+
+BAU, INTERVENTION = 0, 1
+SUSCEPTIBLE, DISEASED = 0, 1
+
+SCENARIOS = {BAU: '', INTERVENTION: '_intervention'}
+COMPARTMENTS = {SUSCEPTIBLE: 'S', DISEASED: 'C'}
+
+# The compartments of each simulation, keyed on its configuration.
+_disease_states = weakref.WeakKeyDictionary()
+
+
+class DiseaseStates:
+	"""The compartments of the chronic diseases in a simulation."""
+
+	def __init__(self, builder):
+		self.diseases = {}
+		self.values = None
+		self.current = 0
+		self.clock = builder.time.clock()
+		self.start_year = builder.configuration.time.start.year
+		# Swap the buffers before the diseases are updated.
+		builder.event.register_listener('time_step__prepare',
+										self.on_time_step_prepare, priority=0)
+
+	@property
+	def name(self):
+		return 'disease_states'
+
+	def register(self, name):
+		if name in self.diseases:
+			raise ValueError('Disease {} is already registered'.format(name))
+		self.diseases[name] = len(self.diseases)
+
+	def initialise(self, name, index, S, C):
+		"""Set the initial values of a disease, in both scenarios and buffers."""
+		size = index.max() + 1
+		if self.values is None:
+			self.values = np.zeros((2, len(self.diseases), 2, 2, size))
+		elif size > self.values.shape[-1]:
+			extra = size - self.values.shape[-1]
+			self.values = np.pad(self.values, [(0, 0)] * 4 + [(0, extra)])
+		rows = index.to_numpy()
+		disease = self.diseases[name]
+		for buffer in [0, 1]:
+			for scenario in SCENARIOS:
+				self.values[buffer, disease, scenario, SUSCEPTIBLE, rows] = S
+				self.values[buffer, disease, scenario, DISEASED, rows] = C
+
+	def on_time_step_prepare(self, event):
+		# The diseases are not updated in the first year.
+		if self.clock().year == self.start_year:
+			return
+		self.current = 1 - self.current
+
+	def get(self, name, index, previous=False):
+		"""
+		Get the values of a disease for the simulants in ``index``, as an
+		array indexed by (scenario, compartment, simulant).
+		"""
+		buffer = 1 - self.current if previous else self.current
+		return self.values[buffer, self.diseases[name]][:, :, index.to_numpy()]
+
+	def set(self, name, index, S_bau, C_bau, S_int, C_int):
+		"""Set the current values of a disease for the simulants in ``index``."""
+		values = self.values[self.current, self.diseases[name]]
+		rows = index.to_numpy()
+		values[BAU, SUSCEPTIBLE, rows] = S_bau
+		values[BAU, DISEASED, rows] = C_bau
+		values[INTERVENTION, SUSCEPTIBLE, rows] = S_int
+		values[INTERVENTION, DISEASED, rows] = C_int
+
+	def columns(self, name, index):
+		"""
+		Get the values of a disease as a dictionary of arrays, whose keys
+		are the column names without the disease prefix (e.g.,
+		``S_intervention_previous``).
+		"""
+		columns = {}
+		for previous, when in [(False, ''), (True, '_previous')]:
+			values = self.get(name, index, previous=previous)
+			for scenario, scenario_name in SCENARIOS.items():
+				for compartment, compartment_name in COMPARTMENTS.items():
+					key = compartment_name + scenario_name + when
+					columns[key] = values[scenario, compartment]
+		return columns
+
+	def frame(self, name, index):
+		"""Get the values of a disease with the original column names."""
+		columns = self.columns(name, index)
+		return pd.DataFrame({'{}_{}'.format(name, key): values
+							 for key, values in columns.items()}, index=index)
+
+	def get_state(self, name):
+		return {'values' : self.values[:, self.diseases[name]].copy(),
+				'current' : self.current}
+
+	def set_state(self, name, state):
+		self.values[:, self.diseases[name]] = state['values']
+		self.current = state['current']
+
+
+def get_disease_states(builder):
+	"""Get the chronic disease compartments shared by this simulation."""
+	config = builder.configuration
+	if config not in _disease_states:
+		_disease_states[config] = DiseaseStates(builder)
+	return _disease_states[config]
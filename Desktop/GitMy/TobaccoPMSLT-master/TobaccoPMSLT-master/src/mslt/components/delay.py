@@ -10,6 +10,14 @@ lifetable simulation.
 import pandas as pd
 import numpy as np
 
+from .artifact_index import load_table, prefetch_artifact
+from .snapshot import get_state_snapshot
+
+
+# The scenarios, and the first bins, of the exposure bin arrays.
+BAU, INTERVENTION = 0, 1
+NEVER, CURRENT, POST = 0, 1, 2
+
 
 class DelayedRisk:
 	"""
@@ -108,6 +116,7 @@ class DelayedRisk:
 		This involves loading the required data tables, registering event
 		handlers and rate modifiers, and setting up the population view.
 		"""
+		prefetch_artifact(builder)
 		self.config = builder.configuration
 
 		self.start_year = builder.configuration.time.start.year
@@ -160,6 +169,15 @@ class DelayedRisk:
 		self.mortality_rr = builder.lookup.build_table(mort_rr_data, 
 													   key_columns=['sex', 'strata'], 
 													   parameter_columns=['age','year'])
+		# Calculate the net RR of mortality, which is used to normalise the
+		# ACMR, for each row of the initial prevalence table.
+		net_rr_data = net_mortality_rr(prev_data, mort_rr_data, self.get_bin_names())
+		if net_rr_data is None:
+			self.net_mortality_rr = None
+		else:
+			self.net_mortality_rr = builder.lookup.build_table(net_rr_data, 
+															   key_columns=['sex', 'strata'], 
+															   parameter_columns=['age','year'])
 
 		# Register a modifier for each disease affected by this delayed risk.
 		diseases = self.config[self.name].affects.keys()
@@ -179,37 +197,44 @@ class DelayedRisk:
 			msg = 'Missing index columns for disease-specific relative risks'
 			raise ValueError(msg)
 
-		self.dis_rr = {}
-		for disease in diseases:
+		# Stack the relative risks of every disease into a single table, with
+		# the columns ordered by disease and then by exposure bin.
+		self.diseases = list(diseases)
+		bau_prefix = '{}.'.format(self.name)
+		bin_names = [c[len(bau_prefix):] for c in self.get_bin_names()
+					 if c.startswith(bau_prefix)]
+		dis_keys = [c for c in dis_rr_data.columns if c in key_columns]
+		rr_columns = []
+		for disease in self.diseases:
 			dis_columns = [c for c in dis_rr_data.columns
 						   if c.startswith(disease)]
-			dis_keys = [c for c in dis_rr_data.columns
-						if c in key_columns]
 			if not dis_columns or not dis_keys:
 				msg = 'No {} relative risks for disease {}'
 				raise ValueError(msg.format(self.name, disease))
-			rr_data = dis_rr_data.loc[:, dis_keys + dis_columns]
 			dis_prefix = '{}_'.format(disease)
-			bau_prefix = '{}.'.format(self.name)
-			int_prefix = '{}_intervention.'.format(self.name)
-			bau_col = {c: c.replace(dis_prefix, bau_prefix).replace('post_', '')
-					   for c in dis_columns}
-			int_col = {c: c.replace(dis_prefix, int_prefix).replace('post_', '')
+			bin_col = {c[len(dis_prefix):].replace('post_', ''): c
 					   for c in dis_columns}
-			for column in dis_columns:
-				# NOTE: avoid SettingWithCopyWarning
-				rr_data.loc[:, int_col[column]] = rr_data[column]
-			rr_data = rr_data.rename(columns=bau_col)
-			self.dis_rr[disease] = builder.lookup.build_table(rr_data, 
-															  key_columns=['sex', 'strata'], 
-															  parameter_columns=['age','year'])
-
-		# Add a handler to create the exposure bin columns.
+			missing = [b for b in bin_names if b not in bin_col]
+			if missing:
+				msg = 'Missing {} relative risks for disease {}: {}'
+				raise ValueError(msg.format(self.name, disease, missing))
+			rr_columns += [bin_col[b] for b in bin_names]
+		self.disease_rr_columns = rr_columns
+		self.disease_rr = builder.lookup.build_table(dis_rr_data.loc[:, dis_keys + rr_columns], 
+													 key_columns=['sex', 'strata'], 
+													 parameter_columns=['age','year'])
+		# The incidence PIFs are calculated once per time-step.
+		self.bins_version = 0
+		self.pif_cache = None
+
+		# The exposure bins are stored outside of the state table, in an array
+		# indexed by (scenario, bin, simulant).
 		req_columns = ['age', 'sex', 'strata', 'population']
-		new_columns = self.get_bin_names()
+		bin_cols = self.get_bin_names()
+		self.bau_cols = bin_cols[:len(bin_cols) // 2]
+		self.bins = None
 		builder.population.initializes_simulants(
 			self.on_initialize_simulants,
-			creates_columns=new_columns,
 			requires_columns=req_columns)
 
 		# Load the effects of a tobacco tax.
@@ -227,8 +252,8 @@ class DelayedRisk:
 										self.on_time_step_prepare)
 
 		# Define the columns that we need to access during the simulation.
-		view_columns = req_columns + new_columns
-		self.population_view = builder.population.get_view(view_columns)
+		self.population_view = builder.population.get_view(req_columns)
+		self.snapshot = get_state_snapshot(builder)
 
 		mortality_data = pivot_load(builder,'cause.all_causes.mortality')
 		self.tobacco_acmr = builder.value.register_rate_producer(
@@ -268,14 +293,6 @@ class DelayedRisk:
 		Define the initial distribution of the population across the bins, in
 		both the BAU and the intervention scenario.
 		"""
-		# Set all bins to zero, in order to create the required columns.
-		pop = pd.DataFrame({}, index=pop_data.index)
-		for column in self.get_bin_names():
-			pop[column] = 0.0
-
-		# Update the life table, so that we can then obtain a view that
-		# includes the population counts.
-		self.population_view.update(pop)
 		pop = self.population_view.get(pop_data.index)
 
 		# Calculate the absolute prevalence by multiplying the fractional
@@ -287,16 +304,26 @@ class DelayedRisk:
 		pop.population *= 1 - 0.5 * bau_probability_of_death
 
 		prev = self.initial_prevalence(pop_data.index).mul(pop['population'], axis=0)
-		self.population_view.update(prev)
-
-		# Rename the columns and apply the same initial prevalence for the
-		# intervention.
-		bau_prefix = '{}.'.format(self.name)
-		int_prefix = '{}_intervention.'.format(self.name)
-		rename_to = {c: c.replace(bau_prefix, int_prefix)
-					 for c in prev.columns if c.startswith(bau_prefix)}
-		int_prev = prev.rename(columns=rename_to)
-		self.population_view.update(int_prev)
+		prev = prev.reindex(columns=self.bau_cols, fill_value=0.0)
+
+		# Apply the same initial prevalence for the intervention.
+		size = pop_data.index.max() + 1
+		if self.bins is None:
+			self.bins = np.zeros((2, len(self.bau_cols), size))
+		elif size > self.bins.shape[-1]:
+			extra = size - self.bins.shape[-1]
+			self.bins = np.pad(self.bins, [(0, 0), (0, 0), (0, extra)])
+		rows = pop_data.index.to_numpy()
+		for scenario in [BAU, INTERVENTION]:
+			self.bins[scenario][:, rows] = prev.to_numpy().T
+		self.bins_version += 1
+
+	def get_checkpoint_state(self):
+		return {'bins' : self.bins.copy()}
+
+	def set_checkpoint_state(self, state):
+		self.bins = state['bins'].copy()
+		self.bins_version += 1
 
 	def on_time_step_prepare(self, event):
 		"""Account for transitions between bins, and for mortality rates.
@@ -310,125 +337,79 @@ class DelayedRisk:
 		if self.clock().year == self.start_year:
 			return
 
-		pop = self.population_view.get(event.index)
+		pop = self.snapshot.get(event.index, [])
 		if pop.empty:
 			return
 		idx = pop.index
-		bau_acmr = self.acm_rate.source(idx)
-		inc_rate = self.incidence(idx)
-		rem_rate = self.remission(idx)
-		int_inc_rate = self.int_incidence(idx)
-		int_rem_rate = self.int_remission(idx)
-
-		# Identify the relevant columns for the BAU and intervention.
-		bin_cols = self.get_bin_names()
-		bau_prefix = '{}.'.format(self.name)
-		int_prefix = '{}_intervention.'.format(self.name)
-		bau_cols = [c for c in bin_cols if c.startswith(bau_prefix)]
-		int_cols = [c for c in bin_cols if c.startswith(int_prefix)]
+		rows = idx.to_numpy()
+		# The bins of each scenario, indexed by (scenario, bin, simulant).
+		bins = self.bins[:, :, rows]
 
 		# Extract the RR of mortality associated with each exposure level.
-		mort_rr = self.mortality_rr(idx)
+		mort_rr = self.mortality_rr(idx)[self.bau_cols].to_numpy(copy=True).T
 
 		# Normalise the survival rate; never-smokers should have a mortality
 		# rate that is lower than the ACMR, since current-smokers and
-		# previous-smokers have higher RRs of mortality.
-		weight_by_initial_prevalence = True
-		if weight_by_initial_prevalence:
-			# Load the initial exposure distribution, because it will be used
-			# to adjust the ACMR.
-			prev = self.initial_prevalence(pop.index)
-			prev = prev.loc[:, bau_cols]
-			# Multiply these fractions by the RR of mortality associated with
-			# each exposure level.
-			bau_wtd_rr = prev.mul(mort_rr.loc[:, bau_cols])
+		# previous-smokers have higher RRs of mortality. The net RR of
+		# mortality is weighted by the initial exposure distribution.
+		bau_acmr = self.acm_rate.source(idx).to_numpy()
+		if self.net_mortality_rr is not None:
+			bau_net_rr = self.net_mortality_rr(idx).to_numpy()
 		else:
-			# Calculate the fraction of the population in each exposure level.
-			bau_popn = pop.loc[:, bau_cols].sum(axis=1)
-			bau_prev = pop.loc[:, bau_cols].divide(bau_popn, axis=0)
-			# Multiply these fractions by the RR of mortality associated with
-			# each exposure level.
-			bau_wtd_rr = bau_prev.mul(mort_rr.loc[:, bau_cols])
-
-		# Sum these terms to obtain the net RR of mortality.
-		bau_net_rr = bau_wtd_rr.sum(axis=1)
+			prev = self.initial_prevalence(idx)[self.bau_cols].to_numpy().T
+			bau_net_rr = (prev * mort_rr).sum(axis=0)
 		# The mortality rate for never-smokers is the population ACMR divided
 		# by this net RR of mortality.
-		bau_acmr_no = bau_acmr.divide(bau_net_rr)
+		bau_acmr_no = bau_acmr / bau_net_rr
 
 		# NOTE: adjust the RR *after* calculating the ACMR adjustments, but
 		# *before* calculating the survival probability for each exposure
 		# level.
-		penultimate_cols = [s + str(self.bin_years)
-							for s in [bau_prefix, int_prefix]]
-		mort_rr.loc[:, penultimate_cols] = 1.0
+		mort_rr[POST + self.bin_years] = 1.0
 
 		# Calculate the mortality risk for non-smokers.
 		bau_surv_no = 1 - np.exp(- bau_acmr_no)
 		# Calculate the survival probability for each exposure level:
 		#     (1 - mort_risk_non_smokers)^RR
-		bau_surv_rate = mort_rr.loc[:, bau_cols].rpow(1 - bau_surv_no, axis=0)
-		# Calculate the number of survivors for each exposure level (BAU).
-		pop.loc[:, bau_cols] = pop.loc[:, bau_cols].mul(bau_surv_rate)
-
-		# Calculate the number of survivors for each exposure level
-		# (intervention).
+		surv_rate = (1 - bau_surv_no) ** mort_rr
+		# Calculate the number of survivors for each exposure level.
 		# NOTE: we apply the same survival rate to each exposure level for
 		# the intervention scenario as we used for the BAU scenario.
-		rename_to = {c: c.replace('.', '_intervention.')
-					 for c in bau_surv_rate.columns}
-		int_surv_rate = bau_surv_rate.rename(columns=rename_to)
-		pop.loc[:, int_cols] = pop.loc[:, int_cols].mul(int_surv_rate)
+		bins *= surv_rate
 
 		# Account for transitions between bins.
-		# Note that the order of evaluation matters.
-		suffixes = ['', '_intervention']
-		# First, accumulate the final post-exposure bin.
+		# The post-exposure bins of each scenario form a tunnel, which is
+		# shifted along by one bin as a single block.
 		if self.bin_years > 0:
-			for suffix in suffixes:
-				accum_col = '{}{}.{}'.format(self.name, suffix, self.bin_years + 1)
-				from_col = '{}{}.{}'.format(self.name, suffix, self.bin_years)
-				pop[accum_col] += pop[from_col]
-		# Then increase time since exposure for all other post-exposure bins.
-		for n_years in reversed(range(self.bin_years)):
-			for suffix in suffixes:
-				source_col = '{}{}.{}'.format(self.name, suffix, n_years)
-				dest_col = '{}{}.{}'.format(self.name, suffix, n_years + 1)
-				pop[dest_col] = pop[source_col]
+			# First, accumulate the final post-exposure bin.
+			bins[:, -1] += bins[:, -2]
+			# Then increase time since exposure for all other post-exposure bins.
+			bins[:, POST + 1:-1] = bins[:, POST:-2].copy()
 
 		# Account for incidence and remission.
-		col_no = '{}.no'.format(self.name)
-		col_int_no = '{}_intervention.no'.format(self.name)
-		col_yes = '{}.yes'.format(self.name)
-		col_int_yes = '{}_intervention.yes'.format(self.name)
-		col_zero = '{}.0'.format(self.name)
-		col_int_zero = '{}_intervention.0'.format(self.name)
-
-		inc = inc_rate * pop[col_no]
-		int_inc = int_inc_rate * pop[col_int_no]
-		rem = rem_rate * pop[col_yes]
-		int_rem = int_rem_rate * pop[col_int_yes]
+		inc_rate = np.stack([self.incidence(idx), self.int_incidence(idx)])
+		rem_rate = np.stack([self.remission(idx), self.int_remission(idx)])
+		inc = inc_rate * bins[:, NEVER]
+		rem = rem_rate * bins[:, CURRENT]
 
 		# Account for the effects of a tobacco tax.
 		if self.tobacco_tax:
 			# The tax has a scaling effect (reduction) on incidence, and
 			# causes additional remission.
-			tax_inc = self.tax_effect_inc(idx)
-			tax_rem = self.tax_effect_rem(idx)
-			int_inc = int_inc * tax_inc
-			int_rem = int_rem + (1 - tax_rem) * pop[col_int_yes]
+			tax_inc = self.tax_effect_inc(idx).to_numpy()
+			tax_rem = self.tax_effect_rem(idx).to_numpy()
+			inc[INTERVENTION] = inc[INTERVENTION] * tax_inc
+			rem[INTERVENTION] = rem[INTERVENTION] + (1 - tax_rem) * bins[INTERVENTION, CURRENT]
 
 		# Apply the incidence rate to the never-exposed population.
-		pop[col_no] = pop[col_no] - inc
-		pop[col_int_no] = pop[col_int_no] - int_inc
+		bins[:, NEVER] = bins[:, NEVER] - inc
 		# Incidence and remission affect who is currently exposed.
-		pop[col_yes] = pop[col_yes] + inc - rem
-		pop[col_int_yes] = pop[col_int_yes] + int_inc - int_rem
+		bins[:, CURRENT] = bins[:, CURRENT] + inc - rem
 		# Those who have just remitted enter the first post-remission bin.
-		pop[col_zero] = rem
-		pop[col_int_zero] = int_rem
+		bins[:, POST] = rem
 
-		self.population_view.update(pop)
+		self.bins[:, :, rows] = bins
+		self.bins_version += 1
 
 	def register_modifier(self, builder, disease):
 		"""Register that a disease incidence rate will be modified by this
@@ -467,33 +448,51 @@ class DelayedRisk:
 			The un-adjusted disease incidence rate.
 
 		"""
-		# Multiply the population in each bin by the associated relative risk.
-		bin_cols = self.get_bin_names()
-		pop = self.population_view.get(index)
-		incidence_rr = self.dis_rr[disease](pop.index)[bin_cols]
-		rr_values = pop[bin_cols] * incidence_rr
-
-		# Calculate the mean relative-risk for the BAU scenario.
-		bau_prefix = '{}.'.format(self.name)
-		bau_cols = [c for c in bin_cols if c.startswith(bau_prefix)]
-		# Sum over all of the bins in each row.
-		mean_bau_rr = rr_values[bau_cols].sum(axis=1) / pop[bau_cols].sum(axis=1)
-		# Handle cases where the population size is zero.
-		mean_bau_rr = mean_bau_rr.fillna(1.0)
-
-		# Calculate the mean relative-risk for the intervention scenario.
-		int_prefix = '{}_intervention.'.format(self.name)
-		int_cols = [c for c in bin_cols if c.startswith(int_prefix)]
-		# Sum over all of the bins in each row.
-		mean_int_rr = rr_values[int_cols].sum(axis=1) / pop[int_cols].sum(axis=1)
-		# Handle cases where the population size is zero.
-		mean_int_rr = mean_int_rr.fillna(1.0)
-
-		# Calculate the disease incidence PIF for the intervention scenario.
-		pif = (mean_bau_rr - mean_int_rr) / mean_bau_rr
-		pif = pif.fillna(0.0)
+		pif = self.incidence_pif(index)[disease]
 		return incidence_rate * (1 - pif)
 
+	def incidence_pif(self, index):
+		"""Calculate the incidence PIF of every affected disease, for the
+		tracked simulants in ``index``.
+
+		The PIFs are cached until the exposure bins or the state table change,
+		so that they are calculated once per time-step for all of the
+		diseases and rates that are modified by this delayed risk.
+
+		Returns
+		-------
+		A data frame with one column for each disease.
+
+		"""
+		pop = self.snapshot.get(index, [])
+		table = self.snapshot.table
+		if self.pif_cache is not None and table is not None:
+			version, cached_table, cached_pif = self.pif_cache
+			if (version == self.bins_version and cached_table is table
+					and pop.index.isin(cached_pif.index).all()):
+				return cached_pif.loc[pop.index]
+
+		# Multiply the population in each bin by the associated relative risk,
+		# and sum over all of the bins, for each scenario and disease.
+		n = len(pop.index)
+		bins = self.bins[:, :, pop.index.to_numpy()]
+		incidence_rr = self.disease_rr(pop.index)[self.disease_rr_columns]
+		incidence_rr = incidence_rr.to_numpy().T.reshape(len(self.diseases), -1, n)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			mean_rr = np.einsum('sbn,dbn->sdn', bins, incidence_rr)
+			mean_rr /= bins.sum(axis=1)[:, np.newaxis]
+			# Handle cases where the population size is zero.
+			mean_rr[np.isnan(mean_rr)] = 1.0
+
+			# Calculate the disease incidence PIF for the intervention scenario.
+			pif = (mean_rr[BAU] - mean_rr[INTERVENTION]) / mean_rr[BAU]
+			pif[np.isnan(pif)] = 0.0
+
+		pif = pd.DataFrame(pif.T, index=pop.index, columns=self.diseases)
+		if table is not None:
+			self.pif_cache = (self.bins_version, table, pif)
+		return pif
+
 def pivot_load(builder, entity_key):
 	"""Helper method for loading dataframe from artifact.
 
@@ -501,10 +500,35 @@ def pivot_load(builder, entity_key):
 	named 'measure'.
 
 	"""
-	data = builder.data.load(entity_key)
+	data = load_table(builder, entity_key)
 
 	if 'measure' in data.columns :
 		data  = data.pivot_table(index = [i for i in data.columns if i not in ['measure','value']], columns = 'measure', \
 		values = 'value').rename_axis(None,axis = 1).reset_index()
 	
 	return data    
+
+
+def net_mortality_rr(prev_data, mort_rr_data, bin_cols):
+	"""
+	Calculate the net RR of mortality for each row of the initial prevalence
+	table, by weighting the RR of mortality for each exposure level by the
+	initial exposure distribution.
+
+	Returns ``None`` if the rows of the two tables do not match, in which
+	case the net RR must be calculated at each time-step.
+	"""
+	bau_cols = bin_cols[:len(bin_cols) // 2]
+	key_columns = [c for c in prev_data.columns
+				   if c in mort_rr_data.columns and c not in bin_cols]
+	if any(c not in prev_data.columns or c not in mort_rr_data.columns
+		   for c in bau_cols):
+		return None
+	if len(prev_data) != len(mort_rr_data):
+		return None
+	prev = prev_data.set_index(key_columns).sort_index()
+	mort_rr = mort_rr_data.set_index(key_columns).sort_index()
+	if not prev.index.equals(mort_rr.index) or not prev.index.is_unique:
+		return None
+	net_rr = (prev[bau_cols] * mort_rr[bau_cols]).sum(axis=1)
+	return net_rr.rename('value').reset_index()
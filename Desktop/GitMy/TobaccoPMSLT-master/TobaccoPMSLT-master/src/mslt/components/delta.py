@@ -0,0 +1,54 @@
+"""
+==========
+Delta mode
+==========
+
+Most interventions only change the inputs of some cohorts (e.g., those that
+are targeted by a magic wand, or that are old enough to smoke), and the
+intervention arm of every other cohort stays equal to the BAU arm. When
+``delta_mode`` is enabled, components find the cohorts whose intervention
+state or rates differ from BAU at each time-step, and only calculate the
+intervention arm for these cohorts. The other cohorts take the BAU result.
+
+.. code-block:: yaml
+
+   configuration:
+       delta_mode: True
+
+Since the same calculations are applied to the same values, the results are
+identical to those obtained without ``delta_mode``.
+
+"""
+import numpy as np
+
+
+def delta_mode(config):
+	return 'delta_mode' in config and bool(config.delta_mode)
+
+
+def diverged_rows(intervention, bau):
+	"""
+	Find the rows where any intervention value differs from the matching BAU
+	value.
+
+	Parameters
+	----------
+	intervention
+		A list of intervention values (Series, data frames or arrays), each
+		with one row per cohort.
+	bau
+		The matching list of BAU values, with columns in the same order.
+
+	Returns
+	-------
+	A boolean array with one element per cohort.
+
+	"""
+	rows = None
+	for int_values, bau_values in zip(intervention, bau):
+		# NOTE: NaN values never compare equal, and so are always calculated.
+		differs = np.asarray(int_values) != np.asarray(bau_values)
+		if differs.ndim > 1:
+			differs = differs.any(axis=1)
+		rows = differs if rows is None else rows | differs
+	return rows
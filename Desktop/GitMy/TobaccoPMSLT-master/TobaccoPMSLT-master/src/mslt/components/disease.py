@@ -10,6 +10,13 @@ simulations.
 import numpy as np
 import pandas as pd
 
+from .artifact_index import load_table, prefetch_artifact
+from .bau_cache import get_bau_trajectory, restore_bau, record_bau
+from .compartments import get_disease_states, BAU, INTERVENTION, SUSCEPTIBLE, DISEASED
+from .delta import delta_mode, diverged_rows
+from .pipeline import register_additive
+from .snapshot import get_state_snapshot
+
 
 class AcuteDisease:
 	"""
@@ -40,6 +47,7 @@ class AcuteDisease:
 		return self._name
 
 	def setup(self, builder):
+		prefetch_artifact(builder)
 		self.data_name = self.name
 		self.no_bau = False
 		self.track_expenditure = False
@@ -69,7 +77,7 @@ class AcuteDisease:
 		}
 
 		"""Load the mortality data."""
-		mty_data = builder.data.load(f'acute_disease.{self.data_name}.mortality')
+		mty_data = load_table(builder, f'acute_disease.{self.data_name}.mortality')
 		mty_rate = builder.lookup.build_table(mty_data, 
 											  key_columns=['sex', 'strata'], 
 											  parameter_columns=['age','year'])
@@ -79,10 +87,10 @@ class AcuteDisease:
 		self.int_excess_mortality = builder.value.register_value_producer(
 			f'{self.name}_intervention.excess_mortality',
 			source=mty_rate)
-		builder.value.register_value_modifier('mortality_rate', self.mortality_adjustment)
+		register_additive(builder, 'mortality_rate', self.mortality_delta)
 
 		"""Load the morbidity data."""
-		yld_data = builder.data.load(f'acute_disease.{self.data_name}.morbidity')
+		yld_data = load_table(builder, f'acute_disease.{self.data_name}.morbidity')
 		yld_rate = builder.lookup.build_table(yld_data,
 											  key_columns=['sex', 'strata'], 
 											  parameter_columns=['age','year'])
@@ -92,7 +100,7 @@ class AcuteDisease:
 		self.int_disability_rate = builder.value.register_value_producer(
 			f'{self.name}_intervention.yld_rate',
 			source=yld_rate)
-		builder.value.register_value_modifier('yld_rate', self.disability_adjustment)
+		register_additive(builder, 'yld_rate', self.disability_delta)
 
 		"""Load the expenditure data."""
 		if self.track_expenditure:
@@ -104,7 +112,7 @@ class AcuteDisease:
 					f'{self.name}_total_spent': 0.0,
 					f'{self.name}_total_spent_bau': 0.0,
 			})
-			expenditure_rate = builder.data.load(f'acute_disease.{self.data_name}.expenditure')
+			expenditure_rate = load_table(builder, f'acute_disease.{self.data_name}.expenditure')
 			expenditure_rate = builder.lookup.build_table(expenditure_rate,
 												key_columns=['sex', 'strata'], 
 												parameter_columns=['age','year'])
@@ -114,11 +122,11 @@ class AcuteDisease:
 			self.int_expenditure_rate = builder.value.register_value_producer(
 				f'{self.name}_intervention.expenditure_rate',
 				source=expenditure_rate)
-			builder.value.register_value_modifier('expenditure_rate', self.expenditure_adjustment)
+			register_additive(builder, 'expenditure_rate', self.expenditure_delta)
 
 		"""Load the income data."""
 		if self.track_income:
-			income_rate = builder.data.load(f'acute_disease.{self.data_name}.income')
+			income_rate = load_table(builder, f'acute_disease.{self.data_name}.income')
 			income_rate = builder.lookup.build_table(income_rate,
 												key_columns=['sex', 'strata'], 
 												parameter_columns=['age','year'])
@@ -128,7 +136,7 @@ class AcuteDisease:
 			self.int_income = builder.value.register_value_producer(
 				f'{self.name}_intervention.income',
 				source=income_rate)
-			builder.value.register_value_modifier('income', self.income_adjustment)
+			register_additive(builder, 'income', self.income_delta)
 
 		"""Get the table view"""
 		self.years_per_timestep = builder.configuration.time.step_size/365
@@ -148,80 +156,81 @@ class AcuteDisease:
 
 		self.population_view.update(pop)
 
-	def mortality_adjustment(self, index, mortality_rate):
+	def mortality_delta(self, index):
 		"""
-		Adjust the all-cause mortality rate in the intervention scenario, to
-		account for any change in prevalence (relative to the BAU scenario).
+		Calculate the change in the all-cause mortality rate in the
+		intervention scenario, to account for any change in prevalence
+		(relative to the BAU scenario).
 		"""
 		pop = self.population_view.get(index)
+		rate_int = self.int_excess_mortality(index)
 		# self.years_per_timestep converts from per-year to per-month
 		if self.no_bau:
-			delta = self.int_excess_mortality(index)
-			pop[self.name + '_deaths'] = pop.population * self.int_excess_mortality(index) * self.years_per_timestep
+			delta = rate_int
+			pop[self.name + '_deaths'] = pop.population * rate_int * self.years_per_timestep
 		else:
-			delta = self.int_excess_mortality(index) - self.excess_mortality(index)
-			pop[self.name + '_deaths'] = pop.population * self.int_excess_mortality(index) * self.years_per_timestep
-			pop[self.name + '_deaths_bau'] = pop.bau_population * self.excess_mortality(index) * self.years_per_timestep
+			rate_bau = self.excess_mortality(index)
+			delta = rate_int - rate_bau
+			pop[self.name + '_deaths'] = pop.population * rate_int * self.years_per_timestep
+			pop[self.name + '_deaths_bau'] = pop.bau_population * rate_bau * self.years_per_timestep
 		
 		self.population_view.update(pop)
-		return mortality_rate + delta
+		return delta.to_numpy()
 
-	def disability_adjustment(self, index, yld_rate):
+	def disability_delta(self, index):
 		"""
-		Adjust the years lost due to disability (YLD) rate in the intervention
-		scenario, to account for any change in prevalence (relative to the BAU
-		scenario).
+		Calculate the change in the years lost due to disability (YLD) rate in
+		the intervention scenario, to account for any change in prevalence
+		(relative to the BAU scenario).
 		"""
 		
 		pop = self.population_view.get(index)
+		rate_int = self.int_disability_rate(index)
 		# person_years is already for this month, so no multiplier is required.
 		if self.no_bau:
-			delta = self.int_disability_rate(index)
-			pop[self.name + '_HALY'] = -pop.person_years * self.int_disability_rate(index)
+			delta = rate_int
+			pop[self.name + '_HALY'] = -pop.person_years * rate_int
 		else:
-			delta = self.int_disability_rate(index) - self.disability_rate(index)
-			pop[self.name + '_HALY'] = -(pop.alive_person_years + 0.5 * pop.dead_person_years) * self.int_disability_rate(index)
-			pop[self.name + '_HALY_bau'] = -(pop.bau_alive_person_years + 0.5 * pop.bau_dead_person_years) * self.disability_rate(index)
+			rate_bau = self.disability_rate(index)
+			delta = rate_int - rate_bau
+			pop[self.name + '_HALY'] = -(pop.alive_person_years + 0.5 * pop.dead_person_years) * rate_int
+			pop[self.name + '_HALY_bau'] = -(pop.bau_alive_person_years + 0.5 * pop.bau_dead_person_years) * rate_bau
 		
 		self.population_view.update(pop)
-		return yld_rate + delta
+		return delta.to_numpy()
 
-	def expenditure_adjustment(self, index, expenditure_rate):
+	def expenditure_delta(self, index):
 		"""
-		Adjust the expenditure rate in the intervention
+		Calculate the change in the expenditure rate in the intervention
 		scenario, to account for any change in prevalence (relative to the BAU
 		scenario).
 		"""
 		
 		pop = self.population_view.get(index)
+		rate_int = self.int_expenditure_rate(index)
 		# person_years is already for this month, so no multiplier is required.
 		if self.no_bau:
-			delta = self.int_expenditure_rate(index)
-			pop[self.name + '_total_spent'] = -pop.person_years * self.int_expenditure_rate(index)
+			delta = rate_int
+			pop[self.name + '_total_spent'] = -pop.person_years * rate_int
 		else:
-			delta = self.int_expenditure_rate(index) - self.expenditure_rate(index)
-			pop[self.name + '_total_spent'] = -(pop.alive_person_years + 0.5 * pop.dead_person_years) * self.int_expenditure_rate(index)
-			pop[self.name + '_total_spent_bau'] = -(pop.bau_alive_person_years + 0.5 * pop.bau_dead_person_years) * self.expenditure_rate(index)
+			rate_bau = self.expenditure_rate(index)
+			delta = rate_int - rate_bau
+			pop[self.name + '_total_spent'] = -(pop.alive_person_years + 0.5 * pop.dead_person_years) * rate_int
+			pop[self.name + '_total_spent_bau'] = -(pop.bau_alive_person_years + 0.5 * pop.bau_dead_person_years) * rate_bau
 		
 		self.population_view.update(pop)
-		return expenditure_rate + delta
+		return delta.to_numpy()
 
-	def income_adjustment(self, index, income):
+	def income_delta(self, index):
 		"""
-		Adjust the income in the intervention
-		scenario, to account for any change in prevalence (relative to the BAU
-		scenario).
+		Calculate the change in income in the intervention scenario, to
+		account for any change in prevalence (relative to the BAU scenario).
 		"""
-		
-		pop = self.population_view.get(index)
-		# person_years is already for this month, so no multiplier is required.
 		if self.no_bau:
 			delta = self.int_income(index)
 		else:
 			delta = self.int_income(index) - self.income(index)
-		
-		self.population_view.update(pop)
-		return income + delta
+		return delta.to_numpy()
 
 
 class Disease:
@@ -257,6 +266,7 @@ class Disease:
 
 	def setup(self, builder):
 		"""Load the disease prevalence and rates data."""
+		prefetch_artifact(builder)
 		data_prefix = 'chronic_disease.{}.'.format(self.name)
 		bau_prefix = self.name + '.'
 		int_prefix = self.name + '_intervention.'
@@ -265,7 +275,7 @@ class Disease:
 		self.start_year = builder.configuration.time.start.year
 		self.simplified_equations = builder.configuration[self.name].simplified_no_remission_equations
 
-		inc_data = builder.data.load(data_prefix + 'incidence')
+		inc_data = load_table(builder, data_prefix + 'incidence')
 		i = builder.lookup.build_table(inc_data, 
 									   key_columns=['sex', 'strata'], 
 									   parameter_columns=['age','year'])
@@ -274,115 +284,100 @@ class Disease:
 		self.incidence_intervention = builder.value.register_value_producer(
 			int_prefix + 'incidence', source=i)
 
-		rem_data = builder.data.load(data_prefix + 'remission')
+		rem_data = load_table(builder, data_prefix + 'remission')
 		r = builder.lookup.build_table(rem_data, 
 									   key_columns=['sex', 'strata'], 
 									   parameter_columns=['age','year'])
 		self.remission = builder.value.register_value_producer(
 			bau_prefix + 'remission', source=r)
 
-		mty_data = builder.data.load(data_prefix + 'mortality')
+		mty_data = load_table(builder, data_prefix + 'mortality')
 		f = builder.lookup.build_table(mty_data, 
 									   key_columns=['sex', 'strata'], 
 									   parameter_columns=['age','year'])
 		self.excess_mortality = builder.value.register_value_producer(
 			bau_prefix + 'excess_mortality', source=f)
 
-		yld_data = builder.data.load(data_prefix + 'morbidity')
+		yld_data = load_table(builder, data_prefix + 'morbidity')
 		yld_rate = builder.lookup.build_table(yld_data, 
 											  key_columns=['sex', 'strata'], 
 											  parameter_columns=['age','year'])
 		self.disability_rate = builder.value.register_value_producer(
 			bau_prefix + 'yld_rate', source=yld_rate)
 		
-		expenditure_rate_data = builder.data.load(data_prefix + 'expenditure_rate')
+		expenditure_rate_data = load_table(builder, data_prefix + 'expenditure_rate')
 		expenditure_rate_rate = builder.lookup.build_table(expenditure_rate_data, 
 											  key_columns=['sex', 'strata'], 
 											  parameter_columns=['age','year'])
 		self.expenditure_rate_rate = builder.value.register_value_producer(
 			bau_prefix + 'expenditure_rate', source=expenditure_rate_rate)
 		
-		expenditure_rate_first_data = builder.data.load(data_prefix + 'expenditure_rate_first')
+		expenditure_rate_first_data = load_table(builder, data_prefix + 'expenditure_rate_first')
 		expenditure_rate_first_rate = builder.lookup.build_table(expenditure_rate_first_data, 
 											  key_columns=['sex', 'strata'], 
 											  parameter_columns=['age','year'])
 		self.expenditure_rate_first_rate = builder.value.register_value_producer(
 			bau_prefix + 'expenditure_rate_first', source=expenditure_rate_first_rate)
 
-		expenditure_rate_last_data = builder.data.load(data_prefix + 'expenditure_rate_last')
+		expenditure_rate_last_data = load_table(builder, data_prefix + 'expenditure_rate_last')
 		expenditure_rate_last_rate = builder.lookup.build_table(expenditure_rate_last_data, 
 											  key_columns=['sex', 'strata'], 
 											  parameter_columns=['age','year'])
 		self.expenditure_rate_last_rate = builder.value.register_value_producer(
 			bau_prefix + 'expenditure_rate_last', source=expenditure_rate_last_rate)
 
-		income_data = builder.data.load(data_prefix + 'income')
+		income_data = load_table(builder, data_prefix + 'income')
 		income_rate = builder.lookup.build_table(income_data, 
 											  key_columns=['sex', 'strata'], 
 											  parameter_columns=['age','year'])
 		self.income_rate = builder.value.register_value_producer(
 			bau_prefix + 'income', source=income_rate)
 		
-		income_first_data = builder.data.load(data_prefix + 'income_first')
+		income_first_data = load_table(builder, data_prefix + 'income_first')
 		income_first_rate = builder.lookup.build_table(income_first_data, 
 											  key_columns=['sex', 'strata'], 
 											  parameter_columns=['age','year'])
 		self.income_first_rate = builder.value.register_value_producer(
 			bau_prefix + 'income_first', source=income_first_rate)
 		
-		income_last_data = builder.data.load(data_prefix + 'income_last')
+		income_last_data = load_table(builder, data_prefix + 'income_last')
 		income_last_rate = builder.lookup.build_table(income_last_data, 
 											  key_columns=['sex', 'strata'], 
 											  parameter_columns=['age','year'])
 		self.income_last_rate = builder.value.register_value_producer(
 			bau_prefix + 'income_last', source=income_last_rate)
 		
-		prev_data = builder.data.load(data_prefix + 'prevalence')
+		prev_data = load_table(builder, data_prefix + 'prevalence')
 		self.initial_prevalence = builder.lookup.build_table(prev_data, 
 															 key_columns=['sex', 'strata'], 
 															 parameter_columns=['age','year'])
 
-		builder.value.register_value_modifier(
-			'mortality_rate', self.mortality_adjustment)
-		builder.value.register_value_modifier(
-			'yld_rate', self.disability_adjustment)
-		builder.value.register_value_modifier(
-			'expenditure_rate', self.expenditure_rate_adjustment)
+		register_additive(builder, 'mortality_rate', self.mortality_delta)
+		register_additive(builder, 'yld_rate', self.disability_delta)
+		register_additive(builder, 'expenditure_rate', self.expenditure_rate_delta)
 		builder.value.register_value_modifier(
 			'income', self.income_adjustment)
 		
-		columns = []
-		for scenario in ['', '_intervention']:
-			for rate in ['_S', '_C']:
-				for when in ['', '_previous']:
-					columns.append(self.name + rate + scenario + when)
-
+		# The disease compartments are stored outside of the state table.
+		self.states = get_disease_states(builder)
+		self.states.register(self.name)
 		builder.population.initializes_simulants(
 			self.on_initialize_simulants,
-			creates_columns=columns,
 			requires_columns=['age', 'sex', 'strata'])
-		self.population_view = builder.population.get_view(columns)
+		self.snapshot = get_state_snapshot(builder)
 
 		builder.event.register_listener(
 			'time_step__prepare',
 			self.on_time_step_prepare)
+		self.bau_trajectory = get_bau_trajectory(builder)
+		self.delta_mode = delta_mode(builder.configuration)
 
 	def on_initialize_simulants(self, pop_data):
 		"""Initialize the test population for which this disease is modeled."""
 		C = 1000 * self.initial_prevalence(pop_data.index)
 		S = 1000 - C
 
-		pop = pd.DataFrame({f'{self.name}_S': S,
-							f'{self.name}_C': C,
-							f'{self.name}_S_previous': S,
-							f'{self.name}_C_previous': C,
-							f'{self.name}_S_intervention': S,
-							f'{self.name}_C_intervention': C,
-							f'{self.name}_S_intervention_previous': S,
-							f'{self.name}_C_intervention_previous': C},
-						   index=pop_data.index)
-
-		self.population_view.update(pop)
+		self.states.initialise(self.name, pop_data.index, S.to_numpy(), C.to_numpy())
 
 	def on_time_step_prepare(self, event):
 		"""
@@ -392,16 +387,19 @@ class Disease:
 		# describe the disease state at the end of the year.
 		if self.clock().year == self.start_year:
 			return
-		pop = self.population_view.get(event.index)
+		pop = self.snapshot.get(event.index, [])
 		if pop.empty:
 			return
 		idx = pop.index
-		S_bau, C_bau = pop[f'{self.name}_S'], pop[f'{self.name}_C']
-		S_int = pop[f'{self.name}_S_intervention']
-		C_int = pop[f'{self.name}_C_intervention']
+		# The buffers have been swapped, so the values at the end of the
+		# previous time-step are now the previous values.
+		prev = self.states.get(self.name, idx, previous=True)
+		S_bau = pd.Series(prev[BAU, SUSCEPTIBLE], index=idx)
+		C_bau = pd.Series(prev[BAU, DISEASED], index=idx)
+		S_int = pd.Series(prev[INTERVENTION, SUSCEPTIBLE], index=idx)
+		C_int = pd.Series(prev[INTERVENTION, DISEASED], index=idx)
 
 		# Extract all of the required rates *once only*.
-		i_bau = self.incidence(idx)
 		i_int = self.incidence_intervention(idx)
 		r = self.remission(idx)
 		f = self.excess_mortality(idx)
@@ -410,107 +408,109 @@ class Disease:
 		# number of chronic diseases, we can make some simplifications.
 		if np.all(r == 0):
 			r = 0
-			if self.simplified_equations:
-				# NOTE: for the 'mslt_reduce_chd' experiment, this results in a
-				# slightly lower HALY gain than that obtained when using the
-				# full equations (below).
-				new_S_bau = S_bau * np.exp(- i_bau)
-				new_S_int = S_int * np.exp(- i_int)
-				new_C_bau = C_bau * np.exp(- f) + S_bau - new_S_bau
-				new_C_int = C_int * np.exp(- f) + S_int - new_S_int
-				pop_update = pd.DataFrame({
-					f'{self.name}_S': new_S_bau,
-					f'{self.name}_C': new_C_bau,
-					f'{self.name}_S_previous': S_bau,
-					f'{self.name}_C_previous': C_bau,
-					f'{self.name}_S_intervention': new_S_int,
-					f'{self.name}_C_intervention': new_C_int,
-					f'{self.name}_S_intervention_previous': S_int,
-					f'{self.name}_C_intervention_previous': C_int,
-				}, index=pop.index)
-				self.population_view.update(pop_update)
-				return
+
+		bau = restore_bau(self.bau_trajectory, self.name, idx)
+		if bau is None or self.delta_mode:
+			i_bau = self.incidence(idx)
+		if bau is None:
+			new_S_bau, new_C_bau = self.solve_step(S_bau, C_bau, i_bau, r, f)
+			record_bau(self.bau_trajectory, self.name, pd.DataFrame({
+				f'{self.name}_S': new_S_bau,
+				f'{self.name}_C': new_C_bau,
+			}, index=idx))
+		else:
+			new_S_bau = bau[f'{self.name}_S']
+			new_C_bau = bau[f'{self.name}_C']
+
+		if self.delta_mode:
+			# Cohorts whose state and incidence equal BAU take the BAU result.
+			rows = diverged_rows([S_int, C_int, i_int], [S_bau, C_bau, i_bau])
+			new_S_int = new_S_bau.copy()
+			new_C_int = new_C_bau.copy()
+			if rows.any():
+				r_rows = r if np.isscalar(r) else r[rows]
+				S_rows, C_rows = self.solve_step(
+					S_int[rows], C_int[rows], i_int[rows], r_rows, f[rows])
+				new_S_int.loc[rows] = S_rows.to_numpy()
+				new_C_int.loc[rows] = C_rows.to_numpy()
+		else:
+			new_S_int, new_C_int = self.solve_step(S_int, C_int, i_int, r, f)
+
+		self.states.set(self.name, idx,
+						new_S_bau.to_numpy(), new_C_bau.to_numpy(),
+						new_S_int.to_numpy(), new_C_int.to_numpy())
+
+	def get_checkpoint_state(self):
+		return self.states.get_state(self.name)
+
+	def set_checkpoint_state(self, state):
+		self.states.set_state(self.name, state)
+
+	def solve_step(self, S, C, i, r, f):
+		"""
+		Calculate the susceptible and diseased populations at the end of the
+		time-step, for a single scenario.
+		"""
+		if np.isscalar(r) and r == 0 and self.simplified_equations:
+			# NOTE: for the 'mslt_reduce_chd' experiment, this results in a
+			# slightly lower HALY gain than that obtained when using the
+			# full equations (below).
+			new_S = S * np.exp(- i)
+			new_C = C * np.exp(- f) + S - new_S
+			return new_S, new_C
 
 		# Calculate common factors.
-		i_bau2 = i_bau**2
-		i_int2 = i_int**2
+		i2 = i**2
 		r2 = r**2
 		f2 = f**2
 		f_r = f * r
-		i_bau_r = i_bau * r
-		i_int_r = i_int * r
-		i_bau_f = i_bau * f
-		i_int_f = i_int * f
+		i_r = i * r
+		i_f = i * f
 		f_plus_r = f + r
 
 		# Calculate convenience terms.
-		l_bau = i_bau + f_plus_r
-		l_int = i_int + f_plus_r
-		q_bau = np.sqrt(i_bau2 + r2 + f2 + 2 * i_bau_r + 2 * f_r - 2 * i_bau_f)
-		q_int = np.sqrt(i_int2 + r2 + f2 + 2 * i_int_r + 2 * f_r - 2 * i_int_f)
-		w_bau = np.exp(-(l_bau + q_bau) / 2)
-		w_int = np.exp(-(l_int + q_int) / 2)
-		v_bau = np.exp(-(l_bau - q_bau) / 2)
-		v_int = np.exp(-(l_int - q_int) / 2)
+		l = i + f_plus_r
+		q = np.sqrt(i2 + r2 + f2 + 2 * i_r + 2 * f_r - 2 * i_f)
+		w = np.exp(-(l + q) / 2)
+		v = np.exp(-(l - q) / 2)
 
 		# Identify where the denominators are non-zero.
-		nz_bau = q_bau != 0
-		nz_int = q_int != 0
-		denom_bau = 2 * q_bau
-		denom_int = 2 * q_int
-
-		new_S_bau = S_bau.copy()
-		new_C_bau = C_bau.copy()
-		new_S_int = S_int.copy()
-		new_C_int = C_int.copy()
-
-		# Calculate new_S_bau, new_C_bau, new_S_int, new_C_int.
-		num_S_bau = (2 * (v_bau - w_bau) * (S_bau * f_plus_r + C_bau * r)
-					 + S_bau * (v_bau * (q_bau - l_bau)
-								+ w_bau * (q_bau + l_bau)))
-		num_S_int = (2 * (v_int - w_int) * (S_int * f_plus_r + C_int * r)
-					 + S_int * (v_int * (q_int - l_int)
-								+ w_int * (q_int + l_int)))
-		new_S_bau[nz_bau] = num_S_bau[nz_bau] / denom_bau[nz_bau]
-		new_S_int[nz_int] = num_S_int[nz_int] / denom_int[nz_int]
-
-		num_C_bau = - ((v_bau - w_bau) * (2 * (f_plus_r * (S_bau + C_bau)
-											   - l_bau * S_bau)
-										  - l_bau * C_bau)
-					   - (v_bau + w_bau) * q_bau * C_bau)
-		num_C_int = - ((v_int - w_int) * (2 * (f_plus_r * (S_int + C_int)
-											   - l_int * S_int)
-										  - l_int * C_int)
-					   - (v_int + w_int) * q_int * C_int)
-		new_C_bau[nz_bau] = num_C_bau[nz_bau] / denom_bau[nz_bau]
-		new_C_int[nz_int] = num_C_int[nz_int] / denom_int[nz_int]
-
-		pop_update = pd.DataFrame({
-			f'{self.name}_S': new_S_bau,
-			f'{self.name}_C': new_C_bau,
-			f'{self.name}_S_previous': S_bau,
-			f'{self.name}_C_previous': C_bau,
-			f'{self.name}_S_intervention': new_S_int,
-			f'{self.name}_C_intervention': new_C_int,
-			f'{self.name}_S_intervention_previous': S_int,
-			f'{self.name}_C_intervention_previous': C_int,
-		}, index=pop.index)
-		self.population_view.update(pop_update)
-
-	def mortality_adjustment(self, index, mortality_rate):
+		nz = q != 0
+		denom = 2 * q
+
+		new_S = S.copy()
+		new_C = C.copy()
+
+		num_S = (2 * (v - w) * (S * f_plus_r + C * r)
+				 + S * (v * (q - l) + w * (q + l)))
+		new_S[nz] = num_S[nz] / denom[nz]
+
+		num_C = - ((v - w) * (2 * (f_plus_r * (S + C) - l * S) - l * C)
+				   - (v + w) * q * C)
+		new_C[nz] = num_C[nz] / denom[nz]
+		return new_S, new_C
+
+	def state_columns(self, index):
 		"""
-		Adjust the all-cause mortality rate in the intervention scenario, to
-		account for any change in disease prevalence (relative to the BAU
-		scenario).
+		Get the susceptible and diseased columns, for both scenarios, at the
+		end and start of the time-step.
 		"""
-		pop = self.population_view.get(index)
+		return self.states.columns(self.name, index)
+
+	def mortality_delta(self, index):
+		"""
+		Calculate the change in the all-cause mortality rate in the
+		intervention scenario, to account for any change in disease prevalence
+		(relative to the BAU scenario).
+		"""
+		pop = self.state_columns(index)
 
-		S, C = pop[f'{self.name}_S'], pop[f'{self.name}_C']
-		S_prev, C_prev = pop[f'{self.name}_S_previous'], pop[f'{self.name}_C_previous']
+		S, C = pop['S'], pop['C']
+		S_prev, C_prev = pop['S_previous'], pop['C_previous']
 		D, D_prev = 1000 - S - C, 1000 - S_prev - C_prev
 
-		S_int, C_int = pop[f'{self.name}_S_intervention'], pop[f'{self.name}_C_intervention']
-		S_int_prev, C_int_prev = pop[f'{self.name}_S_intervention_previous'], pop[f'{self.name}_C_intervention_previous']
+		S_int, C_int = pop['S_intervention'], pop['C_intervention']
+		S_int_prev, C_int_prev = pop['S_intervention_previous'], pop['C_intervention_previous']
 		D_int, D_int_prev = 1000 - S_int - C_int, 1000 - S_int_prev - C_int_prev
 
 		# NOTE: as per the spreadsheet, the denominator is from the same point
@@ -518,22 +518,20 @@ class Disease:
 		mortality_risk = (D - D_prev) / (S_prev + C_prev)
 		mortality_risk_int = (D_int - D_int_prev) / (S_int_prev + C_int_prev)
 
-		delta = np.log((1 - mortality_risk) / (1 - mortality_risk_int))
-
-		return mortality_rate + delta
+		return np.log((1 - mortality_risk) / (1 - mortality_risk_int))
 
-	def disability_adjustment(self, index, yld_rate):
+	def disability_delta(self, index):
 		"""
-		Adjust the years lost due to disability (YLD) rate in the intervention
-		scenario, to account for any change in disease prevalence (relative to
-		the BAU scenario).
+		Calculate the change in the years lost due to disability (YLD) rate in
+		the intervention scenario, to account for any change in disease
+		prevalence (relative to the BAU scenario).
 		"""
-		pop = self.population_view.get(index)
+		pop = self.state_columns(index)
 
-		S, S_prev = pop[f'{self.name}_S'], pop[f'{self.name}_S_previous']
-		C, C_prev = pop[f'{self.name}_C'], pop[f'{self.name}_C_previous']
-		S_int, S_int_prev = pop[f'{self.name}_S_intervention'], pop[f'{self.name}_S_intervention_previous']
-		C_int, C_int_prev = pop[f'{self.name}_C_intervention'], pop[f'{self.name}_C_intervention_previous']
+		S, S_prev = pop['S'], pop['S_previous']
+		C, C_prev = pop['C'], pop['C_previous']
+		S_int, S_int_prev = pop['S_intervention'], pop['S_intervention_previous']
+		C_int, C_int_prev = pop['C_intervention'], pop['C_intervention_previous']
 
 		# The prevalence rate is the mean number of diseased people over the
 		# year, divided by the mean number of alive people over the year.
@@ -543,22 +541,22 @@ class Disease:
 		prevalence_rate_int = (C_int + C_int_prev) / (S_int + C_int + S_int_prev + C_int_prev)
 
 		delta = prevalence_rate_int - prevalence_rate
-		return yld_rate + self.disability_rate(index) * delta
+		return self.disability_rate(index).to_numpy() * delta
 
-	def expenditure_rate_adjustment(self, index, expenditure_rate):
+	def expenditure_rate_delta(self, index):
 		"""
-		Update expenditure taking entry and exit to the disease into account
+		Calculate the change in expenditure, taking entry and exit to the
+		disease into account.
 		"""
-		pop = self.population_view.get(index)
-		idx = pop.index
-		
-		i_bau = self.incidence(idx)
-		i_int = self.incidence_intervention(idx)
+		pop = self.state_columns(index)
+
+		i_bau = self.incidence(index).to_numpy()
+		i_int = self.incidence_intervention(index).to_numpy()
 
-		S, S_prev = pop[f'{self.name}_S'], pop[f'{self.name}_S_previous']
-		C, C_prev = pop[f'{self.name}_C'], pop[f'{self.name}_C_previous']
-		S_int, S_int_prev = pop[f'{self.name}_S_intervention'], pop[f'{self.name}_S_intervention_previous']
-		C_int, C_int_prev = pop[f'{self.name}_C_intervention'], pop[f'{self.name}_C_intervention_previous']
+		S, S_prev = pop['S'], pop['S_previous']
+		C, C_prev = pop['C'], pop['C_previous']
+		S_int, S_int_prev = pop['S_intervention'], pop['S_intervention_previous']
+		C_int, C_int_prev = pop['C_intervention'], pop['C_intervention_previous']
 
 		D, D_prev = 1000 - S - C, 1000 - S_prev - C_prev
 		D_int, D_int_prev = 1000 - S_int - C_int, 1000 - S_int_prev - C_int_prev
@@ -577,27 +575,23 @@ class Disease:
 		delta_first = firstYear_int - firstYear
 		delta_last = lastYear_int - lastYear
 
-		expenditure_rate = (expenditure_rate + 
-			self.expenditure_rate_rate(index) * delta_prevalence +
-			self.expenditure_rate_first_rate(index) * delta_first +
-			self.expenditure_rate_last_rate(index) * delta_last)
- 
-		return expenditure_rate
+		return (self.expenditure_rate_rate(index).to_numpy() * delta_prevalence +
+				self.expenditure_rate_first_rate(index).to_numpy() * delta_first +
+				self.expenditure_rate_last_rate(index).to_numpy() * delta_last)
 
 	def income_adjustment(self, index, income):
 		"""
 		Copypasta the above.
 		"""
-		pop = self.population_view.get(index)
-		idx = pop.index
-		
-		i_bau = self.incidence(idx)
-		i_int = self.incidence_intervention(idx)
+		pop = self.state_columns(index)
+
+		i_bau = self.incidence(index).to_numpy()
+		i_int = self.incidence_intervention(index).to_numpy()
 
-		S, S_prev = pop[f'{self.name}_S'], pop[f'{self.name}_S_previous']
-		C, C_prev = pop[f'{self.name}_C'], pop[f'{self.name}_C_previous']
-		S_int, S_int_prev = pop[f'{self.name}_S_intervention'], pop[f'{self.name}_S_intervention_previous']
-		C_int, C_int_prev = pop[f'{self.name}_C_intervention'], pop[f'{self.name}_C_intervention_previous']
+		S, S_prev = pop['S'], pop['S_previous']
+		C, C_prev = pop['C'], pop['C_previous']
+		S_int, S_int_prev = pop['S_intervention'], pop['S_intervention_previous']
+		C_int, C_int_prev = pop['C_intervention'], pop['C_intervention_previous']
 
 		D, D_prev = 1000 - S - C, 1000 - S_prev - C_prev
 		D_int, D_int_prev = 1000 - S_int - C_int, 1000 - S_int_prev - C_int_prev
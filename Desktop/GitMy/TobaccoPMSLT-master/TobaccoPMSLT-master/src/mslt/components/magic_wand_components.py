@@ -8,11 +8,14 @@ multi-state lifetable simulations.
 
 """
 
+import weakref
+
 import numpy as np
 import pandas as pd
 
-from mslt.utilities import UnstackDraw, CrossDf, OutputToFile, AgeToCohorts, SetStandardIndex
-from mslt.utilities import ExpandAgeCategory, ExpandToValueAtAge, AddAge, AddSex, AddStrata, ValueToValueRange
+from mslt.utilities import UnstackDraw, CrossDf, OutputToFile, AgeToCohorts
+from mslt.utilities import ExpandToValueAtAge, AddAge
+from .pipeline import is_last_modifier
 
 class MortalityShift:
 	
@@ -95,7 +98,119 @@ class AcuteIncidenceShift:
 		return rates * self.rate_mult
 
 
+class WandRule:
+	"""
+	The effect of a GenericWand, ``rate * mult + add``, on the cohorts within
+	an age range, a year range and (optionally) a single stratum. Bounds that
+	are ``None`` are open.
+	"""
+
+	def __init__(self, mult, add, age_min=None, age_max=None,
+				 year_start=None, year_end=None, strata=None):
+		self.mult = mult
+		self.add = add
+		self.age_min = age_min
+		self.age_max = age_max
+		self.year_start = year_start
+		self.year_end = year_end
+		self.strata = strata
+
+	def applies_in(self, year):
+		if self.year_start is not None and year < self.year_start:
+			return False
+		if self.year_end is not None and year >= self.year_end:
+			return False
+		return True
+
+	def mask(self, age, strata):
+		mask = np.ones(len(age), dtype=bool)
+		if self.age_min is not None:
+			mask &= age >= self.age_min
+		if self.age_max is not None:
+			mask &= age < self.age_max
+		if self.strata is not None:
+			mask &= strata == self.strata
+		return mask
+
+	def to_frame(self):
+		return pd.DataFrame([[self.age_min, self.age_max, self.year_start,
+							  self.year_end, self.strata, self.mult, self.add]],
+							columns=['age_min', 'age_max', 'year_start',
+									 'year_end', 'strata', 'mult', 'add'])
+
+
+class WandEffects:
+	"""
+	The combined effect of GenericWands that target one pipeline and are set
+	up one after another. The rules are applied in the order that the wands
+	were set up, and are merged into a single multiplier and adder, so that
+	the pipeline has one modifier for each run of wands.
+	"""
+
+	def __init__(self, builder, target):
+		self.rules = []
+		self.clock = builder.time.clock()
+		self.max_age = builder.configuration.population.max_age
+		# Include the tracked column, so that untracked simulants are not
+		# filtered out and the adjustment is aligned with the whole index.
+		self.population_view = builder.population.get_view(['age', 'strata', 'tracked'])
+		builder.value.register_value_modifier(target, self.rate_adjustment)
+
+	def rate_adjustment(self, index, rates):
+		year = self.clock().year
+		rules = [rule for rule in self.rules if rule.applies_in(year)]
+		if not rules:
+			return rates
+
+		pop = self.population_view.get(index)
+		# The effects are constant over each single year of age, and the
+		# oldest year of age applies to all older cohorts.
+		age = np.minimum(np.floor(pop['age'].to_numpy()), self.max_age - 1)
+		strata = pop['strata'].to_numpy()
+
+		mult = np.ones(len(index))
+		add = np.zeros(len(index))
+		for rule in rules:
+			mask = rule.mask(age, strata)
+			mult[mask] *= rule.mult
+			add[mask] = add[mask] * rule.mult + rule.add
+		return rates * mult + add
+
+
+# The effects on each pipeline, for each simulation.
+_wand_effects = weakref.WeakKeyDictionary()
+
+
+def get_wand_effects(builder, target):
+	"""
+	Get the effects that a wand should add its rule to. If another modifier
+	has been registered with the pipeline since the last wand, this starts a
+	new WandEffects, so that the wands keep their place in the pipeline.
+	"""
+	effects = _wand_effects.setdefault(builder.configuration, {})
+	if target not in effects or not is_last_modifier(
+			builder, target, effects[target].rate_adjustment):
+		effects[target] = WandEffects(builder, target)
+	return effects[target]
+
+
 class GenericWand:
+	"""
+	Apply ``rate * mult + add`` to a pipeline, for the cohorts within an age
+	range, a year range and (optionally) a single stratum.
+
+	The configuration options for this component are:
+
+	``target``
+		The pipeline to modify (default: the wand name).
+	``rate_reduce``, ``set_rate``, ``add_rate``
+		The effect on the rate.
+	``age_min``, ``age_max``, ``year_start``, ``year_end``, ``strata``
+		The cohorts and years that are affected.
+	``write_checks``
+		Write the effect to ``wand_checks/<name>.csv``.
+
+	"""
 
 	def __init__(self, name):
 		self._name = name
@@ -105,152 +220,50 @@ class GenericWand:
 		return self._name
 
 	def setup(self, builder):
-		self.rate_mult = 0
-		self.rate_add = 0
-		self.doSet = False
+		self.rule = None
 		"""Configuration."""
 		if 'magic_wand' in builder.configuration and self.name in builder.configuration.magic_wand:
 			configuration = builder.configuration.magic_wand[self.name]
 
 			effect_mult = 1
 			effect_add = 0
-			
+
 			if 'rate_reduce' in configuration:
 				effect_mult = (1 - configuration.rate_reduce)
 			if 'set_rate' in configuration:
 				effect_mult = 0
 				effect_add = configuration.set_rate
-				self.doSet = True
 			if 'add_rate' in configuration:
 				effect_mult = 1
 				effect_add = configuration.add_rate
-				self.doSet = True
-			
-			if 'age_min' in configuration:
-				ageRanges = []
-				ageRangesAdd = []
-				
-				if configuration.age_min == 0:
-					ageRanges.append([0, effect_mult])
-					ageRangesAdd.append([0, effect_add])
-				else:
-					ageRanges.append([0, 1])
-					ageRanges.append([configuration.age_min, effect_mult])
-					ageRangesAdd.append([0, 1])
-					ageRangesAdd.append([configuration.age_min, effect_add])
-				
-				if 'age_max' in configuration:
-					ageRanges.append([configuration.age_max, 1])
-					ageRangesAdd.append([configuration.age_max, effect_add])
-					
-				dfRate = pd.DataFrame(ageRanges,
-					columns=['agecategory', 'value']
-				).set_index('agecategory')
-
-				dfAdd = pd.DataFrame(ageRanges,
-					columns=['agecategory', 'value']
-				).set_index('agecategory')
-			else:
-				dfRate = pd.DataFrame([
-					[0, effect_mult]],
-					columns=['agecategory', 'value']
-				).set_index('agecategory')
-
-				dfAdd = pd.DataFrame([
-					[0, effect_add]],
-					columns=['agecategory', 'value']
-				).set_index('agecategory')
-
-			dfRate_out = pd.DataFrame()
-			dfAdd_out = pd.DataFrame()
-
-			dfRate = SetStandardIndex(AddSex(AddStrata(
-				ExpandAgeCategory(dfRate, builder.configuration.population.max_age))))
-			dfRate = ValueToValueRange(dfRate, 'age', 1)
-
-			dfAdd = SetStandardIndex(AddSex(AddStrata(
-				ExpandAgeCategory(dfAdd, builder.configuration.population.max_age))))
-			dfAdd = ValueToValueRange(dfAdd, 'age', 1)
-
-			if 'strata' in configuration:
-				index = list(dfAdd.index.names)
-
-				# Very quick and dirty code below.
-				dfRate = dfRate.reorder_levels([3, 0, 1, 2], axis=0).transpose()
-				dfAdd = dfAdd.reorder_levels([3, 0, 1, 2], axis=0).transpose()
-				tranIndex = builder.configuration.population.strata
-				for strata in tranIndex:
-					if strata != configuration.strata:
-						dfRate[strata] = 1
-						dfAdd[strata] = 0
-
-				dfRate = dfRate.transpose().reorder_levels(index, axis=0)
-				dfAdd = dfAdd.transpose().reorder_levels(index, axis=0)
 
+			# Years outside the simulation are open, since the rates are
+			# extrapolated beyond them.
 			totalStart = builder.configuration.time.start.year
 			totalEnd   = builder.configuration.time.start.year + builder.configuration.population.max_age
 
-			year_start = totalStart
-			year_end   = totalEnd
-			if 'year_start' in configuration:
+			year_start = None
+			year_end = None
+			if 'year_start' in configuration and configuration.year_start > totalStart:
 				year_start = configuration.year_start
-			if 'year_end' in configuration:
+			if 'year_end' in configuration and configuration.year_end < totalEnd:
 				year_end = configuration.year_end
 
-			dfDummy = dfRate.copy()
-
-			if year_start > totalStart:
-				dfDummy['year'] = totalStart
-				dfDummy['value'] = 1
-				dfRate_out = dfRate_out.append(
-					ValueToValueRange(dfDummy, 'year', year_start - totalStart))
-
-				dfDummy['year'] = totalStart
-				dfDummy['value'] = 0
-				dfAdd_out = dfAdd_out.append(
-					ValueToValueRange(dfDummy, 'year', year_start - totalStart))
-
-			dfRate['year'] = year_start
-			dfRate_out = dfRate_out.append(
-				ValueToValueRange(dfRate, 'year', year_end - year_start))
-
-			dfAdd['year'] = year_start
-			dfAdd_out = dfAdd_out.append(
-				ValueToValueRange(dfAdd, 'year', year_end - year_start))
-			
-			if year_end < totalEnd:
-				dfDummy['year'] = year_end
-				dfDummy['value'] = 1
-				dfRate_out = dfRate_out.append(
-					ValueToValueRange(dfDummy, 'year', totalEnd - year_end))
-
-				dfDummy['year'] = year_end
-				dfDummy['value'] = 0
-				dfAdd_out = dfAdd_out.append(
-					ValueToValueRange(dfDummy, 'year', totalEnd - year_end))
-
-			OutputToFile(dfRate_out, 'wand_checks/{}_mult'.format(self.name))
-			OutputToFile(dfAdd_out, 'wand_checks/{}_add'.format(self.name))
-
-			dfRate_out = dfRate_out.reset_index()
-			dfAdd_out  = dfAdd_out.reset_index()
-			self.rate_mult = builder.lookup.build_table(dfRate_out, 
-												key_columns=['sex', 'strata'], 
-												parameter_columns=['age','year'])
-			self.rate_add = builder.lookup.build_table(dfAdd_out, 
-												key_columns=['sex', 'strata'], 
-												parameter_columns=['age','year'])
+			self.rule = WandRule(
+				effect_mult, effect_add,
+				age_min=configuration.age_min if 'age_min' in configuration else None,
+				age_max=configuration.age_max if 'age_max' in configuration else None,
+				year_start=year_start,
+				year_end=year_end,
+				strata=configuration.strata if 'strata' in configuration else None)
 
-			if 'target' in configuration:
-				builder.value.register_value_modifier(configuration.target, self.rate_adjustment)
-			else:
-				builder.value.register_value_modifier(self.name, self.rate_adjustment)
+			if 'write_checks' in configuration and configuration.write_checks:
+				OutputToFile(self.rule.to_frame(), 'wand_checks/{}'.format(self.name), index=False)
 
-
-	def rate_adjustment(self, index, rates):
-		if self.doSet:
-			return rates * self.rate_mult(index) + self.rate_add(index)
-		return rates * self.rate_mult(index)
+			target = self.name
+			if 'target' in configuration:
+				target = configuration.target
+			get_wand_effects(builder, target).rules.append(self.rule)
 
 
 class ModifyAcuteDiseaseYLD:
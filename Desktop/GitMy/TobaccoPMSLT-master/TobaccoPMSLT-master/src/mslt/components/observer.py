@@ -13,6 +13,8 @@ import os
 from datetime import date
 
 from .circuit import GetStateCol
+from .compartments import get_disease_states
+from .store import write_to_store
 
 
 def MakePath(path):
@@ -67,11 +69,156 @@ def output_file(config, suffix, sep='_', ext='csv'):
 	return out_file
 
 
+def output_table(config, suffix, data):
+	"""
+	Write an observer table. If ``config.observer.output_store`` is defined
+	the table is added to that result store, under the scenario named by
+	``config.observer.scenario`` (by default, the basename of the output
+	prefix). Otherwise the table is written to its own CSV file, as named by
+	:func:`output_file`.
+
+	Parameters
+	----------
+	config
+		The builder configuration object.
+	suffix
+		The observer-specific suffix.
+	data
+		The observer table.
+
+	"""
+	if 'observer' in config and 'output_store' in config.observer:
+		write_to_store(config.observer.output_store, output_scenario(config),
+					   suffix, output_draw(config), data)
+	else:
+		output_csv_mkdir(data, output_file(config, suffix), index=False)
+
+
+def output_scenario(config):
+	"""The scenario name under which observers write to the result store."""
+	if 'scenario' in config.observer:
+		return config.observer.scenario
+	return os.path.basename(config.observer.output_prefix)
+
+
+def output_draw(config):
+	if 'input_draw_number' in config.input_data:
+		return config.input_data.input_draw_number
+	return 0
+
+
+def observer_options(config, suffix):
+	"""
+	Read the optional recording settings that reduce what an observer
+	records. All settings are optional; by default everything is recorded.
+
+	.. code-block:: yaml
+
+	   configuration:
+	       observer:
+	           output_prefix: results/scenario
+	           metrics:
+	               mm: ['HALY', 'total_spent', 'total_income', 'deaths']
+	               circuit: ['cs', 'cscv']
+	           record_every: 5
+	           record_years: [2030, 2040]
+	           age_min: 20
+	           age_max: 90
+	           strata: ['maori']
+
+	Metric whitelists are given per observer output suffix. Recording every
+	``record_every`` years counts from the initial (year 0) output, and is
+	combined with any specific ``record_years``.
+
+	Parameters
+	----------
+	config
+		The builder configuration object.
+	suffix
+		The observer-specific suffix.
+
+	"""
+	options = {
+		'metrics' : None,
+		'record_every' : None,
+		'record_years' : None,
+		'age_min' : None,
+		'age_max' : None,
+		'strata' : None,
+	}
+	if 'observer' not in config:
+		return options
+	obs = config.observer
+	if 'metrics' in obs and suffix in obs.metrics:
+		options['metrics'] = list(obs.metrics[suffix])
+	if 'record_every' in obs:
+		options['record_every'] = int(obs.record_every)
+		if options['record_every'] < 1:
+			raise ValueError('observer.record_every must be at least 1')
+	if 'record_years' in obs:
+		options['record_years'] = [int(year) for year in obs.record_years]
+	for key in ['age_min', 'age_max']:
+		if key in obs:
+			options[key] = obs[key]
+	if 'strata' in obs:
+		options['strata'] = list(obs.strata)
+	return options
+
+
+def population_query(options, ages=True):
+	"""
+	Build the population view query for the age and strata filters. The age
+	filter can be left out for observers that need whole cohorts.
+	"""
+	terms = []
+	if ages and options['age_min'] is not None:
+		terms.append('age >= {}'.format(options['age_min']))
+	if ages and options['age_max'] is not None:
+		terms.append('age <= {}'.format(options['age_max']))
+	if options['strata'] is not None:
+		terms.append('strata in {}'.format(options['strata']))
+	return ' and '.join(terms)
+
+
+def is_recorded_year(options, year, first_year):
+	"""
+	Determine whether the observer records output for this year, where
+	``first_year`` is the year of the initial output.
+	"""
+	if options['record_every'] is None and options['record_years'] is None:
+		return True
+	if options['record_years'] is not None and year in options['record_years']:
+		return True
+	if options['record_every'] is not None:
+		return (year - first_year) % options['record_every'] == 0
+	return False
+
+
+def select_metrics(metrics, columns, variants):
+	"""
+	Select the columns that match the metric whitelist, where ``variants``
+	maps a metric name to the column names it covers (e.g., the BAU and
+	intervention versions of a measure).
+	"""
+	if metrics is None:
+		return list(columns)
+	wanted = set()
+	for metric in metrics:
+		wanted.update(variants(metric))
+	return [col for col in columns if col in wanted]
+
+
 class MorbidityMortality:
 	"""
 	This class records the all-cause morbidity and mortality rates for each
 	cohort at each year of the simulation.
 
+	The recorded metrics can be restricted with ``observer.metrics.mm``,
+	where each metric selects both its intervention and BAU columns; the
+	derived metrics are ``prev_population``, ``person_years``, ``LE`` and
+	``HALE``. See :func:`observer_options` for the recording schedule and
+	filters.
+
 	Parameters
 	----------
 	output_suffix
@@ -80,6 +227,14 @@ class MorbidityMortality:
 
 	"""
 
+	# The columns from which each derived column is calculated.
+	derived_cols = {
+		'prev_population' : ['population', 'deaths'],
+		'person_years' : ['alive_person_years', 'dead_person_years'],
+		'LE' : ['person_years', 'prev_population'],
+		'HALE' : ['HALY', 'prev_population'],
+	}
+
 	def __init__(self, output_suffix='mm'):
 		self.output_suffix = output_suffix
 
@@ -89,8 +244,7 @@ class MorbidityMortality:
 
 	def setup(self, builder):
 		# Record the key columns from the core multi-state life table.
-		columns = ['age', 'sex', 'strata',
-				   'population', 'bau_population',
+		columns = ['population', 'bau_population',
 				   'acmr', 'bau_acmr',
 				   'pr_death', 'bau_pr_death',
 				   'deaths', 'bau_deaths',
@@ -102,9 +256,38 @@ class MorbidityMortality:
 				   'income', 'bau_income',
 				   'total_income', 'bau_total_income',
 				   'HALY', 'bau_HALY']
-		self.population_view = builder.population.get_view(columns)
+		table_cols = ['population', 'bau_population',
+					  'prev_population', 'bau_prev_population',
+					  'acmr', 'bau_acmr',
+					  'pr_death', 'bau_pr_death',
+					  'deaths', 'bau_deaths',
+					  'yld_rate', 'bau_yld_rate',
+					  'dead_person_years', 'bau_dead_person_years',
+					  'alive_person_years', 'bau_alive_person_years',
+					  'expenditure_rate', 'bau_expenditure_rate',
+					  'total_spent', 'bau_total_spent',
+					  'income', 'bau_income',
+					  'total_income', 'bau_total_income',
+					  'HALY', 'bau_HALY']
+		derived_cols = ['person_years', 'bau_person_years',
+						'LE', 'bau_LE', 'HALE', 'bau_HALE']
+
+		self.options = observer_options(builder.configuration, self.output_suffix)
+		self.output_cols = select_metrics(
+			self.options['metrics'], table_cols + derived_cols,
+			lambda metric: [metric, 'bau_' + metric])
+		self.required = self.required_columns(self.output_cols)
+
+		self.population_view = builder.population.get_view(
+			['age', 'sex', 'strata'] + [c for c in columns if c in self.required])
 		self.clock = builder.time.clock()
 
+		# Life expectancy sums person-years over the remaining life of each
+		# cohort, so every year and age is recorded and filtered on output.
+		self.whole_cohorts = any(col in self.required for col in
+								 ['LE', 'bau_LE', 'HALE', 'bau_HALE'])
+		self.query = population_query(self.options, ages=not self.whole_cohorts)
+
 		# Output the start of year 0
 		start_year = builder.configuration.time.start.year
 		start_month = builder.configuration.time.start.month
@@ -112,59 +295,60 @@ class MorbidityMortality:
 		self.start_date = date(year=start_year,
 							   month=start_month,
 							   day=start_day)
+		self.first_year = start_year - 1
 		builder.event.register_listener('time_step__prepare', self.on_time_step_prepare)
 
 		builder.event.register_listener('collect_metrics', self.on_collect_metrics)
 		builder.event.register_listener('simulation_end', self.write_output)
 		self.tables = []
-		self.table_cols = ['sex', 'age', 'strata', 'year', 'month',
-						   'population', 'bau_population',
-						   'prev_population', 'bau_prev_population',
-						   'acmr', 'bau_acmr',
-						   'pr_death', 'bau_pr_death',
-						   'deaths', 'bau_deaths',
-						   'yld_rate', 'bau_yld_rate',
-						   'dead_person_years', 'bau_dead_person_years',
-						   'alive_person_years', 'bau_alive_person_years',
-						   'expenditure_rate', 'bau_expenditure_rate',
-						   'total_spent', 'bau_total_spent',
-						   'income', 'bau_income',
-				   			'total_income', 'bau_total_income',
-						   'HALY', 'bau_HALY']
+		self.table_cols = (['sex', 'age', 'strata', 'year', 'month']
+						   + [c for c in table_cols if c in self.required])
 
+		self.config = builder.configuration
 		self.output_file = output_file(builder.configuration,
 									   self.output_suffix)
 
-	def on_collect_metrics(self, event):
-		pop = self.population_view.get(event.index)
+	def required_columns(self, output_cols):
+		"""Find the columns needed to calculate the output columns."""
+		required = set()
+		pending = list(output_cols)
+		while pending:
+			col = pending.pop()
+			if col in required:
+				continue
+			required.add(col)
+			bau = col.startswith('bau_')
+			base = col[4:] if bau else col
+			for dep in self.derived_cols.get(base, []):
+				pending.append('bau_' + dep if bau else dep)
+		return required
+
+	def record_population(self, index, year):
+		if not (self.whole_cohorts or
+				is_recorded_year(self.options, year, self.first_year)):
+			return
+		pop = self.population_view.get(index, query=self.query)
 		if len(pop.index) == 0:
 			# No tracked population remains.
 			return
 
-		pop['year'] = self.clock().year
+		pop['year'] = year
 		pop['month'] = self.clock().month
 		# Record the population size prior to the deaths.
-		pop['prev_population'] = pop['population'] + pop['deaths']
-		pop['bau_prev_population'] = pop['bau_population'] + pop['bau_deaths']
+		if 'prev_population' in self.required:
+			pop['prev_population'] = pop['population'] + pop['deaths']
+		if 'bau_prev_population' in self.required:
+			pop['bau_prev_population'] = pop['bau_population'] + pop['bau_deaths']
 		self.tables.append(pop[self.table_cols])
 
-	
+	def on_collect_metrics(self, event):
+		self.record_population(event.index, self.clock().year)
+
 	def on_time_step_prepare(self, event):
 		# Only output the start of year 0
 		if self.clock().date() != self.start_date:
 			return
-		pop = self.population_view.get(event.index)
-		if len(pop.index) == 0:
-			# No tracked population remains.
-			return
-
-		pop['year'] = self.clock().year - 1
-		pop['month'] = self.clock().month
-		# Record the population size prior to the deaths.
-		pop['prev_population'] = pop['population'] + pop['deaths']
-		pop['bau_prev_population'] = pop['bau_population'] + pop['bau_deaths']
-		self.tables.append(pop[self.table_cols])
-
+		self.record_population(event.index, self.clock().year - 1)
 
 	def calculate_LE(self, table, py_col, denom_col):
 		"""Calculate the life expectancy for each cohort at each time-step.
@@ -196,6 +380,12 @@ class MorbidityMortality:
 		cumsum = grouped.apply(lambda x: pd.Series(x[::-1].cumsum()).iloc[::-1])
 		return (cumsum / table[denom_col]).replace({np.inf : 0, np.nan : 0})
 
+	def get_checkpoint_state(self):
+		return {'tables' : list(self.tables)}
+
+	def set_checkpoint_state(self, state):
+		self.tables = list(state['tables'])
+
 	def write_output(self, event):
 		data = pd.concat(self.tables, ignore_index=True)
 		data['year_of_birth'] = data['year'] - np.floor(data['age'])
@@ -209,16 +399,35 @@ class MorbidityMortality:
 		data = data[cols]
 		# Calculate life expectancy and HALE for the BAU and intervention,
 		# with respect to the initial population, not the survivors.
-		data['person_years'] = data['alive_person_years'] + 0.5 * data['dead_person_years']
-		data['bau_person_years'] = data['bau_alive_person_years'] + 0.5 * data['bau_dead_person_years']
-
-		data['LE'] = self.calculate_LE(data, 'person_years', 'prev_population')
-		data['bau_LE'] = self.calculate_LE(data, 'bau_person_years',
-										   'bau_prev_population')
-		data['HALE'] = self.calculate_LE(data, 'HALY', 'prev_population')
-		data['bau_HALE'] = self.calculate_LE(data, 'bau_HALY',
-										   'bau_prev_population')
-		output_csv_mkdir(data, self.output_file, index=False)
+		if 'person_years' in self.required:
+			data['person_years'] = data['alive_person_years'] + 0.5 * data['dead_person_years']
+		if 'bau_person_years' in self.required:
+			data['bau_person_years'] = data['bau_alive_person_years'] + 0.5 * data['bau_dead_person_years']
+
+		if 'LE' in self.required:
+			data['LE'] = self.calculate_LE(data, 'person_years', 'prev_population')
+		if 'bau_LE' in self.required:
+			data['bau_LE'] = self.calculate_LE(data, 'bau_person_years',
+											   'bau_prev_population')
+		if 'HALE' in self.required:
+			data['HALE'] = self.calculate_LE(data, 'HALY', 'prev_population')
+		if 'bau_HALE' in self.required:
+			data['bau_HALE'] = self.calculate_LE(data, 'bau_HALY',
+												 'bau_prev_population')
+
+		if self.whole_cohorts:
+			# Apply the schedule and age filter now that LE is calculated.
+			years = [year for year in data['year'].unique()
+					 if is_recorded_year(self.options, year, self.first_year)]
+			keep = data['year'].isin(years)
+			if self.options['age_min'] is not None:
+				keep &= data['age'] >= self.options['age_min']
+			if self.options['age_max'] is not None:
+				keep &= data['age'] <= self.options['age_max']
+			data = data[keep].reset_index(drop=True)
+
+		cols = ['year_of_birth', 'sex', 'age', 'strata', 'year', 'month'] + self.output_cols
+		output_table(self.config, self.output_suffix, data[cols])
 
 
 class AcuteDisease:
@@ -263,6 +472,9 @@ class AcuteDisease:
 		self.start_date = date(year=start_year,
 							   month=start_month,
 							   day=start_day)
+		self.first_year = start_year - 1
+		self.options = observer_options(builder.configuration, self.output_suffix)
+		self.query = population_query(self.options)
 		builder.event.register_listener('time_step__prepare', self.on_time_step_prepare)
 
 		# Output for the end of other years
@@ -276,11 +488,14 @@ class AcuteDisease:
 							self.metric_deaths,
 							self.metric_HALY]
 		self.clock = builder.time.clock()
+		self.config = builder.configuration
 		self.output_file = output_file(builder.configuration,
 									   self.output_suffix)
 
 	def on_collect_metrics(self, event):
-		pop = self.population_view.get(event.index)
+		if not is_recorded_year(self.options, self.clock().year, self.first_year):
+			return
+		pop = self.population_view.get(event.index, query=self.query)
 		if len(pop.index) == 0:
 			# No tracked population remains.
 			return
@@ -293,7 +508,9 @@ class AcuteDisease:
 		# Only output the start of year 0
 		if self.clock().date() != self.start_date:
 			return
-		pop = self.population_view.get(event.index)
+		if not is_recorded_year(self.options, self.first_year, self.first_year):
+			return
+		pop = self.population_view.get(event.index, query=self.query)
 		if len(pop.index) == 0:
 			# No tracked population remains.
 			return
@@ -302,9 +519,15 @@ class AcuteDisease:
 		pop['month'] = self.clock().month
 		self.tables.append(pop.loc[:, self.table_cols])
 	
+	def get_checkpoint_state(self):
+		return {'tables' : list(self.tables)}
+
+	def set_checkpoint_state(self, state):
+		self.tables = list(state['tables'])
+
 	def write_output(self, event):
 		data = pd.concat(self.tables, ignore_index=True)
-		output_csv_mkdir(data, self.output_file, index=False)
+		output_table(self.config, self.output_suffix, data)
 
 
 class Disease:
@@ -343,10 +566,8 @@ class Disease:
 		self.int_S_col = '{}_S_intervention'.format(self._name)
 		self.int_C_col = '{}_C_intervention'.format(self._name)
 
-		columns = ['age', 'sex', 'strata',
-				   self.bau_S_col, self.bau_C_col,
-				   self.int_S_col, self.int_C_col]
-		self.population_view = builder.population.get_view(columns)
+		self.population_view = builder.population.get_view(['age', 'sex', 'strata'])
+		self.disease_states = get_disease_states(builder)
 
 		# Output the start of year 0
 		start_year = builder.configuration.time.start.year
@@ -355,6 +576,9 @@ class Disease:
 		self.start_date = date(year=start_year,
 							   month=start_month,
 							   day=start_day)
+		self.first_year = start_year - 1
+		self.options = observer_options(builder.configuration, self.output_suffix)
+		self.query = population_query(self.options)
 		builder.event.register_listener('time_step__prepare', self.on_time_step_prepare)
 
 		# Output for the end of other years
@@ -367,18 +591,22 @@ class Disease:
 						   'bau_prevalence', 'int_prevalence',
 						   'bau_deaths', 'int_deaths']
 		self.clock = builder.time.clock()
+		self.config = builder.configuration
 		self.output_file = output_file(builder.configuration,
 									   self.output_suffix)
 
 	def on_collect_metrics(self, event):
-		pop = self.population_view.get(event.index)
+		if not is_recorded_year(self.options, self.clock().year, self.first_year):
+			return
+		pop = self.population_view.get(event.index, query=self.query)
 		if len(pop.index) == 0:
 			# No tracked population remains.
 			return
+		pop = pop.join(self.disease_states.frame(self._name, pop.index))
 
 		pop['year'] = self.clock().year
-		pop['bau_incidence'] = self.bau_incidence(event.index)
-		pop['int_incidence'] = self.int_incidence(event.index)
+		pop['bau_incidence'] = self.bau_incidence(pop.index)
+		pop['int_incidence'] = self.int_incidence(pop.index)
 		pop['bau_prevalence'] = pop[self.bau_C_col] / (pop[self.bau_C_col] + pop[self.bau_S_col])
 		pop['int_prevalence'] = pop[self.int_C_col] / (pop[self.bau_C_col] + pop[self.bau_S_col])
 		pop['bau_deaths'] = 1000 - pop[self.bau_S_col] - pop[self.bau_C_col]
@@ -389,20 +617,29 @@ class Disease:
 		# Only output the start of year 0
 		if self.clock().date() != self.start_date:
 			return
-		pop = self.population_view.get(event.index)
+		if not is_recorded_year(self.options, self.first_year, self.first_year):
+			return
+		pop = self.population_view.get(event.index, query=self.query)
 		if len(pop.index) == 0:
 			# No tracked population remains.
 			return
+		pop = pop.join(self.disease_states.frame(self._name, pop.index))
 
 		pop['year'] = self.clock().year - 1
-		pop['bau_incidence'] = self.bau_incidence(event.index)
-		pop['int_incidence'] = self.int_incidence(event.index)
+		pop['bau_incidence'] = self.bau_incidence(pop.index)
+		pop['int_incidence'] = self.int_incidence(pop.index)
 		pop['bau_prevalence'] = pop[self.bau_C_col] / (pop[self.bau_C_col] + pop[self.bau_S_col])
 		pop['int_prevalence'] = pop[self.int_C_col] / (pop[self.bau_C_col] + pop[self.bau_S_col])
 		pop['bau_deaths'] = 1000 - pop[self.bau_S_col] - pop[self.bau_C_col]
 		pop['int_deaths'] = 1000 - pop[self.int_S_col] - pop[self.int_C_col]
 		self.tables.append(pop.loc[:, self.table_cols])
 
+	def get_checkpoint_state(self):
+		return {'tables' : list(self.tables)}
+
+	def set_checkpoint_state(self, state):
+		self.tables = list(state['tables'])
+
 	def write_output(self, event):
 		data = pd.concat(self.tables, ignore_index=True)
 		data['diff_incidence'] = data['int_incidence'] - data['bau_incidence']
@@ -418,12 +655,13 @@ class Disease:
 		diff_cols = ['diff_incidence', 'diff_prevalence']
 		cols = ['disease', 'year_of_birth'] + self.table_cols + diff_cols
 		data = data[cols]
-		output_csv_mkdir(data, self.output_file, index=False)
+		output_table(self.config, self.output_suffix, data)
 
 
 class Circuit:
 	"""
 	This class records the state of the intervention and BAU circuit.
+	The recorded states can be restricted with ``observer.metrics.circuit``.
 
 	Parameters
 	----------
@@ -455,6 +693,13 @@ class Circuit:
 					stateCols.append(GetStateCol(source))
 					stateCols.append(GetStateCol(source, bau=True))
 		
+		# A whitelist may name states, selecting both the BAU and
+		# intervention columns, or name the columns directly.
+		metrics = observer_options(builder.configuration, self.output_suffix)['metrics']
+		stateCols = select_metrics(
+			metrics, stateCols,
+			lambda metric: [metric, GetStateCol(metric), GetStateCol(metric, bau=True)])
+		
 		"""Listener and Outputs"""
 		self.population_view = builder.population.get_view(['age', 'sex', 'strata'] + stateCols)
 
@@ -465,6 +710,9 @@ class Circuit:
 		self.start_date = date(year=start_year,
 							   month=start_month,
 							   day=start_day)
+		self.first_year = start_year - 1
+		self.options = observer_options(builder.configuration, self.output_suffix)
+		self.query = population_query(self.options)
 		builder.event.register_listener('time_step__prepare', self.on_time_step_prepare)
 
 		# Output for the end of other years
@@ -474,10 +722,13 @@ class Circuit:
 		self.tables = []
 		self.table_cols = ['sex', 'age', 'strata', 'year', 'month'] + stateCols
 		self.clock = builder.time.clock()
+		self.config = builder.configuration
 		self.output_file = output_file(builder.configuration, self.output_suffix)
 
 	def on_collect_metrics(self, event):
-		pop = self.population_view.get(event.index)
+		if not is_recorded_year(self.options, self.clock().year, self.first_year):
+			return
+		pop = self.population_view.get(event.index, query=self.query)
 		if len(pop.index) == 0:
 			# No tracked population remains.
 			return
@@ -486,6 +737,12 @@ class Circuit:
 		pop['month'] = self.clock().month
 		self.tables.append(pop.loc[:, self.table_cols])
 
+	def get_checkpoint_state(self):
+		return {'tables' : list(self.tables)}
+
+	def set_checkpoint_state(self, state):
+		self.tables = list(state['tables'])
+
 	def write_output(self, event):
 		data = pd.concat(self.tables, ignore_index=True)
 
@@ -499,16 +756,61 @@ class Circuit:
 		cols = ['year_of_birth'] + self.table_cols
 		data = data.reindex(columns=cols)
 
-		output_csv_mkdir(data, self.output_file, index=False)
+		output_table(self.config, self.output_suffix, data)
 
 	def on_time_step_prepare(self, event):
 		# Only output the start of year 0
 		if self.clock().date() != self.start_date:
 			return
-		pop = self.population_view.get(event.index)
+		if not is_recorded_year(self.options, self.first_year, self.first_year):
+			return
+		pop = self.population_view.get(event.index, query=self.query)
 		if len(pop.index) == 0:
 			# No tracked population remains.
 			return
 		pop['year'] = self.clock().year - 1
 		pop['month'] = self.clock().month
 		self.tables.append(pop.loc[:, self.table_cols])
+
+
+class PrunedPopulation:
+	"""
+	This class records the population that remained in each cohort when it
+	was pruned from the simulation by
+	:class:`~mslt.components.population.BasePopulation`, so that totals can
+	be checked against the pruning tolerance.
+
+	Parameters
+	----------
+	output_suffix
+		The suffix for the CSV file in which to record the
+		pruned population.
+
+	"""
+
+	def __init__(self, output_suffix='pruned'):
+		self.output_suffix = output_suffix
+
+	@property
+	def name(self):
+		return 'pruned_population_observer'
+
+	def setup(self, builder):
+		self.base_population = builder.components.get_component('base_population')
+		builder.event.register_listener('simulation_end', self.write_output)
+		self.table_cols = ['year', 'age', 'sex', 'strata',
+						   'population', 'bau_population']
+		self.config = builder.configuration
+		self.output_file = output_file(builder.configuration,
+									   self.output_suffix)
+
+	def write_output(self, event):
+		if len(self.base_population.pruned) == 0:
+			data = pd.DataFrame(columns=self.table_cols)
+		else:
+			data = pd.concat(self.base_population.pruned, ignore_index=True)
+		data['year_of_birth'] = data['year'] - np.floor(data['age'].astype(float))
+		data = data.sort_values(by=['year_of_birth', 'sex', 'strata'], axis=0)
+		data = data.reset_index(drop=True)
+		cols = ['year_of_birth'] + self.table_cols
+		output_table(self.config, self.output_suffix, data[cols])
@@ -14,6 +14,9 @@ import vivarium.framework.configuration as config
 import vivarium.framework.engine as engine
 import vivarium.framework.plugins as plugins
 
+from .cache import run_key, run_cache_enabled, is_complete, write_manifest
+from .checkpoint import run_simulation
+
 
 def fails_to_pickle(item):
 	"""
@@ -169,25 +172,38 @@ def initialise_simulation_from_specification_config(spec_file, draw_number):
 	return simulation
 
 
-def run_nth_draw(spec_file, draw_number):
+def run_nth_draw(spec_file, draw_number, resume=False):
 	"""
 	Run a model simulation for a specific draw number.
 
 	:param model_specification_file: The YAML model specification file.
 	:param draw_number: The draw number to select for rates and values that
 		have multiple draws.
+	:param resume: Skip the simulation if its manifest shows that it has
+		already completed with the same configuration, components and
+		artifact, and its outputs exist. The manifest is written when this
+		is set or when ``run_cache`` is enabled.
 	"""
 	logger = logging.getLogger(__name__)
+	simulation = initialise_simulation_from_specification_config(spec_file, draw_number)
+	key = run_key(spec_file, simulation.configuration, draw_number)
+	if resume and is_complete(simulation, key):
+		logger.info('{} Skipping draw #{} for {}, outputs are up to date'.format(
+			datetime.datetime.now().strftime("%H:%M:%S"),
+			draw_number, spec_file))
+		return None
+
 	logger.info('{} Simulating draw #{} for {} ...'.format(
 		datetime.datetime.now().strftime("%H:%M:%S"),
 		draw_number, spec_file))
 
-	simulation = initialise_simulation_from_specification_config(spec_file, draw_number)
 	simulation.setup()
 	simulation.initialize_simulants()
-	simulation.run()
+	run_simulation(simulation, key, resume)
 	simulation.finalize()
 	metrics = simulation.report()
+	if resume or run_cache_enabled(simulation.configuration):
+		write_manifest(simulation, key, spec_file, draw_number)
 	logger.info('{} Simulation for draw #{} complete'.format(
 		datetime.datetime.now().strftime("%H:%M:%S"),
 		draw_number))
@@ -195,7 +211,7 @@ def run_nth_draw(spec_file, draw_number):
 	return metrics
 
 
-def run_many(spec_files, num_draws, num_procs):
+def run_many(spec_files, num_draws, num_procs, resume=False):
 	"""
 	Run a number of model simulations in serial or in parallel.
 
@@ -205,6 +221,8 @@ def run_many(spec_files, num_draws, num_procs):
 	:param num_procs: The number of processes to spawn in order to run these
 		simulations; set this to values greater than 1 to run multiple
 		simulations in parallel.
+	:param resume: Skip simulations that have already completed with the
+		same inputs.
 	:returns: ``True`` if the simulations completed successfully, otherwise
 		``False``.
 	"""
@@ -214,9 +232,10 @@ def run_many(spec_files, num_draws, num_procs):
 		# Run the simulations serially.
 		for spec_file in spec_files:
 			for draw in range(num_draws + 1):
-				metrics = run_nth_draw(spec_file, draw)
+				metrics = run_nth_draw(spec_file, draw, resume)
 		return True
 	else:
 		# Run the simulations in parallel.
-		args_iter = itertools.product(spec_files, range(num_draws + 1))
+		args_iter = ((spec_file, draw, resume) for spec_file, draw in
+					 itertools.product(spec_files, range(num_draws + 1)))
 		return run_in_parallel(run_nth_draw, args_iter, num_procs)
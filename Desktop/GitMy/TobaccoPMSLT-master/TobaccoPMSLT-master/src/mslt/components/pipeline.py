@@ -0,0 +1,101 @@
+"""
+=====================
+Fused value modifiers
+=====================
+
+Many components modify the same value pipelines (e.g., every disease adjusts
+``mortality_rate``, ``yld_rate`` and ``expenditure_rate``). Rather than
+registering one modifier each, which returns a new Series for the next
+modifier in the chain, components can register a contribution that returns
+a numpy array (or a scalar) for the given index:
+
+- An **additive** contribution is a delta that is added to the rate.
+- A **multiplicative** contribution is a factor that the rate is multiplied
+  by.
+
+Contributions of the same kind to a pipeline that are registered one after
+another are accumulated in a single array by one modifier, which is
+registered with the pipeline when the first of these contributions is
+registered. If any other modifier is registered with the pipeline in
+between, the next contribution starts a new fused modifier, so that the
+modifiers are applied in the order that they were registered. Additive
+contributions must not depend on the value of the rate.
+
+"""
+import weakref
+
+import numpy as np
+
+
+ADDITIVE = 'additive'
+MULTIPLICATIVE = 'multiplicative'
+
+# The fused modifiers of each simulation, keyed on its configuration.
+_fused_modifiers = weakref.WeakKeyDictionary()
+
+
+class FusedModifier:
+	"""Accumulate the contributions of one kind to one value pipeline."""
+
+	def __init__(self, kind):
+		if kind not in [ADDITIVE, MULTIPLICATIVE]:
+			raise ValueError('Invalid modifier kind: {}'.format(kind))
+		self.kind = kind
+		self.contributions = []
+
+	@property
+	def name(self):
+		return 'fused_{}'.format(self.kind)
+
+	def modify(self, index, rates):
+		# Like pandas, do not warn about division by zero.
+		with np.errstate(divide='ignore', invalid='ignore'):
+			if self.kind == ADDITIVE:
+				total = np.zeros(len(index))
+				for contribution in self.contributions:
+					total += contribution(index)
+				return rates + total
+
+			total = np.ones(len(index))
+			for contribution in self.contributions:
+				total *= contribution(index)
+			return rates * total
+
+
+def is_last_modifier(builder, pipeline, modifier):
+	"""Check whether a modifier is the last one registered with a pipeline."""
+	mutators = builder.value.get_value(pipeline).mutators
+	return len(mutators) > 0 and mutators[-1] == modifier
+
+
+def register_contribution(builder, pipeline, contribution, kind):
+	"""
+	Register a contribution to a value pipeline.
+
+	Parameters
+	----------
+	builder
+		The builder object for the simulation.
+	pipeline
+		The name of the value pipeline.
+	contribution
+		A function that takes an index and returns a numpy array (or a scalar)
+		aligned with that index.
+	kind
+		Either ``ADDITIVE`` or ``MULTIPLICATIVE``.
+
+	"""
+	modifiers = _fused_modifiers.setdefault(builder.configuration, {})
+	key = (pipeline, kind)
+	if key not in modifiers or not is_last_modifier(builder, pipeline, modifiers[key].modify):
+		modifiers[key] = FusedModifier(kind)
+		builder.value.register_value_modifier(pipeline, modifiers[key].modify)
+	modifiers[key].contributions.append(contribution)
+
+
+def register_additive(builder, pipeline, contribution):
+	register_contribution(builder, pipeline, contribution, ADDITIVE)
+
+
+def register_multiplicative(builder, pipeline, contribution):
+	register_contribution(builder, pipeline, contribution, MULTIPLICATIVE)
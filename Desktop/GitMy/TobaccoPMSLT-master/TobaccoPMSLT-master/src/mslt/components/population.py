@@ -12,8 +12,13 @@ import pandas as pd
 from datetime import date
 import mslt.utilities as util
 
+from .artifact_index import load_table, prefetch_artifact
+from .bau_cache import get_bau_trajectory, restore_bau, record_bau
+from .pipeline import register_multiplicative
+from .snapshot import get_state_snapshot
+
 def load_population_data(builder):
-	pop_data = builder.data.load('population.structure')
+	pop_data = load_table(builder, 'population.structure')
 	pop_data['age'] = pop_data['age'].astype(float)
 	pop_data = pop_data[['age', 'sex', 'strata', 'value']].rename(columns={'value': 'population'})
 	pop_data['population'] = pop_data['population'].astype(float)
@@ -42,6 +47,16 @@ class BasePopulation:
 	``max_age``
 		The age at which cohorts are removed from the population
 		(default: 110).
+	``prune_threshold``
+		Remove cohorts once both the BAU and intervention populations are
+		below this size (optional).
+	``prune_relative``
+		Remove cohorts once both the BAU and intervention populations are
+		below this fraction of their initial size (optional).
+
+	The population that remains in each pruned cohort is recorded, and can
+	be written with the :class:`~mslt.components.observer.PrunedPopulation`
+	observer.
 
 	.. code-block:: yaml
 
@@ -49,6 +64,7 @@ class BasePopulation:
 		   population:
 			   population_size: 44 # Male and female 5-year cohorts, 0 to 109.
 			   max_age: 110        # The age at which cohorts are removed.
+			   prune_threshold: 0.001
 
 	"""
 
@@ -64,6 +80,7 @@ class BasePopulation:
 	
 	def setup(self, builder):
 		"""Load the population data."""
+		prefetch_artifact(builder)
 		columns = ['age', 'sex', 'strata', 'population', 'bau_population',
 				   'acmr', 'bau_acmr',
 				   'pr_death', 'bau_pr_death', 'deaths', 'bau_deaths',
@@ -87,6 +104,14 @@ class BasePopulation:
 			self.pop_data.loc[:, column] = 0.0
 
 		self.max_age = builder.configuration.population.max_age
+		self.prune_threshold = None
+		self.prune_relative = None
+		if 'prune_threshold' in builder.configuration.population:
+			self.prune_threshold = builder.configuration.population.prune_threshold
+		if 'prune_relative' in builder.configuration.population:
+			self.prune_relative = builder.configuration.population.prune_relative
+		self.initial_population = self.pop_data['population'].copy()
+		self.pruned = []
 
 		if 'strata' in builder.configuration.population:
 			util.SetStrataDf(pd.DataFrame({'strata' : builder.configuration.population.strata}))
@@ -109,6 +134,7 @@ class BasePopulation:
 
 		# Age cohorts before each time-step (except the first time-step).
 		builder.event.register_listener('time_step__prepare', self.on_time_step_prepare)
+		self.snapshot = get_state_snapshot(builder)
 
 	def on_initialize_simulants(self, _):
 		"""Initialize each cohort."""
@@ -122,7 +148,39 @@ class BasePopulation:
 		##if self.clock().date() > self.start_date:
 		pop['age'] += self.years_per_timestep
 		pop.loc[pop.age > self.max_age, 'tracked'] = False
+		self.prune(pop)
 		self.population_view.update(pop)
+		# The tracked simulants have changed.
+		self.snapshot.invalidate()
+
+	def prune(self, pop):
+		"""
+		Stop tracking cohorts whose BAU and intervention populations are both
+		negligible, and record the population that remains in them.
+		"""
+		if self.prune_threshold is None and self.prune_relative is None:
+			return
+		remaining = pop[['population', 'bau_population']].max(axis=1)
+		negligible = pd.Series(False, index=pop.index)
+		if self.prune_threshold is not None:
+			negligible |= remaining < self.prune_threshold
+		if self.prune_relative is not None:
+			initial = self.initial_population.reindex(pop.index)
+			negligible |= remaining < self.prune_relative * initial
+		negligible &= pop['tracked']
+		if not negligible.any():
+			return
+
+		pop.loc[negligible, 'tracked'] = False
+		pruned = pop.loc[negligible, ['age', 'sex', 'strata', 'population', 'bau_population']].copy()
+		pruned['year'] = self.clock().year
+		self.pruned.append(pruned)
+
+	def get_checkpoint_state(self):
+		return {'pruned' : list(self.pruned)}
+
+	def set_checkpoint_state(self, state):
+		self.pruned = list(state['pruned'])
 
 
 class Mortality:
@@ -137,7 +195,8 @@ class Mortality:
 
 	def setup(self, builder):
 		"""Load the all-cause mortality rate."""
-		mortality_data = builder.data.load('cause.all_causes.mortality')
+		prefetch_artifact(builder)
+		mortality_data = load_table(builder, 'cause.all_causes.mortality')
 		self.mortality_rate = builder.value.register_value_producer(
 			'mortality_rate', source=builder.lookup.build_table(mortality_data, 
 																key_columns=['sex', 'strata'], 
@@ -150,6 +209,9 @@ class Mortality:
 
 		self.years_per_timestep = builder.configuration.time.step_size/365
 		builder.event.register_listener('time_step', self.on_time_step)
+		self.bau_trajectory = get_bau_trajectory(builder)
+		self.bau_columns = ['bau_acmr', 'bau_pr_death', 'bau_deaths', 'bau_population',
+							'bau_alive_person_years', 'bau_dead_person_years']
 
 		self.population_view = builder.population.get_view([
 			'population', 'bau_population', 'acmr', 'bau_acmr',
@@ -174,12 +236,17 @@ class Mortality:
 		pop.alive_person_years = pop.population * self.years_per_timestep
 		pop.dead_person_years = pop.deaths * self.years_per_timestep
 
-		pop.bau_acmr = self.bau_mortality_rate(event.index)
-		pop.bau_pr_death = 1 - np.exp(-pop.bau_acmr * self.years_per_timestep)
-		pop.bau_deaths = pop.bau_population * pop.bau_pr_death
-		pop.bau_population *= 1 - pop.bau_pr_death
-		pop.bau_alive_person_years = pop.bau_population * self.years_per_timestep
-		pop.bau_dead_person_years = pop.bau_deaths * self.years_per_timestep
+		bau = restore_bau(self.bau_trajectory, self.name, pop.index)
+		if bau is None:
+			pop.bau_acmr = self.bau_mortality_rate(event.index)
+			pop.bau_pr_death = 1 - np.exp(-pop.bau_acmr * self.years_per_timestep)
+			pop.bau_deaths = pop.bau_population * pop.bau_pr_death
+			pop.bau_population *= 1 - pop.bau_pr_death
+			pop.bau_alive_person_years = pop.bau_population * self.years_per_timestep
+			pop.bau_dead_person_years = pop.bau_deaths * self.years_per_timestep
+			record_bau(self.bau_trajectory, self.name, pop[self.bau_columns])
+		else:
+			pop[self.bau_columns] = bau
 
 		self.population_view.update(pop)
 
@@ -197,9 +264,10 @@ class MortalityEffects:
 		return f'{self._name}_mort_effects'
 
 	def setup(self, builder):
+		prefetch_artifact(builder)
 		self.years_per_timestep = builder.configuration.time.step_size/365
 
-		mort_effects_data = builder.data.load(f'mortality_effects.{self._name}')
+		mort_effects_data = load_table(builder, f'mortality_effects.{self._name}')
 		self.mort_effects_table = builder.lookup.build_table(mort_effects_data, 
 														key_columns=['sex', 'strata'],
 														parameter_columns=['age','year'])
@@ -208,16 +276,11 @@ class MortalityEffects:
 
 
 	def register_mortality_modifier(self, builder):
-		rate_name = 'mortality_rate'
-		modifier = lambda ix, mort_rate: self.mortality_rate_adjustment(ix, mort_rate)
-		builder.value.register_value_modifier(rate_name, modifier)
-
+		register_multiplicative(builder, 'mortality_rate', self.mortality_rate_scale)
 
-	def mortality_rate_adjustment(self, index, mort_rate):
-		mort_scale = self.mort_effects_table(index)
-		new_rate = mort_rate * mort_scale
 
-		return new_rate
+	def mortality_rate_scale(self, index):
+		return self.mort_effects_table(index).to_numpy()
 
 
 class Disability:
@@ -233,7 +296,8 @@ class Disability:
 
 	def setup(self, builder):
 		"""Load the years lost due to disability (YLD) rate."""
-		yld_data = builder.data.load('cause.all_causes.disability_rate')
+		prefetch_artifact(builder)
+		yld_data = load_table(builder, 'cause.all_causes.disability_rate')
 		yld_rate = builder.lookup.build_table(yld_data, 
 											  key_columns=['sex', 'strata'], 
 											  parameter_columns=['age','year'])
@@ -243,6 +307,9 @@ class Disability:
 		self.years_per_timestep = builder.configuration.time.step_size/365
 		builder.event.register_listener('time_step', self.on_time_step)
 
+		self.bau_trajectory = get_bau_trajectory(builder)
+		self.bau_columns = ['bau_yld_rate', 'bau_HALY']
+
 		self.population_view = builder.population.get_view([
 			'bau_yld_rate', 'yld_rate',
 			'bau_alive_person_years', 'alive_person_years',
@@ -258,10 +325,15 @@ class Disability:
 		if pop.empty:
 			return
 		pop.yld_rate = self.yld_rate(event.index)
-		pop.bau_yld_rate = self.bau_yld_rate(event.index)
 		# Rescale yld_rate to per year, person_years is already person years per timestep.
 		pop.HALY = (pop.alive_person_years + 0.5 * pop.dead_person_years) * (1 - pop.yld_rate)
-		pop.bau_HALY = (pop.bau_alive_person_years + 0.5 * pop.bau_dead_person_years) * (1 - pop.bau_yld_rate)
+		bau = restore_bau(self.bau_trajectory, self.name, pop.index)
+		if bau is None:
+			pop.bau_yld_rate = self.bau_yld_rate(event.index)
+			pop.bau_HALY = (pop.bau_alive_person_years + 0.5 * pop.bau_dead_person_years) * (1 - pop.bau_yld_rate)
+			record_bau(self.bau_trajectory, self.name, pop[self.bau_columns])
+		else:
+			pop[self.bau_columns] = bau
 		self.population_view.update(pop)
 
 
@@ -277,7 +349,8 @@ class Expenditure:
 
 	def setup(self, builder):
 		"""Load the expenditure rate."""
-		expenditure_data = builder.data.load('cause.all_causes.expenditure_rate')
+		prefetch_artifact(builder)
+		expenditure_data = load_table(builder, 'cause.all_causes.expenditure_rate')
 		expenditure_rate = builder.lookup.build_table(expenditure_data, 
 											  key_columns=['sex', 'strata'], 
 											  parameter_columns=['age','year'])
@@ -285,7 +358,7 @@ class Expenditure:
 		self.bau_expenditure_rate = builder.value.register_value_producer('bau_expenditure_rate', source=expenditure_rate)
 
 		"""Load the expenditure death cost."""
-		death_data = builder.data.load('cause.all_causes.expenditure_rate_death')
+		death_data = load_table(builder, 'cause.all_causes.expenditure_rate_death')
 		death_cost = builder.lookup.build_table(death_data, 
 											  key_columns=['sex', 'strata'], 
 											  parameter_columns=['age','year'])
@@ -295,6 +368,10 @@ class Expenditure:
 		self.years_per_timestep = builder.configuration.time.step_size/365
 		builder.event.register_listener('time_step', self.on_time_step)
 
+		self.bau_trajectory = get_bau_trajectory(builder)
+		self.bau_columns = ['bau_expenditure_rate', 'bau_expenditure_rate_death',
+							'bau_total_spent']
+
 		self.population_view = builder.population.get_view([
 			'bau_population', 'population',
 			'bau_expenditure_rate', 'expenditure_rate',
@@ -313,14 +390,19 @@ class Expenditure:
 		if pop.empty:
 			return
 		pop.expenditure_rate = self.expenditure_rate(event.index)
-		pop.bau_expenditure_rate = self.bau_expenditure_rate(event.index)
 		pop.expenditure_rate_death = self.expenditure_rate_death(event.index)
-		pop.bau_expenditure_rate_death = self.bau_expenditure_rate_death(event.index)
 		# Split expenditure into people who live through the timestep and people who die in the timestep.
 		pop.total_spent = (pop.alive_person_years * self.expenditure_rate(event.index) + 
 			pop.dead_person_years * self.expenditure_rate_death(event.index))
-		pop.bau_total_spent = (pop.bau_alive_person_years * self.bau_expenditure_rate(event.index) + 
-			pop.bau_dead_person_years * self.bau_expenditure_rate_death(event.index))
+		bau = restore_bau(self.bau_trajectory, self.name, pop.index)
+		if bau is None:
+			pop.bau_expenditure_rate = self.bau_expenditure_rate(event.index)
+			pop.bau_expenditure_rate_death = self.bau_expenditure_rate_death(event.index)
+			pop.bau_total_spent = (pop.bau_alive_person_years * self.bau_expenditure_rate(event.index) + 
+				pop.bau_dead_person_years * self.bau_expenditure_rate_death(event.index))
+			record_bau(self.bau_trajectory, self.name, pop[self.bau_columns])
+		else:
+			pop[self.bau_columns] = bau
 		self.population_view.update(pop)
 
 
@@ -336,14 +418,15 @@ class Income:
 
 	def setup(self, builder):
 		"""Load the income rate."""
-		income_data = builder.data.load('cause.all_causes.income')
+		prefetch_artifact(builder)
+		income_data = load_table(builder, 'cause.all_causes.income')
 		income_rate = builder.lookup.build_table(income_data, 
 											  key_columns=['sex', 'strata'], 
 											  parameter_columns=['age','year'])
 		self.income = builder.value.register_value_producer('income', source=income_rate)
 		self.bau_income = builder.value.register_value_producer('bau_income', source=income_rate)
 
-		income_death_data = builder.data.load('cause.all_causes.income_death')
+		income_death_data = load_table(builder, 'cause.all_causes.income_death')
 		income_death_rate = builder.lookup.build_table(income_death_data, 
 											  key_columns=['sex', 'strata'], 
 											  parameter_columns=['age','year'])
@@ -353,6 +436,9 @@ class Income:
 		self.years_per_timestep = builder.configuration.time.step_size/365
 		builder.event.register_listener('time_step', self.on_time_step)
 
+		self.bau_trajectory = get_bau_trajectory(builder)
+		self.bau_columns = ['bau_income', 'bau_income_death', 'bau_total_income']
+
 		self.population_view = builder.population.get_view([
 			'bau_population', 'population',
 			'bau_income', 'income',
@@ -371,12 +457,17 @@ class Income:
 		if pop.empty:
 			return
 		pop.income = self.income(event.index)
-		pop.bau_income = self.bau_income(event.index)
 		pop.income_death = self.income_death(event.index)
-		pop.bau_income_death = self.bau_income_death(event.index)
 		# Split income into people who live through the timestep and people who die in the timestep.
 		pop.total_income = (pop.alive_person_years * self.income(event.index) + 
 			pop.dead_person_years * self.income_death(event.index))
-		pop.bau_total_income = (pop.bau_alive_person_years * self.bau_income(event.index) + 
-			pop.bau_dead_person_years * self.bau_income_death(event.index))
+		bau = restore_bau(self.bau_trajectory, self.name, pop.index)
+		if bau is None:
+			pop.bau_income = self.bau_income(event.index)
+			pop.bau_income_death = self.bau_income_death(event.index)
+			pop.bau_total_income = (pop.bau_alive_person_years * self.bau_income(event.index) + 
+				pop.bau_dead_person_years * self.bau_income_death(event.index))
+			record_bau(self.bau_trajectory, self.name, pop[self.bau_columns])
+		else:
+			pop[self.bau_columns] = bau
 		self.population_view.update(pop)
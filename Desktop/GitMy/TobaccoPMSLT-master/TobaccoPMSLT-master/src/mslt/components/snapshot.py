@@ -0,0 +1,220 @@
+"""
+==============
+State snapshot
+==============
+
+Every call to ``PopulationView.get`` and ``PopulationView.update`` copies the
+entire state table, and the rate modifiers of the diseases, the circuit and
+the delayed risks read the state table each time that a rate is calculated.
+
+This module provides a snapshot of the state table that is shared by all of
+the components of a simulation. The snapshot is taken when it is first read
+in each phase of a time-step (``time_step__prepare``, ``time_step``, etc)
+and its columns are returned as read-only numpy arrays.
+
+Components that write to columns that are read from the snapshot must write
+through the snapshot, so that later reads in the same phase see the new
+values. These writes are buffered, and are applied to the state table with
+a single update at the start of the next phase. Components that write to
+other columns (e.g., ``tracked``) directly must call ``invalidate``.
+
+"""
+import weakref
+
+import numpy as np
+import pandas as pd
+
+
+PHASES = ['time_step__prepare', 'time_step', 'time_step__cleanup',
+		  'collect_metrics', 'simulation_end']
+
+# The snapshot of each simulation, keyed on its configuration.
+_snapshots = weakref.WeakKeyDictionary()
+
+
+class SnapshotFrame:
+	"""
+	The rows of the snapshot for the tracked simulants in an index, as
+	read-only numpy arrays.
+	"""
+
+	def __init__(self, index, arrays):
+		self.index = index
+		self._arrays = arrays
+
+	@property
+	def empty(self):
+		return len(self.index) == 0
+
+	@property
+	def columns(self):
+		return list(self._arrays)
+
+	def __getitem__(self, column):
+		return self._arrays[column]
+
+	def to_frame(self, columns=None):
+		if columns is None:
+			columns = self.columns
+		return pd.DataFrame({column: self._arrays[column] for column in columns},
+							index=self.index)
+
+
+class StateSnapshot:
+	"""A snapshot of the state table, shared by the components of a simulation."""
+
+	def __init__(self, builder):
+		self.get_view = builder.population.get_view
+		self.read_view = builder.population.get_view([])
+		self.write_view = None
+		self.write_columns = []
+		self.active = False
+		self.index = None
+		self.table = None
+		self.arrays = {}
+		self.pending = set()
+		builder.event.register_listener('post_setup', self.on_post_setup)
+		for phase in PHASES:
+			# Run before all of the components, which use the default priority.
+			builder.event.register_listener(phase, self.on_phase, priority=0)
+
+	@property
+	def name(self):
+		return 'state_snapshot'
+
+	def register_columns(self, columns):
+		"""Declare the columns that a component writes through the snapshot."""
+		self.write_columns.extend(c for c in columns if c not in self.write_columns)
+
+	def on_post_setup(self, event):
+		if self.write_columns:
+			self.write_view = self.get_view(self.write_columns)
+
+	def on_phase(self, event):
+		self.invalidate()
+		self.index = event.index
+		self.active = True
+
+	def invalidate(self):
+		"""
+		Apply the buffered writes and discard the snapshot, so that it is
+		taken again when next read.
+		"""
+		self.flush()
+		self.table = None
+		self.arrays = {}
+
+	def flush(self):
+		"""Apply the buffered writes to the state table."""
+		if not self.pending:
+			return
+		update = pd.DataFrame({column: self.arrays[column] for column in sorted(self.pending)},
+							  index=self.table.index)
+		self.pending = set()
+		self.write_view.update(update)
+
+	def take(self):
+		if self.table is None:
+			self.table = self.read_view.get(self.index)
+		return self.table
+
+	def column(self, column):
+		if column not in self.arrays:
+			values = self.take()[column].to_numpy()
+			values.flags.writeable = False
+			self.arrays[column] = values
+		return self.arrays[column]
+
+	def positions(self, index):
+		"""
+		Find the rows of the snapshot for each simulant in ``index``, or -1
+		for simulants that were not in the state table at the start of the
+		phase.
+		"""
+		table = self.take()
+		if index.equals(table.index):
+			return slice(None)
+		return table.index.get_indexer(index)
+
+	def get(self, index, columns, tracked_only=True):
+		"""
+		Get the columns for the tracked simulants in ``index``.
+
+		Parameters
+		----------
+		index
+			The simulants to select.
+		columns
+			The state table columns to select.
+		tracked_only
+			Whether to exclude the untracked simulants. If not, the arrays are
+			aligned with ``index``, which must only contain simulants in the
+			state table.
+
+		Returns
+		-------
+		A SnapshotFrame whose index contains the selected simulants.
+
+		"""
+		if not self.active:
+			# Outside of a time-step, e.g., when initialising simulants.
+			pop = self.read_view.get(index, query='tracked == True' if tracked_only else '')
+			return SnapshotFrame(pop.index, {c: pop[c].to_numpy() for c in columns})
+
+		positions = self.positions(index)
+		if not tracked_only:
+			return SnapshotFrame(index, {c: self.column(c)[positions] for c in columns})
+
+		tracked = self.column('tracked')
+		if isinstance(positions, slice):
+			keep = tracked
+		else:
+			keep = (positions >= 0) & tracked[positions]
+		if not keep.all():
+			if isinstance(positions, slice):
+				positions = np.arange(len(tracked))
+			positions = positions[keep]
+			index = index[keep]
+		return SnapshotFrame(index, {c: self.column(c)[positions] for c in columns})
+
+	def update(self, data):
+		"""
+		Write columns through the snapshot. The state table is updated at the
+		start of the next phase.
+		"""
+		if not self.active:
+			self.write_view.update(data)
+			return
+		missing = set(data.columns) - set(self.write_columns)
+		if missing:
+			raise ValueError('Columns not registered with the snapshot: {}'.format(
+				sorted(missing)))
+		positions = self.positions(data.index)
+		if not isinstance(positions, slice) and (positions < 0).any():
+			raise ValueError('Cannot write to simulants that are not in the snapshot')
+		for column in data.columns:
+			# Copy on write, since earlier reads may share this array.
+			values = self.column(column).copy()
+			values[positions] = data[column].to_numpy()
+			values.flags.writeable = False
+			self.arrays[column] = values
+			self.pending.add(column)
+
+
+def get_state_snapshot(builder, write_columns=()):
+	"""
+	Get the state snapshot shared by the components of this simulation.
+
+	Parameters
+	----------
+	builder
+		The builder object for the simulation.
+	write_columns
+		The columns that the component will write through the snapshot.
+
+	"""
+	config = builder.configuration
+	if config not in _snapshots:
+		_snapshots[config] = StateSnapshot(builder)
+	_snapshots[config].register_columns(write_columns)
+	return _snapshots[config]
@@ -7,6 +7,8 @@ This module contains tools for modeling interventions in multi-state lifetable
 simulations.
 
 """
+from .artifact_index import load_table, prefetch_artifact
+
 
 class LockdownAcuteDisease:
 	"""Interventions that modify an acute disease fatality rate."""
@@ -19,6 +21,7 @@ class LockdownAcuteDisease:
 		return self._name
 
 	def setup(self, builder):
+		prefetch_artifact(builder)
 		self.config = builder.configuration
 		diseaseMort = self.config['lockdown'].affects.mortality
 		self.diseaseMortRates = {
@@ -30,7 +33,7 @@ class LockdownAcuteDisease:
 		}
 
 		situation = self.config['acute_disease'].covid.data_name
-		stage_data = builder.data.load('stage.' + situation + '.stage3and4')
+		stage_data = load_table(builder, 'stage.' + situation + '.stage3and4')
 		self.stage_table = builder.lookup.build_table(stage_data, 
 											   parameter_columns=['year'])
 		#stage_table = builder.value.register_value_producer('stage_table', source=stage_table)
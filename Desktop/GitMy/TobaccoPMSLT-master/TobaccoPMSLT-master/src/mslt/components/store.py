@@ -0,0 +1,241 @@
+"""
+============
+Result store
+============
+
+This module provides a single HDF result store that observers from many
+simulations (scenarios and draws) write into, instead of each observer
+writing its own CSV file for every draw.
+
+Each table is stored under the key ``/<scenario>/<observer>/draw_<n>`` and a
+row is appended to an index file (``<store>.index.csv``) listing the key,
+scenario, observer, draw, and columns. Readers use the index to select a
+subset of tables without opening the others.
+
+"""
+import os
+import socket
+import time
+
+import pandas as pd
+
+
+INDEX_COLUMNS = ['scenario', 'observer', 'draw', 'key', 'rows', 'columns']
+
+
+def store_key(scenario, observer, draw):
+	return '/{}/{}/draw_{}'.format(scenario, observer, draw)
+
+
+def index_file(store_path):
+	return store_path + '.index.csv'
+
+
+class StoreLock:
+	"""
+	A lock file that serialises writes to the store across worker processes.
+	``O_EXCL`` is not atomic on every NFS version, so the lock is taken by
+	writing a file that is unique to this process and hard linking it to the
+	lock file. Linking is atomic on NFS, and the link count of the unique
+	file shows whether it succeeded even if the reply to the client is lost.
+
+	The lock file records the host and process that holds it. A lock that is
+	held by a process on this host that no longer exists, or that is older
+	than ``stale_age`` seconds (by default, ``timeout``), is broken, so that
+	a killed worker does not block the others.
+	"""
+
+	def __init__(self, store_path, timeout=600, poll=0.05, stale_age=None):
+		self.lock_file = store_path + '.lock'
+		self.timeout = timeout
+		self.stale_age = timeout if stale_age is None else stale_age
+		self.poll = poll
+		self.owner = None
+
+	def __enter__(self):
+		start = time.time()
+		owner = '{}:{}:{}'.format(socket.gethostname(), os.getpid(), time.time())
+		while True:
+			if self.acquire(owner):
+				self.owner = owner
+				return self
+			if self.break_if_stale():
+				continue
+			if time.time() - start > self.timeout:
+				raise TimeoutError('Timed out waiting for lock {}'.format(self.lock_file))
+			time.sleep(self.poll)
+
+	def acquire(self, owner):
+		"""Take the lock if it is free, and return whether it was taken."""
+		unique_file = '{}.{}.{}'.format(self.lock_file, socket.gethostname(), os.getpid())
+		with open(unique_file, 'w') as f:
+			f.write(owner)
+		try:
+			os.link(unique_file, self.lock_file)
+		except OSError:
+			# The link may have been created even if an error is reported.
+			pass
+		try:
+			return os.stat(unique_file).st_nlink == 2
+		finally:
+			os.remove(unique_file)
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		# Only remove the lock if it has not been broken by another process.
+		if read_lock(self.lock_file) == self.owner:
+			os.remove(self.lock_file)
+		self.owner = None
+
+	def is_stale(self, owner, age):
+		if age > self.stale_age:
+			return True
+		host, _, rest = owner.partition(':')
+		pid = rest.partition(':')[0]
+		if host != socket.gethostname() or not pid.isdigit():
+			# The owner has not written its details yet, or is on another host.
+			return False
+		return not pid_exists(int(pid))
+
+	def break_if_stale(self):
+		"""Remove the lock file if it is stale, and return whether it was."""
+		try:
+			owner = read_lock(self.lock_file)
+			age = time.time() - os.path.getmtime(self.lock_file)
+		except FileNotFoundError:
+			return True
+		if owner is None:
+			return True
+		if not self.is_stale(owner, age):
+			return False
+		# Move the lock aside before removing it, and put it back if another
+		# process has broken the stale lock and taken a new lock meanwhile.
+		stale_file = '{}.{}.stale'.format(self.lock_file, os.getpid())
+		try:
+			os.rename(self.lock_file, stale_file)
+		except FileNotFoundError:
+			return True
+		if read_lock(stale_file) != owner:
+			try:
+				os.link(stale_file, self.lock_file)
+			except FileExistsError:
+				pass
+		os.remove(stale_file)
+		return True
+
+
+def read_lock(lock_file):
+	try:
+		with open(lock_file) as f:
+			return f.read()
+	except FileNotFoundError:
+		return None
+
+
+def pid_exists(pid):
+	# On Windows os.kill terminates the process, so assume that it exists
+	# and rely on the age of the lock.
+	if os.name != 'posix':
+		return True
+	try:
+		os.kill(pid, 0)
+	except ProcessLookupError:
+		return False
+	except PermissionError:
+		return True
+	return True
+
+
+def write_to_store(store_path, scenario, observer, draw, data):
+	"""
+	Write one observer table for one draw of one scenario to the store.
+
+	Parameters
+	----------
+	store_path
+		The HDF file that holds the results.
+	scenario
+		The scenario name, usually the basename of the output prefix.
+	observer
+		The observer output suffix.
+	draw
+		The input draw number.
+	data
+		The observer table.
+
+	"""
+	out_folder = os.path.dirname(store_path)
+	if out_folder and not os.path.exists(out_folder):
+		os.makedirs(out_folder, exist_ok=True)
+
+	key = store_key(scenario, observer, draw)
+	index_row = pd.DataFrame([[
+		scenario, observer, draw, key, len(data.index), ';'.join(data.columns)]],
+		columns=INDEX_COLUMNS)
+	with StoreLock(store_path):
+		# Table format allows readers to select columns.
+		data.to_hdf(store_path, key=key, mode='a', format='table',
+					complevel=4, complib='zlib')
+		indexPath = index_file(store_path)
+		index_row.to_csv(indexPath, mode='a', index=False,
+						 header=not os.path.exists(indexPath))
+
+
+def read_store_index(store_path):
+	"""
+	Read the index of the tables in the store. A table written more than
+	once (e.g., by re-running a draw) is only listed once.
+	"""
+	index = pd.read_csv(index_file(store_path))
+	return index.drop_duplicates(subset='key', keep='last').reset_index(drop=True)
+
+
+def _select(index, column, values):
+	if values is None:
+		return index
+	if not isinstance(values, (list, tuple, set, range)):
+		values = [values]
+	return index[index[column].isin(values)]
+
+
+def read_store(store_path, scenario=None, draw=None, observer=None, columns=None):
+	"""
+	Read a subset of the store as a single table, with ``scenario``,
+	``observer`` and ``draw`` columns identifying the source of each row.
+	Each selection argument may be a single value, a list of values, or
+	``None`` to select all.
+
+	Parameters
+	----------
+	store_path
+		The HDF file that holds the results.
+	scenario
+		The scenario name(s) to select.
+	draw
+		The draw number(s) to select.
+	observer
+		The observer suffix(es) to select.
+	columns
+		The table columns to read; tables without some of these columns
+		are read with those columns missing.
+
+	"""
+	index = read_store_index(store_path)
+	index = _select(index, 'scenario', scenario)
+	index = _select(index, 'observer', observer)
+	index = _select(index, 'draw', draw)
+	if len(index.index) == 0:
+		raise ValueError('No tables in {} match the selection'.format(store_path))
+
+	tables = []
+	with pd.HDFStore(store_path, mode='r') as store:
+		for row in index.itertuples():
+			readCols = None
+			if columns is not None:
+				available = row.columns.split(';')
+				readCols = [c for c in columns if c in available]
+			data = store.select(row.key, columns=readCols)
+			data['scenario'] = row.scenario
+			data['observer'] = row.observer
+			data['draw'] = row.draw
+			tables.append(data)
+	return pd.concat(tables, ignore_index=True, sort=False)
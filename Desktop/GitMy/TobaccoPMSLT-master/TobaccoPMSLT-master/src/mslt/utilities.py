@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 import os
+import hashlib
+import json
 
 from pathlib import Path
 
@@ -12,6 +14,48 @@ def get_data_dir(population):
 	return here.parent / 'artifacts' / population
 
 
+# Artifact digests already calculated by this process, keyed on path, size
+# and modification time.
+digestCache = {}
+
+
+def FileDigest(path, block_size=1 << 20):
+	"""
+	Calculate the SHA-256 digest of a file. The digest is also saved next to
+	the file (``<path>.sha256.json``) with the file size and modification
+	time, so that large artifacts are only hashed once across processes.
+	"""
+	stat = os.stat(path)
+	stamp = (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+	if stamp in digestCache:
+		return digestCache[stamp]
+
+	sidecar = path + '.sha256.json'
+	try:
+		with open(sidecar) as f:
+			saved = json.load(f)
+		if saved['size'] == stat.st_size and saved['mtime_ns'] == stat.st_mtime_ns:
+			digestCache[stamp] = saved['sha256']
+			return saved['sha256']
+	except (OSError, ValueError, KeyError):
+		pass
+
+	sha = hashlib.sha256()
+	with open(path, 'rb') as f:
+		for block in iter(lambda: f.read(block_size), b''):
+			sha.update(block)
+	digest = sha.hexdigest()
+	digestCache[stamp] = digest
+	try:
+		with open(sidecar, 'w') as f:
+			json.dump({'size' : stat.st_size, 'mtime_ns' : stat.st_mtime_ns,
+					   'sha256' : digest}, f)
+	except OSError:
+		# The artifact folder may be read-only.
+		pass
+	return digest
+
+
 def UnstackDraw(df):
 	df = df.sort_values(['year_start', 'age_start', 'sex', 'strata', 'draw'])
 	df = df.set_index(['year_start',  'year_end', 'age_start', 'age_end', 'sex', 'strata', 'draw'])
@@ -27,11 +71,18 @@ def UnstackDraw(df):
 
 
 def CrossDf(df1, df2):
-	return (df1
-		.assign(_cross_merge_key=1)
-		.merge(df2.assign(_cross_merge_key=1), on="_cross_merge_key")
-		.drop("_cross_merge_key", axis=1)
-	)
+	# Every row of df1 paired with every row of df2, in the same order as a
+	# merge on a dummy key, by repeating the rows of each frame.
+	if set(df1.columns) & set(df2.columns):
+		# Let the merge add suffixes to the shared columns.
+		return (df1
+			.assign(_cross_merge_key=1)
+			.merge(df2.assign(_cross_merge_key=1), on="_cross_merge_key")
+			.drop("_cross_merge_key", axis=1)
+		)
+	left = df1.iloc[np.repeat(np.arange(len(df1)), len(df2))].reset_index(drop=True)
+	right = df2.iloc[np.tile(np.arange(len(df2)), len(df1))].reset_index(drop=True)
+	return pd.concat([left, right], axis=1)
 
 
 def MakePath(path):
@@ -156,15 +207,40 @@ def ExpandAgeCategory(df, max_age):
 	indexNames = [x for x in indexNames if (x != 'agecategory' and x != None)]
 	df = df.reset_index()
 
-	# Add age and filter out ages that are below the agecategory.
-	df = CrossDf(df, pd.DataFrame({'age' : list(range(max_age))}))
-	df = df[df['age'] >= df['agecategory']]
-
-	# Add a copy of agecategory to the index so it can be grabbed with loc
-	df['as_index'] = df['agecategory']
-	df = df.set_index(['age', 'as_index'] + indexNames)
-	df = df.loc[df.groupby(['age'] + indexNames)['agecategory'].idxmax()]
-	df = df.drop(columns=['agecategory']).droplevel('as_index')
+	# Sort the rows into groups that share the other index values, with the
+	# age categories of each group in ascending order.
+	df = df.sort_values(indexNames + ['agecategory'], kind='mergesort')
+	df = df.reset_index(drop=True)
+	if len(indexNames) > 0:
+		keys = df[indexNames]
+		newGroup = (keys != keys.shift()).any(axis=1).to_numpy(copy=True)
+	else:
+		newGroup = np.zeros(len(df), dtype=bool)
+	newGroup[:1] = True
+	group = np.cumsum(newGroup) - 1
+	numGroups = group[-1] + 1 if len(df) > 0 else 0
+
+	# Find the highest age category that does not exceed each age, in each
+	# group, by searching a single sorted array of (group, agecategory) keys.
+	ages = np.arange(max_age)
+	category = df['agecategory'].to_numpy(dtype=float)
+	lowest = min(category.min(), 0) if len(df) > 0 else 0
+	span = max(category.max() if len(df) > 0 else 0, max_age) - lowest + 1
+	rowKeys = group * span + (category - lowest)
+	queryAge = np.repeat(ages, numGroups)
+	queryGroup = np.tile(np.arange(numGroups), max_age)
+	row = np.searchsorted(rowKeys, queryGroup * span + (queryAge - lowest), side='right') - 1
+	valid = (row >= 0) & (group[np.maximum(row, 0)] == queryGroup)
+
+	# Keep every row of the group with the matched age category, since the
+	# other columns (e.g., sex and year) may not be part of the index.
+	last = row[valid]
+	first = np.searchsorted(rowKeys, rowKeys[last], side='left')
+	counts = last - first + 1
+	offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+	df = df.iloc[np.repeat(first, counts) + offsets].reset_index(drop=True)
+	df['age'] = np.repeat(queryAge[valid], counts)
+	df = df.drop(columns=['agecategory']).set_index(['age'] + indexNames)
 	return df
 
 
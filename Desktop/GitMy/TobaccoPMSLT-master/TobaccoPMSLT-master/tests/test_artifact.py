@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+from vivarium.framework.artifact import Artifact
+
+from mslt.artifacts.artifact import TableWriter
+
+
+def table(value):
+	return pd.DataFrame({'age' : [0, 1], 'sex' : ['male', 'female'], 'value' : [value, value]})
+
+
+def test_writer_writes_queued_tables(tmp_path):
+	artifact = Artifact(str(tmp_path / 'test.hdf'))
+	with TableWriter(write_csv=False) as writer:
+		writer.write(artifact, 'population.first', table(1.0))
+		writer.write(artifact, 'population.second', table(2.0))
+
+	assert not writer.thread.is_alive()
+	assert artifact.load('population.second')['value'].tolist() == [2.0, 2.0]
+
+
+def test_writer_stops_when_generation_fails(tmp_path):
+	artifact = Artifact(str(tmp_path / 'test.hdf'))
+	with pytest.raises(KeyError):
+		with TableWriter(write_csv=False) as writer:
+			writer.write(artifact, 'population.first', table(1.0))
+			raise KeyError('generation failed')
+
+	assert not writer.thread.is_alive()
+
+
+def test_writer_raises_write_errors(tmp_path):
+	artifact = Artifact(str(tmp_path / 'test.hdf'))
+	with pytest.raises(ValueError):
+		with TableWriter(write_csv=False) as writer:
+			writer.write(artifact, 'population.first', table(float('nan')))
+
+	assert not writer.thread.is_alive()
@@ -0,0 +1,106 @@
+from types import SimpleNamespace
+
+import pandas as pd
+from vivarium.config_tree import ConfigTree
+from vivarium.framework.artifact import Artifact
+
+from mslt.components.artifact_index import circuit_keys, get_artifact_index, load_table
+
+
+def test_circuit_keys():
+	config = ConfigTree({'circuit': {
+		'prevalence_int': 'prevalence_int',
+		'prevalence_bau': 'prevalence',
+		'register_rr': False,
+		'arcs': {'ns': ['cs'], 'cs': ['qs'], 'qs': []},
+		'affects': ['lrti'],
+		'rr_ignore': ['qs'],
+	}})
+
+	assert circuit_keys(config) == {
+		'circuit.flow.ns_cs', 'circuit.flow.cs_qs',
+		'circuit.prevalence_int.ns', 'circuit.prevalence_int.cs', 'circuit.prevalence_int.qs',
+		'circuit.prevalence.ns', 'circuit.prevalence.cs', 'circuit.prevalence.qs',
+		'circuit.rr.lrti_ns', 'circuit.rr.lrti_cs',
+	}
+
+
+def test_circuit_keys_without_circuit():
+	assert circuit_keys(ConfigTree({'population': {'max_age': 110}})) == set()
+
+
+ARTIFACT_KEYS = [
+	'population.structure',
+	'cause.all_causes.mortality',
+	'chronic_disease.chd.incidence',
+	'chronic_disease.stroke.incidence',
+	'acute_disease.lrti.mortality',
+	'acute_disease.covid_elimination.mortality',
+	'acute_disease.covid_suppression.mortality',
+	'risk_factor.tobacco.prevalence',
+	'mortality_effects.chd',
+	'stage.covid_elimination.stage3and4',
+	'stage.covid_suppression.stage3and4',
+	'circuit.flow.ns_cs',
+	'circuit.flow.cs_ns',
+	'circuit.prevalence.ns',
+	'circuit.prevalence.cs',
+]
+
+
+def make_builder(tmp_path, components, config):
+	artifact = Artifact(str(tmp_path / 'test.hdf'))
+	for key in ARTIFACT_KEYS:
+		artifact.write(key, pd.DataFrame({'age' : [0, 1], 'value' : [1.0, 2.0]}))
+	config['input_data'] = {'artifact_path': str(tmp_path / 'test.hdf')}
+	return SimpleNamespace(
+		configuration=ConfigTree(config),
+		components=SimpleNamespace(list_components=lambda: components),
+		data=SimpleNamespace(load=artifact.load))
+
+
+def test_required_keys(tmp_path):
+	builder = make_builder(tmp_path,
+		['population', 'chd', 'chd_mort_effects', 'covid', 'tobacco', 'lockdown'],
+		{'acute_disease': {'covid': {'data_name': 'covid_elimination'}},
+		 'lockdown': {'affects': {'mortality': ['covid']}},
+		 'circuit': {'prevalence_int': 'prevalence', 'prevalence_bau': 'prevalence',
+					 'arcs': {'ns': ['cs'], 'cs': []}}})
+	index = get_artifact_index(builder)
+
+	expected = {
+		'population.structure',
+		'cause.all_causes.mortality',
+		'chronic_disease.chd.incidence',
+		'acute_disease.covid_elimination.mortality',
+		'risk_factor.tobacco.prevalence',
+		'mortality_effects.chd',
+		'stage.covid_elimination.stage3and4',
+		'circuit.flow.ns_cs',
+		'circuit.prevalence.ns',
+		'circuit.prevalence.cs',
+	}
+	assert index.required_keys(builder) == [k for k in index.ordered_keys if k in expected]
+
+
+def test_required_keys_without_lockdown(tmp_path):
+	builder = make_builder(tmp_path, ['population', 'lrti', 'covid'],
+		{'acute_disease': {'covid': {'data_name': 'covid_suppression'}}})
+	index = get_artifact_index(builder)
+
+	expected = {
+		'population.structure',
+		'cause.all_causes.mortality',
+		'acute_disease.lrti.mortality',
+		'acute_disease.covid_suppression.mortality',
+	}
+	assert index.required_keys(builder) == [k for k in index.ordered_keys if k in expected]
+
+
+def test_load_prefetched_table(tmp_path):
+	builder = make_builder(tmp_path, ['population'], {})
+	index = get_artifact_index(builder)
+	index.tables['population.structure'] = 'prefetched'
+
+	assert load_table(builder, 'population.structure') == 'prefetched'
+	assert 'population.structure' not in index.tables
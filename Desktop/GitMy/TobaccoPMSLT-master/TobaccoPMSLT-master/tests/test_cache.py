@@ -0,0 +1,44 @@
+from vivarium.config_tree import ConfigTree
+
+from mslt.components.cache import run_key, manifest_file, is_complete, write_manifest
+
+
+def make_config(tmp_path, **changes):
+	artifact = tmp_path / 'artifact.hdf'
+	if not artifact.exists():
+		artifact.write_bytes(b'artifact')
+	config = {
+		'input_data' : {'artifact_path' : str(artifact), 'input_draw_number' : 1},
+		'population' : {'population_size' : 440},
+	}
+	config.update(changes)
+	return ConfigTree(config)
+
+
+def test_run_key_depends_on_specification_and_configuration(tmp_path):
+	spec_file = tmp_path / 'spec.yaml'
+	spec_file.write_text('components: {}\n')
+	config = make_config(tmp_path)
+	key = run_key(str(spec_file), config, 1)
+
+	assert run_key(str(spec_file), make_config(tmp_path), 1) == key
+	assert run_key(str(spec_file), config, 2) != key
+	assert run_key(str(spec_file), make_config(
+		tmp_path, population={'population_size' : 220}), 1) != key
+
+	spec_file.write_text('components: {mslt.components.population: [BasePopulation()]}\n')
+	assert run_key(str(spec_file), config, 1) != key
+
+
+class Simulation:
+	def __init__(self, configuration):
+		self.configuration = configuration
+
+
+def test_manifest_requires_an_output_prefix(tmp_path):
+	simulation = Simulation(make_config(tmp_path))
+
+	assert manifest_file(simulation.configuration) is None
+	write_manifest(simulation, 'key', str(tmp_path / 'spec.yaml'), 1)
+	assert not is_complete(simulation, 'key')
+	assert sorted(path.name for path in tmp_path.iterdir()) == ['artifact.hdf']
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+from scipy.linalg import expm
+
+from mslt.components.circuit import BatchedExpm, Circuit
+
+
+def test_batched_expm_matches_scipy():
+	rng = np.random.default_rng(0)
+	# Include matrices whose norms need many squarings.
+	scales = np.repeat([0.01, 0.1, 1, 5, 20], 4)
+	matrices = rng.normal(size=(20, 5, 5)) * scales[:, np.newaxis, np.newaxis]
+	expected = np.array([expm(matrix) for matrix in matrices])
+	np.testing.assert_allclose(BatchedExpm(matrices), expected, rtol=1e-9, atol=1e-12)
+
+
+def make_circuit(continuous_time):
+	# ns -> cs -> qs_1 -> qs_2 -> fs, where qs_1 -> qs_2 is a tunnel.
+	states = ['ns', 'cs', 'qs_1', 'qs_2', 'fs']
+	circuit = Circuit()
+	circuit.columns = ['c_{}'.format(state) for state in states] + \
+		['c_{}_bau'.format(state) for state in states]
+	circuit.cols_int = circuit.columns[:len(states)]
+	circuit.cols_bau = circuit.columns[len(states):]
+	circuit.tunnel_arcs = [{'source' : 'c_qs_1', 'sink' : 'c_qs_2',
+							'source_bau' : 'c_qs_1_bau', 'sink_bau' : 'c_qs_2_bau'}]
+	circuit.setup_tunnels()
+	circuit.continuous_time = continuous_time
+	circuit.years_per_timestep = 1
+	return circuit
+
+
+def arc(source, sink):
+	return {'source' : 'c_{}'.format(source), 'sink' : 'c_{}'.format(sink),
+			'source_bau' : 'c_{}_bau'.format(source), 'sink_bau' : 'c_{}_bau'.format(sink)}
+
+
+def step(circuit, states, flows):
+	states_new = states.copy()
+	circuit.apply_flows(states, states_new, flows)
+	return states_new
+
+
+def make_flows(scale, rows):
+	rng = np.random.default_rng(1)
+	return [
+		(arc('ns', 'cs'), scale * rng.uniform(size=rows)),
+		(arc('cs', 'qs_1'), scale * rng.uniform(size=rows)),
+		(arc('cs', 'fs'), scale * rng.uniform(size=rows)),
+		# All of qs_2 leaves each year.
+		(arc('qs_2', 'cs'), np.full(rows, 0.25)),
+		(arc('qs_2', 'fs'), np.full(rows, 0.75)),
+	]
+
+
+@pytest.mark.parametrize('scale', [0.01, 0.3])
+def test_continuous_time_conserves_mass(scale):
+	rows = 50
+	rng = np.random.default_rng(2)
+	states = rng.uniform(size=(rows, 10))
+	states_new = step(make_circuit(True), states, make_flows(scale, rows))
+
+	np.testing.assert_allclose(states_new[:, :5].sum(axis=1), states[:, :5].sum(axis=1))
+	assert (states_new >= 0).all()
+	# The BAU states are not moved.
+	np.testing.assert_array_equal(states_new[:, 5:], states[:, 5:])
+
+
+def test_continuous_time_moves_blocks_as_discrete_steps():
+	rows = 50
+	rng = np.random.default_rng(3)
+	states = rng.uniform(size=(rows, 10))
+	# Only the tunnel and qs_2, which are emptied each year.
+	flows = make_flows(0.2, rows)[3:]
+	continuous = step(make_circuit(True), states, flows)
+	discrete = step(make_circuit(False), states, flows)
+
+	np.testing.assert_allclose(continuous, discrete)
+	np.testing.assert_allclose(continuous[:, 2], 0, atol=1e-15)
+	np.testing.assert_allclose(continuous[:, 3], states[:, 2])
+
+
+def test_continuous_time_matches_a_single_arc():
+	rows = 10
+	states = np.ones((rows, 10))
+	proportion = np.linspace(0, 0.9, rows)
+	continuous = step(make_circuit(True), states, [(arc('ns', 'cs'), proportion)])
+	discrete = step(make_circuit(False), states, [(arc('ns', 'cs'), proportion)])
+
+	# The yearly proportion moves over the year.
+	np.testing.assert_allclose(continuous, discrete)
+
+
+def test_continuous_time_matches_discrete_for_small_rates():
+	rows = 50
+	rng = np.random.default_rng(4)
+	states = rng.uniform(size=(rows, 10))
+	scale = 1e-4
+	flows = make_flows(scale, rows)
+	continuous = step(make_circuit(True), states, flows)
+	discrete = step(make_circuit(False), states, flows)
+
+	# The difference is of the order of the square of the proportions.
+	np.testing.assert_allclose(continuous, discrete, rtol=0, atol=10 * scale ** 2)
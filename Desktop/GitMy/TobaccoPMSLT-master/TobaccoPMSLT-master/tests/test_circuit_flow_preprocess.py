@@ -0,0 +1,66 @@
+import math
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from mslt.artifacts.circuit_flow_preprocess import FLOWS, populate_data_file
+
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'src' / 'mslt' / 'artifacts' / 'data'
+AGES = list(range(0, 110, 5))
+SEXES = ['female', 'male']
+STRATA = ['maori', 'non-maori']
+
+
+def flows_cycle_reference(data_dir, age, sex, stratum):
+	"""The original implementation of the flows for a single cohort, without
+	the progress messages."""
+	if age < 42:
+		file_age = 22
+	elif age < 62:
+		file_age = 42
+	else:
+		file_age = 62
+	df = pd.read_csv(f"{data_dir}/circuit/pre_process/input_data/{stratum}_{sex}_{file_age}.csv")
+
+	if age < 20:
+		starting_year_idx = 0
+	else:
+		prev = pd.read_csv(f"{data_dir}/circuit/prevalence/prevalence.csv")
+		prev = prev.loc[(prev["agecategory"] == math.floor(age/5)*5) &
+						(prev["sex"] == sex) & (prev["strata"] == stratum)]
+		total_smoking_prev = (prev["cs"] + prev["cscv"]).values[0]
+		starting_year_idx = df.iloc[(df["totalSmoke"]-total_smoking_prev).abs().argsort()[:1]].index[0]
+
+	return df[starting_year_idx:(starting_year_idx + 21)][FLOWS].reset_index(drop=True)
+
+
+def populate_data_file_reference(data_dir, ages, sexes, strata):
+	"""The original implementation of populate_data_file."""
+	data_file_df = pd.read_csv(f"{data_dir}/circuit/pre_process/input_data/dataFileTemplate.csv")
+	for age in ages:
+		for sex in sexes:
+			for stratum in strata:
+				flows_cycle_df = flows_cycle_reference(data_dir, age, sex, stratum)
+				for year in range(0, len(flows_cycle_df)):
+					age_bracket = math.floor((age+year)/5)*5 +2
+					current_year_flows = flows_cycle_df.loc[year]
+					idx = data_file_df.index[
+						(data_file_df["year"] == year) &
+						(data_file_df["age"] == age_bracket) &
+						(data_file_df["sex"] == sex) &
+						(data_file_df["strata"] == stratum)
+					]
+					for flow in FLOWS:
+						data_file_df.at[idx,flow] = current_year_flows[flow]
+	data_file_df.set_index(["year", "age", "sex", "strata"],inplace=True)
+	return data_file_df
+
+
+@pytest.mark.parametrize('sex,stratum', [(sex, stratum) for sex in SEXES for stratum in STRATA])
+def test_populate_data_file_matches_reference(sex, stratum):
+	expected = populate_data_file_reference(DATA_DIR, AGES, [sex], [stratum])
+	actual = populate_data_file(DATA_DIR, AGES, [sex], [stratum])
+
+	pd.testing.assert_frame_equal(actual, expected)
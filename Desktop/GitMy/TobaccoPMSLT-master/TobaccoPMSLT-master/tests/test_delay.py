@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from mslt.components.delay import DelayedRisk
+from mslt.components.snapshot import SnapshotFrame
+
+
+DISEASES = ['chd', 'stroke']
+SIZE = 12
+# The tracked simulants, which are not every row of the bins.
+INDEX = pd.Index([0, 1, 2, 4, 5, 7, 8, 11])
+
+
+class Snapshot:
+	table = None
+
+	def get(self, index, columns):
+		return SnapshotFrame(index, {})
+
+
+class Rate:
+	def __init__(self, values):
+		self.values = values
+
+	def __call__(self, index):
+		return self.values.loc[index]
+
+	def source(self, index):
+		return self.values.loc[index]
+
+
+def make_risk(delay, tax, empty_rows=()):
+	rng = np.random.default_rng(delay)
+	risk = DelayedRisk('tobacco')
+	risk.bin_years = delay
+	risk.start_year = 2020
+	risk.clock = lambda: pd.Timestamp('2022-01-01')
+	risk.tobacco_tax = tax
+	risk.diseases = DISEASES
+	risk.snapshot = Snapshot()
+	risk.pif_cache = None
+	risk.bins_version = 0
+	risk.net_mortality_rr = None
+
+	bin_cols = risk.get_bin_names()
+	risk.bau_cols = bin_cols[:len(bin_cols) // 2]
+	bins = [c.split('.')[1] for c in risk.bau_cols]
+	rows = pd.RangeIndex(SIZE)
+
+	def series(low, high):
+		return Rate(pd.Series(rng.uniform(low, high, SIZE), index=rows))
+
+	def frame(columns, low, high):
+		return Rate(pd.DataFrame(rng.uniform(low, high, (SIZE, len(columns))),
+								 index=rows, columns=columns))
+
+	prevalence = rng.uniform(size=(SIZE, len(bins)))
+	prevalence /= prevalence.sum(axis=1, keepdims=True)
+	risk.initial_prevalence = Rate(pd.DataFrame(prevalence, index=rows, columns=risk.bau_cols))
+	mort_rr = frame(risk.bau_cols, 1, 3)
+	int_cols = bin_cols[len(bin_cols) // 2:]
+	mort_rr.values[int_cols] = mort_rr.values[risk.bau_cols].to_numpy()
+	risk.mortality_rr = mort_rr
+	risk.acm_rate = series(0.001, 0.2)
+	risk.incidence = series(0, 0.1)
+	risk.int_incidence = series(0, 0.1)
+	risk.remission = series(0, 0.2)
+	risk.int_remission = series(0, 0.2)
+	risk.tax_effect_inc = series(0.8, 1)
+	risk.tax_effect_rem = series(0.8, 1)
+	risk.disease_rr_columns = ['{}_{}'.format(d, b if b in ['no', 'yes'] else 'post_' + b)
+							   for d in DISEASES for b in bins]
+	risk.disease_rr = frame(risk.disease_rr_columns, 1, 4)
+
+	risk.bins = rng.uniform(0, 100, (2, len(bins), SIZE))
+	risk.bins[:, :, list(empty_rows)] = 0
+	return risk
+
+
+def reference_bins(risk):
+	"""The bins as a data frame, with one column per bin, as they were stored
+	in the state table."""
+	columns = risk.get_bin_names()
+	values = np.concatenate([risk.bins[0], risk.bins[1]])[:, INDEX].T
+	return pd.DataFrame(values, index=INDEX, columns=columns)
+
+
+def reference_step(risk, pop):
+	"""The data frame implementation of DelayedRisk.on_time_step_prepare."""
+	idx = pop.index
+	name = risk.name
+	bin_cols = risk.get_bin_names()
+	bau_prefix = '{}.'.format(name)
+	int_prefix = '{}_intervention.'.format(name)
+	bau_cols = [c for c in bin_cols if c.startswith(bau_prefix)]
+	int_cols = [c for c in bin_cols if c.startswith(int_prefix)]
+
+	mort_rr = risk.mortality_rr(idx).copy()
+	prev = risk.initial_prevalence(idx).loc[:, bau_cols]
+	bau_net_rr = prev.mul(mort_rr.loc[:, bau_cols]).sum(axis=1)
+	bau_acmr_no = risk.acm_rate.source(idx).divide(bau_net_rr)
+	mort_rr.loc[:, [s + str(risk.bin_years) for s in [bau_prefix, int_prefix]]] = 1.0
+	bau_surv_no = 1 - np.exp(- bau_acmr_no)
+	bau_surv_rate = mort_rr.loc[:, bau_cols].rpow(1 - bau_surv_no, axis=0)
+	pop.loc[:, bau_cols] = pop.loc[:, bau_cols].mul(bau_surv_rate)
+	int_surv_rate = bau_surv_rate.rename(
+		columns={c: c.replace('.', '_intervention.') for c in bau_surv_rate.columns})
+	pop.loc[:, int_cols] = pop.loc[:, int_cols].mul(int_surv_rate)
+
+	suffixes = ['', '_intervention']
+	if risk.bin_years > 0:
+		for suffix in suffixes:
+			pop['{}{}.{}'.format(name, suffix, risk.bin_years + 1)] += \
+				pop['{}{}.{}'.format(name, suffix, risk.bin_years)]
+	for n_years in reversed(range(risk.bin_years)):
+		for suffix in suffixes:
+			pop['{}{}.{}'.format(name, suffix, n_years + 1)] = \
+				pop['{}{}.{}'.format(name, suffix, n_years)]
+
+	inc = risk.incidence(idx) * pop[name + '.no']
+	int_inc = risk.int_incidence(idx) * pop[name + '_intervention.no']
+	rem = risk.remission(idx) * pop[name + '.yes']
+	int_rem = risk.int_remission(idx) * pop[name + '_intervention.yes']
+	if risk.tobacco_tax:
+		int_inc = int_inc * risk.tax_effect_inc(idx)
+		int_rem = int_rem + (1 - risk.tax_effect_rem(idx)) * pop[name + '_intervention.yes']
+
+	pop[name + '.no'] = pop[name + '.no'] - inc
+	pop[name + '_intervention.no'] = pop[name + '_intervention.no'] - int_inc
+	pop[name + '.yes'] = pop[name + '.yes'] + inc - rem
+	pop[name + '_intervention.yes'] = pop[name + '_intervention.yes'] + int_inc - int_rem
+	pop[name + '.0'] = rem
+	pop[name + '_intervention.0'] = int_rem
+	return pop
+
+
+def reference_pif(risk, pop, disease):
+	"""The data frame implementation of the incidence PIF of a disease."""
+	bin_cols = risk.get_bin_names()
+	bau_cols = bin_cols[:len(bin_cols) // 2]
+	int_cols = bin_cols[len(bin_cols) // 2:]
+	disease_cols = [c for c in risk.disease_rr_columns if c.startswith(disease + '_')]
+	rr = risk.disease_rr(pop.index)[disease_cols].to_numpy()
+	incidence_rr = pd.DataFrame(np.concatenate([rr, rr], axis=1),
+								index=pop.index, columns=bin_cols)
+	rr_values = pop[bin_cols] * incidence_rr
+	mean_bau_rr = (rr_values[bau_cols].sum(axis=1) / pop[bau_cols].sum(axis=1)).fillna(1.0)
+	mean_int_rr = (rr_values[int_cols].sum(axis=1) / pop[int_cols].sum(axis=1)).fillna(1.0)
+	return ((mean_bau_rr - mean_int_rr) / mean_bau_rr).fillna(0.0)
+
+
+@pytest.mark.parametrize('delay', [0, 1, 5, 20])
+@pytest.mark.parametrize('tax', [False, True])
+def test_time_step_matches_data_frames(delay, tax):
+	risk = make_risk(delay, tax, empty_rows=[2, 7])
+	expected = reference_step(risk, reference_bins(risk))
+	untracked = risk.bins[:, :, [3, 6, 9, 10]].copy()
+
+	risk.on_time_step_prepare(type('Event', (), {'index' : INDEX})())
+
+	pd.testing.assert_frame_equal(reference_bins(risk), expected, check_exact=False, rtol=1e-12)
+	# The bins of untracked simulants are unchanged.
+	np.testing.assert_array_equal(risk.bins[:, :, [3, 6, 9, 10]], untracked)
+	assert (risk.bins[:, :, [2, 7]] == 0).all()
+
+
+@pytest.mark.parametrize('delay', [0, 1, 20])
+def test_pif_matches_data_frames(delay):
+	risk = make_risk(delay, tax=True, empty_rows=[2, 7])
+	# Only the intervention population of row 4 is zero.
+	risk.bins[1, :, 4] = 0
+	# Move the intervention towards the never-exposed bin.
+	risk.bins[1, 0] *= 2
+
+	pif = risk.incidence_pif(INDEX)
+	pop = reference_bins(risk)
+	for disease in DISEASES:
+		pd.testing.assert_series_equal(pif[disease], reference_pif(risk, pop, disease),
+									   check_names=False, check_exact=False, rtol=1e-12)
+	assert (pif.loc[[2, 7]] == 0).all().all()
@@ -0,0 +1,93 @@
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+# The results scripts are not part of the package, and import each other
+# from the results folder.
+spec = importlib.util.spec_from_file_location(
+	'results_utilities',
+	Path(__file__).resolve().parent.parent / 'results' / 'utilities.py')
+util = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(util)
+
+
+CELLS = pd.MultiIndex.from_product([range(2021, 2026), ['female', 'male']],
+								   names=['year', 'sex'])
+
+
+def make_draws(count, seed=0):
+	rng = np.random.default_rng(seed)
+	values = rng.lognormal(size=(count, len(CELLS)))
+	# Return each draw in a different order, as the reducer sorts them.
+	return values, [pd.Series(row, index=CELLS).sample(frac=1, random_state=i)
+					for i, row in enumerate(values)]
+
+
+def test_mean_std_and_quantiles_match_numpy():
+	values, draws = make_draws(50)
+	reducer = util.ReduceDraws(draws)
+
+	assert reducer.count == 50
+	assert reducer.exact
+	np.testing.assert_allclose(reducer.Mean().to_numpy(), values.mean(axis=0))
+	np.testing.assert_allclose(reducer.Std().to_numpy(), values.std(axis=0, ddof=1))
+	for p in [0.05, 0.5, 0.95]:
+		np.testing.assert_allclose(reducer.Quantile(p).to_numpy(),
+								   np.quantile(values, p, axis=0))
+
+
+def test_compressed_quantiles_are_close_to_numpy():
+	values, draws = make_draws(2000)
+	reducer = util.ReduceDraws(draws, compression=50)
+
+	assert not reducer.exact
+	np.testing.assert_allclose(reducer.Mean().to_numpy(), values.mean(axis=0))
+	np.testing.assert_allclose(reducer.Std().to_numpy(), values.std(axis=0, ddof=1))
+	for p in [0.05, 0.5, 0.95]:
+		expected = np.quantile(values, p, axis=0)
+		# Compare the quantile ranks, which do not depend on the scale.
+		ranks = (values < reducer.Quantile(p).to_numpy()).mean(axis=0)
+		np.testing.assert_allclose(ranks, p, atol=0.02)
+		np.testing.assert_allclose(reducer.Quantile(p).to_numpy(), expected, rtol=0.05)
+
+
+def test_merge_matches_a_single_reducer():
+	values, draws = make_draws(30)
+	first = util.ReduceDraws(draws[:10])
+	second = util.ReduceDraws(draws[10:])
+
+	merged = util.DrawReducer()
+	merged.Merge(first).Merge(second)
+
+	np.testing.assert_allclose(merged.Mean().to_numpy(), values.mean(axis=0))
+	np.testing.assert_allclose(merged.Std().to_numpy(), values.std(axis=0, ddof=1))
+	np.testing.assert_allclose(merged.Quantile(0.5).to_numpy(),
+							   np.quantile(values, 0.5, axis=0))
+
+	# Merging into an empty reducer must not share the arrays of the first.
+	np.testing.assert_allclose(first.Mean().to_numpy(), values[:10].mean(axis=0))
+	assert first.count == 10
+
+
+def test_nan_is_rejected():
+	_, draws = make_draws(2)
+	draws[1].iloc[3] = np.nan
+	reducer = util.DrawReducer()
+	reducer.AddDraw(draws[0])
+	with pytest.raises(ValueError, match='NaN'):
+		reducer.AddDraw(draws[1])
+
+	reducer = util.DrawReducer()
+	with pytest.raises(ValueError, match='NaN'):
+		reducer.AddDraw(draws[1])
+
+
+def test_mismatched_cells_are_rejected():
+	_, draws = make_draws(2)
+	reducer = util.ReduceDraws(draws[:1])
+	with pytest.raises(ValueError, match='do not match the first draw'):
+		reducer.AddDraw(draws[1].iloc[1:])
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+from vivarium.interface.interactive import InteractiveContext
+
+from mslt.components.magic_wand_components import GenericWand
+
+
+class Population:
+	name = 'population'
+
+	def setup(self, builder):
+		self.population_view = builder.population.get_view(['age', 'strata'])
+		builder.population.initializes_simulants(self.on_initialize,
+												 creates_columns=['age', 'strata'])
+		builder.value.register_value_producer('rate', source=self.rate)
+
+	def on_initialize(self, pop_data):
+		index = pop_data.index
+		self.population_view.update(pd.DataFrame({
+			'age' : np.arange(len(index), dtype=float),
+			'strata' : 'all',
+		}, index=index))
+
+	def rate(self, index):
+		return pd.Series(0.1, index=index)
+
+
+class Shift:
+	name = 'shift'
+
+	def setup(self, builder):
+		builder.value.register_value_modifier('rate', self.modify)
+
+	def modify(self, index, rates):
+		return rates + 1
+
+
+def evaluate(components):
+	simulation = InteractiveContext(components=[Population()] + components, configuration={
+		'population' : {'population_size' : 20, 'max_age' : 20},
+		'magic_wand' : {
+			'halve_young' : {'target' : 'rate', 'rate_reduce' : 0.5, 'age_max' : 10},
+			'halve_old' : {'target' : 'rate', 'rate_reduce' : 0.5, 'age_min' : 5},
+		},
+	})
+	rate = simulation.get_value('rate')
+	return rate(simulation.get_population().index).to_numpy(), len(rate.mutators)
+
+
+def test_adjacent_wands_share_a_modifier():
+	rates, modifiers = evaluate([GenericWand('halve_young'), GenericWand('halve_old')])
+
+	age = np.arange(20)
+	expected = 0.1 * np.where(age < 10, 0.5, 1) * np.where(age >= 5, 0.5, 1)
+	np.testing.assert_allclose(rates, expected)
+	assert modifiers == 1
+
+
+def test_wands_keep_their_place_around_other_modifiers():
+	rates, modifiers = evaluate([GenericWand('halve_young'), Shift(), GenericWand('halve_old')])
+
+	age = np.arange(20)
+	expected = (0.1 * np.where(age < 10, 0.5, 1) + 1) * np.where(age >= 5, 0.5, 1)
+	np.testing.assert_allclose(rates, expected)
+	assert modifiers == 3
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+from vivarium.interface.interactive import InteractiveContext
+
+from mslt.components.pipeline import register_additive, register_multiplicative
+
+
+class Source:
+	name = 'source'
+
+	def setup(self, builder):
+		builder.value.register_value_producer('rate', source=self.rate)
+
+	def rate(self, index):
+		return pd.Series(np.linspace(1, 2, len(index)), index=index)
+
+
+class Contribution:
+	"""Contribute to the rate through a fused or a plain modifier."""
+
+	def __init__(self, name, kind, value, fused):
+		self.name = name
+		self.kind = kind
+		self.value = value
+		self.fused = fused
+
+	def setup(self, builder):
+		if not self.fused:
+			builder.value.register_value_modifier('rate', self.modify)
+		elif self.kind == 'additive':
+			register_additive(builder, 'rate', self.contribution)
+		else:
+			register_multiplicative(builder, 'rate', self.contribution)
+
+	def contribution(self, index):
+		return np.full(len(index), self.value)
+
+	def modify(self, index, rates):
+		if self.kind == 'additive':
+			return rates + self.value
+		return rates * self.value
+
+
+def evaluate(contributions, fused):
+	components = [Source()] + [Contribution(name, kind, value, fused and name != 'plain')
+							   for name, kind, value in contributions]
+	simulation = InteractiveContext(components=components,
+									configuration={'population': {'population_size': 10}})
+	rate = simulation.get_value('rate')
+	return rate(simulation.get_population().index), len(rate.mutators)
+
+
+@pytest.mark.parametrize('contributions,modifiers', [
+	# Adjacent contributions of the same kind share one modifier.
+	([('a1', 'additive', 0.5), ('a2', 'additive', 0.25), ('m1', 'multiplicative', 3.0)], 2),
+	# A plain modifier in between starts a new fused modifier.
+	([('a1', 'additive', 0.5), ('plain', 'multiplicative', 3.0), ('a2', 'additive', 0.25)], 3),
+	# So does a contribution of the other kind.
+	([('a1', 'additive', 0.5), ('m1', 'multiplicative', 3.0), ('a2', 'additive', 0.25),
+	  ('m2', 'multiplicative', 0.5)], 4),
+])
+def test_fused_matches_unfused(contributions, modifiers):
+	expected, _ = evaluate(contributions, fused=False)
+	actual, count = evaluate(contributions, fused=True)
+
+	pd.testing.assert_series_equal(actual, expected)
+	assert count == modifiers
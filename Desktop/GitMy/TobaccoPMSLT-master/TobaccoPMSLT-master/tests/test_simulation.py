@@ -0,0 +1,84 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+import yaml
+
+from mslt.components.parallel import run_nth_draw
+
+
+ROOT = Path(__file__).resolve().parent.parent
+ARTIFACT = ROOT / 'artifacts' / 'pmslt_artifact.hdf'
+SPEC = ROOT / 'model_specs' / 'test_small.yaml'
+
+pytestmark = pytest.mark.skipif(
+	not ARTIFACT.exists(),
+	reason='Run "make_artifacts minimal" in {} to build the artifact'.format(ROOT))
+
+
+def update(config, changes):
+	for key, value in changes.items():
+		if isinstance(value, dict):
+			update(config.setdefault(key, {}), value)
+		else:
+			config[key] = value
+
+
+def run_spec(directory, **changes):
+	"""Run the test_small specification in a directory, with changes to its
+	configuration, and return the observer outputs."""
+	spec = yaml.safe_load(SPEC.read_text())
+	spec['configuration']['input_data']['artifact_path'] = str(ARTIFACT)
+	spec['configuration']['observer']['output_prefix'] = str(directory / 'results' / 'test_small')
+	update(spec['configuration'], changes)
+	directory.mkdir(parents=True, exist_ok=True)
+	spec_file = directory / 'test_small.yaml'
+	spec_file.write_text(yaml.safe_dump(spec, sort_keys=False))
+
+	run_nth_draw(str(spec_file), 0)
+	return {path.name: pd.read_csv(path)
+			for path in sorted((directory / 'results').glob('*.csv'))}
+
+
+@pytest.fixture(scope='module')
+def baseline(tmp_path_factory):
+	return run_spec(tmp_path_factory.mktemp('baseline'))
+
+
+def assert_same_outputs(outputs, expected):
+	assert sorted(outputs) == sorted(expected)
+	for name, table in expected.items():
+		pd.testing.assert_frame_equal(outputs[name], table, check_exact=False, rtol=1e-10)
+
+
+def test_run(baseline):
+	assert baseline
+	for name, table in baseline.items():
+		assert not table.empty, name
+
+
+def test_bau_cache(tmp_path, baseline):
+	bau_cache = {'bau_cache': {'path': str(tmp_path / 'bau_cache')}}
+	assert_same_outputs(run_spec(tmp_path / 'record', **bau_cache), baseline)
+	assert list((tmp_path / 'bau_cache').iterdir())
+	assert_same_outputs(run_spec(tmp_path / 'replay', **bau_cache), baseline)
+
+
+def test_delta_mode(tmp_path, baseline):
+	assert_same_outputs(run_spec(tmp_path, delta_mode=True), baseline)
+
+
+def test_artifact_prefetch(tmp_path, baseline):
+	assert_same_outputs(run_spec(tmp_path, artifact_prefetch=True), baseline)
+
+
+def test_checkpoint_branch(tmp_path, baseline):
+	prefix = tmp_path / 'saved' / 'results' / 'test_small'
+	saved = run_spec(tmp_path / 'saved', checkpoint={'save_years': [2024]})
+	assert_same_outputs(saved, baseline)
+	assert (tmp_path / 'saved' / 'results' / 'test_small_checkpoint_2024.pkl.gz').exists()
+
+	# Restore the state saved at the start of 2024, and run from there.
+	branch = run_spec(tmp_path / 'branch', checkpoint={
+		'branch_from': str(prefix), 'branch_year': 2024})
+	assert_same_outputs(branch, baseline)
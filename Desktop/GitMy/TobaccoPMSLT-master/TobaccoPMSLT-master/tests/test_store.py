@@ -0,0 +1,70 @@
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from mslt.components.store import StoreLock
+
+
+def write_lock(lock_file, pid):
+	with open(lock_file, 'w') as f:
+		f.write('{}:{}:{}'.format(socket.gethostname(), pid, time.time()))
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='Process checks require POSIX')
+def test_lock_of_dead_process_is_broken(tmp_path):
+	store = str(tmp_path / 'results.hdf')
+	process = subprocess.Popen([sys.executable, '-c', 'pass'])
+	process.wait()
+	write_lock(store + '.lock', process.pid)
+
+	with StoreLock(store, timeout=5):
+		assert os.path.exists(store + '.lock')
+	assert not os.path.exists(store + '.lock')
+
+
+def test_old_lock_is_broken(tmp_path):
+	store = str(tmp_path / 'results.hdf')
+	write_lock(store + '.lock', os.getpid())
+	old = time.time() - 60
+	os.utime(store + '.lock', (old, old))
+
+	with StoreLock(store, timeout=5):
+		pass
+	assert not os.path.exists(store + '.lock')
+
+
+def test_live_lock_times_out(tmp_path):
+	store = str(tmp_path / 'results.hdf')
+	write_lock(store + '.lock', os.getpid())
+
+	with pytest.raises(TimeoutError):
+		with StoreLock(store, timeout=0.2, stale_age=60):
+			pass
+	assert os.path.exists(store + '.lock')
+
+
+def increment(store, count):
+	for _ in range(count):
+		with StoreLock(store, timeout=30):
+			counter = store + '.count'
+			value = int(open(counter).read()) if os.path.exists(counter) else 0
+			with open(counter, 'w') as f:
+				f.write(str(value + 1))
+
+
+def test_lock_serialises_processes(tmp_path):
+	store = str(tmp_path / 'results.hdf')
+	processes = [multiprocessing.Process(target=increment, args=(store, 25))
+				 for _ in range(4)]
+	for process in processes:
+		process.start()
+	for process in processes:
+		process.join()
+
+	assert open(store + '.count').read() == '100'
+	assert sorted(os.listdir(str(tmp_path))) == ['results.hdf.count']
@@ -0,0 +1,43 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from mslt.utilities import CrossDf, ExpandAgeCategory
+
+
+CIRCUIT_DIR = Path(__file__).resolve().parent.parent / 'src' / 'mslt' / 'artifacts' / 'data' / 'circuit'
+MAX_AGE = 110
+
+
+def expand_age_category_reference(df, max_age):
+	"""The original implementation of ExpandAgeCategory."""
+	indexNames = df.index.names
+	indexNames = [x for x in indexNames if (x != 'agecategory' and x != None)]
+	df = df.reset_index()
+
+	df = CrossDf(df, pd.DataFrame({'age' : list(range(max_age))}))
+	df = df[df['age'] >= df['agecategory']]
+
+	df['as_index'] = df['agecategory']
+	df = df.set_index(['age', 'as_index'] + indexNames)
+	df = df.loc[df.groupby(['age'] + indexNames)['agecategory'].idxmax()]
+	df = df.drop(columns=['agecategory']).droplevel('as_index')
+	return df
+
+
+@pytest.mark.parametrize('file_name,index', [
+	('flow/cs.csv', ['agecategory']),
+	('flow/cscv.csv', ['agecategory']),
+	('flow/nscv.csv', ['agecategory']),
+	('flow/fscv.csv', ['agecategory']),
+	('flow/quit_smoking_relapse.csv', ['agecategory', 'sex', 'strata']),
+	('prevalence/prevalence.csv', ['agecategory', 'strata', 'sex']),
+])
+def test_expand_age_category_matches_reference(file_name, index):
+	df = pd.read_csv(CIRCUIT_DIR / file_name).set_index(index)
+
+	expected = expand_age_category_reference(df, MAX_AGE)
+	actual = ExpandAgeCategory(df, MAX_AGE)
+
+	pd.testing.assert_frame_equal(actual, expected)